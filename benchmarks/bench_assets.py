@@ -0,0 +1,66 @@
+"""
+Downloads the cover art and previews of 200 tracks on 20 albums from the
+local stub (20 ms per request): one request per track for each, in turn,
+as a report linking to them makes a browser do; then AssetCache.prefetch
+into an empty cache; again from the warm cache; and again once every
+entry is due for revalidation, which the stub answers with 304.
+
+    $ python -m benchmarks.bench_assets
+"""
+import shutil
+import tempfile
+import time
+
+from benchmarks.stub_server import StubServer, fake_track
+from helpers import assets
+from helpers import schema
+from helpers import transport
+
+LATENCY = 0.02
+TRACKS = 200
+
+
+def get_tracks(server: StubServer):
+    # Generated tracks whose art and previews point at the stub
+    tracks = []
+    for n in range(TRACKS):
+        track = schema.nested_track(fake_track(n))
+        track['preview_url'] = track['preview_url'].replace('https://p.scdn.co', server.base_url)
+        track['album']['image_url_small'] = track['album']['image_url_small'].replace('https://i.scdn.co',
+                                                                                      server.base_url)
+        tracks.append(track)
+    return tracks
+
+
+def measure(label: str, server: StubServer, download):
+    server.hits.clear()
+    start = time.perf_counter()
+    download()
+    elapsed = time.perf_counter() - start
+    print('%-34s %4d requests  %7.3f s' % (label, sum(server.hits.values()), elapsed))
+
+
+def main():
+    server = StubServer(latency=LATENCY).start()
+    tracks = get_tracks(server)
+    urls = [url for track in tracks for url in (track['album']['image_url_small'], track['preview_url'])]
+    folder = tempfile.mkdtemp()
+    try:
+        client = transport.PooledTransport()
+        measure('one request per track, in turn', server, lambda: [client.get(url) for url in urls])
+
+        cache = assets.AssetCache(folder)
+        measure('prefetch, empty cache', server, lambda: cache.prefetch(assets.get_urls(tracks)))
+        measure('prefetch, warm cache', server, lambda: cache.prefetch(assets.get_urls(tracks)))
+        cache.max_age = 0
+        measure('prefetch, revalidating (304)', server, lambda: cache.prefetch(assets.get_urls(tracks)))
+        stats = cache.stats()
+        print('%d URLs in %d blobs, %.1f MB on disk' % (stats['urls'], stats['blobs'], stats['bytes'] / 2 ** 20))
+        cache.close()
+    finally:
+        shutil.rmtree(folder)
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
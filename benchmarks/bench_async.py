@@ -0,0 +1,37 @@
+"""
+Measures how async_spotify throughput scales with the concurrency limit
+against the local stub server with 50 ms of artificial latency.
+
+    $ python -m benchmarks.bench_async
+"""
+import asyncio
+import time
+
+from benchmarks.stub_server import StubServer, point_helpers_at
+from helpers import async_spotify
+
+LATENCY = 0.05
+CALLS = 200
+
+
+async def run(concurrency: int):
+    async with async_spotify.AsyncSpotify(concurrency=concurrency) as client:
+        await client.get_tracks('warmup')
+        start = time.perf_counter()
+        await asyncio.gather(*[client.get_tracks('radiohead %d' % n) for n in range(CALLS)])
+        elapsed = time.perf_counter() - start
+    ideal = concurrency / LATENCY
+    print('concurrency %3d  %7.1f req/s  (%.0f%% of ideal)' % (
+        concurrency, CALLS / elapsed, 100 * CALLS / elapsed / ideal))
+
+
+def main():
+    server = StubServer(latency=LATENCY).start()
+    point_helpers_at(server)
+    for concurrency in (1, 2, 4, 8, 16, 32):
+        asyncio.run(run(concurrency))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
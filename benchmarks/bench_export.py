@@ -0,0 +1,72 @@
+"""
+Exports 100,000 generated tracks in every format (parquet and feather
+only when pyarrow is installed), timing each and measuring the file size
+and the peak memory the export adds when the tracks arrive from a
+generator (for xz, mostly the compressor's own buffers). Then names 500
+files from 32 threads at once with utilities.name_file, checking that no
+two threads got the same name.
+
+    $ python -m benchmarks.bench_export
+"""
+import concurrent.futures
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.stub_server import fake_track
+from helpers import export
+from helpers import schema
+from helpers import utilities
+
+TRACKS = 100000
+FILES = 500
+THREADS = 32
+OUTPUTS = ['tracks.jsonl', 'tracks.jsonl.gz', 'tracks.csv', 'tracks.csv.gz', 'tracks.csv.xz', 'tracks.m3u',
+           'tracks.parquet', 'tracks.feather']
+
+
+def has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def generate():
+    return (schema.nested_track(fake_track(n)) for n in range(TRACKS))
+
+
+def main():
+    folder = tempfile.mkdtemp()
+    try:
+        for name in OUTPUTS:
+            if export.guess_format(name)[0] in ('parquet', 'feather') and not has_pyarrow():
+                print('%-18s skipped, pyarrow is not installed' % name)
+                continue
+            path = os.path.join(folder, name)
+            start = time.perf_counter()
+            count = export.export(generate(), path)
+            elapsed = time.perf_counter() - start
+
+            # Traced separately, since tracing slows the export several times over
+            tracemalloc.start()
+            export.export(generate(), path)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print('%-18s %7d tracks  %7.3f s  %8.1f KB on disk  %7.1f KB peak memory' % (
+                name, count, elapsed, os.path.getsize(path) / 1024, peak / 1024))
+
+        with concurrent.futures.ThreadPoolExecutor(THREADS) as pool:
+            start = time.perf_counter()
+            names = list(pool.map(lambda _: utilities.name_file('.csv', folder), range(FILES)))
+            elapsed = time.perf_counter() - start
+        print('name_file x%d from %d threads: %d distinct names, %.3f s' % (FILES, THREADS, len(set(names)), elapsed))
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
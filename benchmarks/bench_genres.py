@@ -0,0 +1,69 @@
+"""
+Times the genre catalog against the local stub (20 ms per API call): the
+first load, which fetches the seed list, loading it again from disk,
+checking a seed, and filtering the list by prefix, substring and a
+misspelling. Then asks for recommendations with a misspelt genre with
+and without the catalog, counting the API calls made.
+
+    $ python -m benchmarks.bench_genres
+"""
+import os
+import tempfile
+import time
+import timeit
+
+from benchmarks.stub_server import StubServer, point_helpers_at
+from helpers import genres
+from helpers import spotify
+
+LATENCY = 0.02
+QUERIES = ['ro', 'metal', 'hiphop', 'elektronic']
+
+
+def calls(server: StubServer):
+    return sum(n for path, n in server.hits.items() if not path.endswith('/key'))
+
+
+def main():
+    server = StubServer(latency=LATENCY).start()
+    point_helpers_at(server)
+    spotify.get_artists('warmup')
+    path = os.path.join(tempfile.mkdtemp(), 'genres.json')
+
+    start = time.perf_counter()
+    catalog = genres.GenreCatalog(path)
+    catalog.load()
+    print('%-28s %9.3f ms  (%d genres)' % ('first load, fetched', (time.perf_counter() - start) * 1000,
+                                           len(catalog)))
+
+    start = time.perf_counter()
+    catalog = genres.GenreCatalog(path)
+    catalog.load()
+    print('%-28s %9.3f ms' % ('load from disk', (time.perf_counter() - start) * 1000))
+
+    number = 1000000
+    seconds = timeit.timeit(lambda: 'world-music' in catalog, number=number)
+    print('%-28s %9.3f us' % ("'world-music' in catalog", seconds / number * 1e6))
+
+    number = 2000
+    for query in QUERIES:
+        seconds = timeit.timeit(lambda: catalog.filter(query, 10), number=number)
+        print('%-28s %9.3f us  %s' % ('filter(%r)' % query, seconds / number * 1e6, catalog.filter(query, 3)))
+
+    for label, checked in (('misspelt genre, unchecked', None), ('misspelt genre, checked', catalog)):
+        spotify.set_genre_catalog(checked)
+        server.hits.clear()
+        start = time.perf_counter()
+        try:
+            spotify.get_similar_tracks([], [], ['elektronic'])
+            outcome = 'accepted by the stub'
+        except spotify.InvalidSeedsError as e:
+            outcome = str(e)
+        print('%-28s %9.3f ms  %d API calls  %s' % (label, (time.perf_counter() - start) * 1000, calls(server),
+                                                   outcome))
+    spotify.set_genre_catalog(None)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
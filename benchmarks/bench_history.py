@@ -0,0 +1,62 @@
+"""
+Records ten million delivered track IDs for one recipient, a million per
+save as a long-running weekly digest would accumulate them, then measures
+filtering a 100-track refresh against them, from a fresh open.
+
+    $ python -m benchmarks.bench_history
+"""
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from helpers import history
+
+DELIVERED = 10000000
+PER_SAVE = 1000000
+CANDIDATES = 100
+LOOKUPS = 200
+
+
+def fake_id(n: int):
+    return 'track%017d' % n
+
+
+def main():
+    folder = tempfile.mkdtemp()
+    delivered = history.DeliveredSet(os.path.join(folder, 'recipient'))
+    start = time.perf_counter()
+    for first in range(0, DELIVERED, PER_SAVE):
+        delivered.add(fake_id(n) for n in range(first, first + PER_SAVE))
+        delivered.save()
+    elapsed = time.perf_counter() - start
+    size = sum(os.path.getsize(os.path.join(delivered.folder, name)) for name in os.listdir(delivered.folder))
+    print('record %d IDs   %6.1f s  (%d runs, %.0f MB on disk)' % (
+        DELIVERED, elapsed, len(delivered._runs), size / 2 ** 20))
+    delivered.close()
+
+    start = time.perf_counter()
+    delivered = history.DeliveredSet(delivered.folder)
+    print('open              %6.3f ms' % ((time.perf_counter() - start) * 1000))
+
+    rng = random.Random(0)
+    samples = []
+    for _ in range(LOOKUPS):
+        # Half already delivered, half new
+        candidates = [fake_id(rng.randrange(DELIVERED)) for _ in range(CANDIDATES // 2)] + \
+                     [fake_id(DELIVERED + rng.randrange(DELIVERED)) for _ in range(CANDIDATES // 2)]
+        start = time.perf_counter()
+        unseen = delivered.unseen(candidates)
+        samples.append((time.perf_counter() - start) * 1000)
+        assert len(unseen) == CANDIDATES // 2
+    samples.sort()
+    print('filter %d tracks  p50 %.3f ms  p99 %.3f ms' % (
+        CANDIDATES, samples[len(samples) // 2], samples[int(len(samples) * 0.99)]))
+
+    delivered.close()
+    shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
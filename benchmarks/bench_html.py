@@ -0,0 +1,68 @@
+"""
+Compares the streaming HTML table writer with the DataFrame.to_html path it
+replaced, on 10k and 100k synthetic tracks. Reports wall time (which
+includes generating the streamed tracks) and peak traced memory; the
+legacy path is skipped when pandas is not installed.
+
+    $ python -m benchmarks.bench_html
+"""
+import os
+import time
+import tracemalloc
+
+from benchmarks.stub_server import fake_track
+from helpers import spotify
+from helpers import utilities
+
+
+def synthetic_tracks(count: int):
+    # Generated lazily so the streaming writer never holds the whole list
+    for n in range(count):
+        yield spotify._simplify_tracks([fake_track(n)])[0]
+
+
+def legacy_html(tracks: list):
+    # The pre-streaming implementation: a DataFrame, to_html, then three full-string replaces
+    import pandas as pd
+    track_data = utilities.get_dataframe(tracks)
+    pd.set_option('display.max_colwidth', None)
+    keys = ['name', 'album_image_url_small', 'artist_name', 'album_name', 'share_url']
+    new_keys = ['Song Title', 'Cover Art', 'Artist', 'Album', 'Share URL']
+    track_data = track_data[keys].rename(columns=dict(zip(keys, new_keys)))
+    table = track_data.to_html(formatters={'Cover Art': lambda im: f'<img src="{im}" />'},
+                               escape=False, index=False, render_links=True)
+    table = table.replace('style="text-align: right;"', '')
+    table = table.replace('<tr>', '<tr style="border: solid 1px #CCC;">')
+    return table.replace('<table border="1" class="dataframe">',
+                         '<table style="border-collapse: collapse; border: solid 1px #CCC;">')
+
+
+def measure(label: str, count: int, render):
+    # Time an untraced run, then trace a second one for peak memory
+    start = time.perf_counter()
+    render()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    render()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print('%-10s %7d tracks  %8.1f ms  peak %8.1f MB' % (label, count, elapsed * 1000, peak / 2 ** 20))
+
+
+def main():
+    for count in (10000, 100000):
+        with open(os.devnull, 'w') as out:
+            measure('streaming', count, lambda: utilities.write_tracklist_table_html(synthetic_tracks(count), out))
+
+        try:
+            import pandas  # noqa: F401
+        except ImportError:
+            print('%-10s %7d tracks  skipped (pandas not installed)' % ('to_html', count))
+            continue
+        tracks = list(synthetic_tracks(count))
+        with open(os.devnull, 'w') as out:
+            measure('to_html', count, lambda: out.write(legacy_html(tracks)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+Looks up 1,000 tracks by ID against the local stub (20 ms per API call):
+one request per ID, then one get_tracks_by_ids call, then each ID on its
+own from 64 threads sharing batches, counting the API calls made.
+
+    $ python -m benchmarks.bench_ids
+"""
+import concurrent.futures
+import time
+
+from benchmarks.stub_server import StubServer, point_helpers_at
+from helpers import spotify
+from helpers import transport
+
+LATENCY = 0.02
+IDS = ['track%06d' % n for n in range(1000)]
+THREADS = 64
+
+
+def measure(label: str, server: StubServer, lookup):
+    server.hits.clear()
+    start = time.perf_counter()
+    found = lookup()
+    elapsed = time.perf_counter() - start
+    calls = sum(n for path, n in server.hits.items() if not path.endswith('/key'))
+    print('%-32s %5d API calls  %7.3f s  (%d found)' % (label, calls, elapsed, sum(n is not None for n in found)))
+
+
+def main():
+    server = StubServer(latency=LATENCY).start()
+    point_helpers_at(server)
+    transport.set_transport(transport.PooledTransport(pool_size=THREADS, max_per_host=THREADS))
+    spotify.set_rate_limit(10000, burst=THREADS)
+    spotify.get_artists('warmup')
+
+    measure('one request per ID', server,
+            lambda: [spotify._issue_get_request(spotify._item_url('track', n)) for n in IDS])
+    measure('get_tracks_by_ids', server, lambda: spotify.get_tracks_by_ids(IDS))
+    with concurrent.futures.ThreadPoolExecutor(THREADS) as pool:
+        measure('one ID per call, %d threads' % THREADS, server,
+                lambda: list(pool.map(lambda n: spotify.get_tracks_by_ids([n])[0], IDS)))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Queues 2,000 report emails, all sharing one report, and measures how fast
+email() returns and how many emails per second the sender pool delivers
+to a fake SendGrid (the local stub, adding 20 ms per request), first one
+email per request and then batched as personalizations.
+
+    $ python -m benchmarks.bench_mail
+"""
+import os
+import tempfile
+import time
+
+from benchmarks.stub_server import StubServer
+from helpers import mail_queue
+
+EMAILS = 2000
+LATENCY = 0.02
+
+
+def run(label: str, server: StubServer, report: str, batch_size: int):
+    folder = tempfile.mkdtemp()
+    queue = mail_queue.MailQueue(
+        os.path.join(folder, 'mail.sqlite3'),
+        client=mail_queue.SendGridClient(server.base_url, server.base_url + '/sendgrid/key'),
+        batch_size=batch_size)
+    with open(os.path.join(folder, 'report.html'), 'w') as f:
+        f.write(report)
+
+    before = server.emails
+    start = time.perf_counter()
+    for n in range(EMAILS):
+        queue.enqueue('me@example.com', ('friend%d@example.com' % n,), 'New Music Recommendations',
+                      report, os.path.join(folder, 'report.html'))
+    queued = time.perf_counter() - start
+    queue.start()
+    queue.flush()
+    elapsed = time.perf_counter() - start
+    queue.close()
+
+    print('%-10s enqueue %6.3f ms each  delivered %d in %5.2f s  (%.0f emails/s, %d requests)' % (
+        label, queued / EMAILS * 1000, server.emails - before, elapsed, (server.emails - before) / elapsed,
+        server.hits.get('/v3/mail/send', 0)))
+    server.hits.clear()
+
+
+def main():
+    server = StubServer(latency=LATENCY).start()
+    report = '<table>%s</table>' % ''.join('<tr><td>Track %d</td></tr>' % n for n in range(500))
+    run('unbatched', server, report, batch_size=1)
+    run('batched', server, report, batch_size=mail_queue.MAX_PERSONALIZATIONS)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
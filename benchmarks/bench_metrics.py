@@ -0,0 +1,53 @@
+"""
+Measures what the metrics probes cost: a disabled timer and counter on
+their own, and cached spotify lookups, which do the least other work,
+with metrics off and on.
+
+    $ python -m benchmarks.bench_metrics
+"""
+import time
+
+from benchmarks.stub_server import StubServer, point_helpers_at
+from helpers import cache
+from helpers import metrics
+from helpers import spotify
+
+CALLS = 200000
+
+
+def per_call(function, calls: int = CALLS):
+    start = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def nothing():
+    pass
+
+
+def probes():
+    with metrics.timer('bench_seconds', kind='probe'):
+        pass
+    metrics.increment('bench_total', kind='probe')
+
+
+def main():
+    server = StubServer().start()
+    point_helpers_at(server)
+    spotify.set_cache(cache.ResponseCache(path=None))
+    spotify.get_artists('cached')
+
+    lookup = lambda: spotify.get_artists('cached', simplify=False)
+    metrics.disable()
+    print('empty function call   %7.0f ns' % per_call(nothing))
+    print('timer + counter, off  %7.0f ns' % per_call(probes))
+    print('cached lookup, off    %7.0f ns' % per_call(lookup))
+    metrics.enable()
+    print('timer + counter, on   %7.0f ns' % per_call(probes))
+    print('cached lookup, on     %7.0f ns' % per_call(lookup))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+Reports memory per track for 100k recommendations held as simplified
+dicts, as Track objects, and in a columnar TrackBatch. Ten tracks share
+each album and a hundred share each artist, roughly like real results.
+Strings decoded from the API response are allocated before tracing starts,
+so the figures are what each representation adds on top of them.
+
+    $ python -m benchmarks.bench_models
+"""
+import gc
+import tracemalloc
+
+from benchmarks.stub_server import fake_track
+from helpers import models
+from helpers import spotify
+
+COUNT = 100000
+
+
+def measure(label: str, build):
+    raw = [fake_track(n) for n in range(COUNT)]
+    gc.collect()
+    tracemalloc.start()
+    held = build(raw)
+    del raw
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print('%-12s %7.1f bytes per track' % (label, size / COUNT))
+    return held
+
+
+def main():
+    measure('dicts', spotify._simplify_tracks)
+    measure('Track', lambda raw: spotify._simplify_tracks(raw, models=True))
+    measure('TrackBatch', models.TrackBatch)
+
+
+if __name__ == '__main__':
+    main()
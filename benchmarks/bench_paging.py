@@ -0,0 +1,45 @@
+"""
+Scrolls through 200 search results with spotify.iter_tracks against the
+local stub (50 ms per API call), spending 2.5 ms on each result, with and
+without prefetching; then stops after 25 results and counts the pages
+requested.
+
+    $ python -m benchmarks.bench_paging
+"""
+import itertools
+import time
+
+from benchmarks.stub_server import StubServer, point_helpers_at
+from helpers import spotify
+
+LATENCY = 0.05
+RESULTS = 200
+WORK = 0.0025
+
+
+def scroll(term: str, prefetch: bool):
+    start = time.perf_counter()
+    for _ in itertools.islice(spotify.iter_tracks(term, prefetch=prefetch), RESULTS):
+        time.sleep(WORK)
+    return time.perf_counter() - start
+
+
+def main():
+    server = StubServer(latency=LATENCY).start()
+    point_helpers_at(server)
+    spotify.get_artists('warmup')
+
+    print('200 results, no prefetch  %6.3f s' % scroll('first', False))
+    print('200 results, prefetch     %6.3f s' % scroll('second', True))
+
+    server.hits.clear()
+    results = spotify.iter_tracks('third')
+    list(itertools.islice(results, 25))
+    results.close()
+    time.sleep(LATENCY * 2)
+    print('stopped after 25 results  %d pages requested' % server.hits.get('/v1/search', 0))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Compares one recommendations call for five seeds with planner calls for
+15 and 40 seeds, which are split into three and eight queries, against the
+local stub with 50 ms of latency per API call; then repeats the 40-seed
+call with the response cache on.
+
+    $ python -m benchmarks.bench_planner
+"""
+import time
+
+from benchmarks.stub_server import StubServer, point_helpers_at
+from helpers import cache
+from helpers import planner
+from helpers import spotify
+from helpers import transport
+
+LATENCY = 0.05
+ROUNDS = 10
+
+
+def seeds(count: int):
+    artists = ['artist%06d' % n for n in range(count // 2)]
+    tracks = ['track%06d' % n for n in range(count - len(artists) - 1)]
+    return artists, tracks, ['rock']
+
+
+def timed(label: str, call):
+    samples = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        found = call()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    print('%-26s median %6.1f ms  (%d tracks)' % (label, samples[len(samples) // 2] * 1000, len(found)))
+
+
+def main():
+    server = StubServer(latency=LATENCY).start()
+    point_helpers_at(server)
+    transport.set_transport(transport.PooledTransport(pool_size=16, max_per_host=16))
+    spotify.set_rate_limit(1000)
+    spotify.get_artists('warmup')
+
+    timed('5 seeds, one call', lambda: spotify.get_similar_tracks(*seeds(5)))
+    timed('15 seeds, 3 queries', lambda: planner.get_similar_tracks(*seeds(15)))
+    timed('40 seeds, 8 queries', lambda: planner.get_similar_tracks(*seeds(40)))
+    spotify.set_cache(cache.ResponseCache(path=None))
+    timed('40 seeds, cached', lambda: planner.get_similar_tracks(*seeds(40)))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
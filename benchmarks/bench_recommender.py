@@ -0,0 +1,50 @@
+"""
+Builds LocalRecommender indexes over synthetic catalogs of 100k and 1M
+tracks and reports build time and query latency for 1, 5 and 25 seeds.
+
+    $ python -m benchmarks.bench_recommender
+"""
+import time
+
+import numpy as np
+
+from helpers import recommender
+
+QUERIES = 20
+
+
+def synthetic_catalog(count: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    features = rng.random((count, len(recommender.FEATURES)), dtype=np.float32)
+    ids = ['track%07d' % n for n in range(count)]
+    metadata = {
+        'name': ['Track %d' % n for n in range(count)],
+        'artist_id': ['artist%05d' % (n // 50) for n in range(count)],
+        'artist_name': ['Artist %d' % (n // 50) for n in range(count)],
+        'genres': [('rock', 'pop', 'jazz', 'folk', 'metal')[n % 5] for n in range(count)]
+    }
+    return ids, features, metadata
+
+
+def main():
+    rng = np.random.default_rng(1)
+    for count in (100000, 1000000):
+        ids, features, metadata = synthetic_catalog(count)
+        start = time.perf_counter()
+        index = recommender.LocalRecommender(ids, features, metadata)
+        print('%8d tracks  build %7.1f ms' % (count, (time.perf_counter() - start) * 1000))
+
+        for seeds in (1, 5, 25):
+            samples = []
+            for _ in range(QUERIES):
+                track_ids = [ids[n] for n in rng.integers(0, count, seeds)]
+                start = time.perf_counter()
+                index.get_similar_tracks([], track_ids, [])
+                samples.append((time.perf_counter() - start) * 1000)
+            samples.sort()
+            print('%8d tracks  %2d seeds  p50 %6.2f ms  max %6.2f ms' % (
+                count, seeds, samples[len(samples) // 2], samples[-1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""
+Resolves 50 artist names against the local stub, which adds 50 ms of
+latency to every API call, one search at a time and then with
+resolve.resolve_artists.
+
+    $ python -m benchmarks.bench_resolve
+"""
+import time
+
+from benchmarks.stub_server import StubServer, point_helpers_at
+from helpers import resolve
+from helpers import spotify
+
+NAMES = ['Artist %d' % n for n in range(50)]
+LATENCY = 0.05
+
+
+def main():
+    server = StubServer(latency=LATENCY).start()
+    point_helpers_at(server)
+    # Let every search be in flight at once; the default rate limit is kinder to the real API
+    spotify.set_rate_limit(len(NAMES), burst=len(NAMES))
+    spotify.get_artists('warmup')
+
+    start = time.perf_counter()
+    for name in NAMES:
+        resolve.best_match(name, spotify.get_artists(name))
+    print('sequential  %7.3f s' % (time.perf_counter() - start))
+
+    spotify.set_rate_limit(len(NAMES), burst=len(NAMES))
+    start = time.perf_counter()
+    found = resolve.resolve_artists(NAMES, workers=len(NAMES))
+    elapsed = time.perf_counter() - start
+    print('concurrent  %7.3f s  (%.1f round trips, %d of %d matched)' % (
+        elapsed, elapsed / LATENCY, sum(item is not None for item in found.values()), len(NAMES)))
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
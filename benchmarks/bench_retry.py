@@ -0,0 +1,51 @@
+"""
+Drives spotify.get_tracks against stubs that answer 429 or 503 for a share
+of requests and reports how throughput and upstream load respond.
+
+    $ python -m benchmarks.bench_retry
+"""
+import time
+
+from benchmarks.stub_server import StubServer, point_helpers_at
+from helpers import retry
+from helpers import spotify
+
+CALLS = 200
+
+
+def run(label: str, server: StubServer):
+    point_helpers_at(server)
+    spotify.set_rate_limit(200)
+    try:
+        spotify.get_tracks('warmup')
+    except spotify.SpotifyError:
+        pass
+    spotify._breaker = retry.CircuitBreaker()
+    server.hits.clear()
+
+    ok = failed = 0
+    errors = {}
+    start = time.perf_counter()
+    for n in range(CALLS):
+        try:
+            spotify.get_tracks('radiohead %d' % n)
+            ok += 1
+        except spotify.SpotifyError as e:
+            failed += 1
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+    elapsed = time.perf_counter() - start
+    upstream = server.hits.get('/v1/search', 0)
+    print('%-28s %6.1f ok/s  %3d ok  %3d failed  %4d upstream calls (%.2f per call)  %s' % (
+        label, ok / elapsed, ok, failed, upstream, upstream / CALLS, errors or ''))
+    server.shutdown()
+
+
+def main():
+    run('healthy', StubServer().start())
+    run('10% 503', StubServer(error_rate=0.1, error_status=503).start())
+    run('10% 429, Retry-After: 0.05', StubServer(error_rate=0.1, error_status=429, retry_after=0.05).start())
+    run('100% 503', StubServer(error_rate=1.0, error_status=503).start())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Builds a SearchIndex of 1M synthetic artist names, saves it, reopens it
+with mmap and reports query latency for exact, prefix and misspelled
+queries, along with how often the name queried for was among the results.
+
+    $ python -m benchmarks.bench_search
+"""
+import os
+import random
+import tempfile
+import time
+
+from helpers import search_index
+
+COUNT = 1000000
+QUERIES = 2000
+# Onset, vowel and coda combinations give a few thousand syllables, enough
+# variety for trigram statistics to resemble real artist names
+SYLLABLES = [onset + vowel + coda
+             for onset in ['', 'b', 'br', 'ch', 'd', 'f', 'g', 'gr', 'h', 'j', 'k', 'l', 'm', 'n',
+                           'p', 'qu', 'r', 's', 'sh', 'st', 't', 'tr', 'v', 'w', 'z']
+             for vowel in ['a', 'e', 'i', 'o', 'u', 'ai', 'ea', 'oo', 'y']
+             for coda in ['', 'n', 'r', 's', 'x', 'ck', 'ng', 'th']]
+
+
+def synthetic_name(rng: random.Random):
+    words = [''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3))) for _ in range(rng.randint(1, 3))]
+    return ' '.join(words).title()
+
+
+def misspell(name: str, rng: random.Random):
+    n = rng.randrange(len(name))
+    return name[:n] + rng.choice('aeioustr') + name[n + 1:]
+
+
+def main():
+    rng = random.Random(0)
+    names = [synthetic_name(rng) for _ in range(COUNT)]
+
+    index = search_index.SearchIndex()
+    start = time.perf_counter()
+    index.add_many({'id': 'artist%07d' % n, 'name': name} for n, name in enumerate(names))
+    print('add %d entries      %8.1f s' % (COUNT, time.perf_counter() - start))
+
+    path = os.path.join(tempfile.mkdtemp(), 'artists.idx')
+    start = time.perf_counter()
+    index.save(path)
+    print('save                   %8.1f s  (%.0f MB)' % (time.perf_counter() - start, os.path.getsize(path) / 2 ** 20))
+
+    start = time.perf_counter()
+    index = search_index.SearchIndex(path)
+    print('open with mmap         %8.3f ms' % ((time.perf_counter() - start) * 1000))
+
+    cases = {
+        'exact': lambda name: name,
+        'prefix': lambda name: name[:max(3, len(name) // 2)],
+        'misspelled': lambda name: misspell(name, rng),
+    }
+    for label, make in cases.items():
+        samples = []
+        found = 0
+        for _ in range(QUERIES):
+            name = rng.choice(names)
+            query = make(name)
+            start = time.perf_counter()
+            results = index.search(query)
+            samples.append((time.perf_counter() - start) * 1000)
+            found += any(item['name'] == name for item in results)
+        samples.sort()
+        print('%-10s p50 %6.3f ms  p99 %6.3f ms  found %3.0f%%' % (
+            label, samples[len(samples) // 2], samples[int(len(samples) * 0.99)], 100 * found / QUERIES))
+
+    index.close()
+    os.remove(path)
+    os.rmdir(os.path.dirname(path))
+
+
+if __name__ == '__main__':
+    main()
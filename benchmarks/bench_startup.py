@@ -0,0 +1,56 @@
+"""
+Measures cold-start import time and peak RSS of the interactive program.
+
+Each case runs in a fresh interpreter with `python -X importtime`; the
+import time is the cumulative total reported for the top-level modules and
+RSS is the child's peak resident set size. The "with pandas" case imports
+pandas first, which is what every start cost before the menus stopped
+using DataFrames.
+
+    $ python -m benchmarks.bench_startup
+"""
+import os
+import re
+import resource
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CASES = {
+    'music_finder': 'import music_finder',
+    'music_finder with pandas': 'import pandas; import music_finder',
+}
+RUNS = 5
+
+
+def run(statement: str):
+    # Report the child's peak RSS on stderr after the imports finish
+    code = statement + '; import resource, sys; print("rss", resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, file=sys.stderr)'
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            cwd=ROOT, capture_output=True, text=True)
+    if result.returncode:
+        return None
+
+    total = 0
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        match = re.match(r'import time:\s+\d+\s+\|\s+(\d+)\s+\|( *)(\S+)', line)
+        if match and len(match.group(2)) == 1:
+            total += int(match.group(1))
+    rss = int(re.search(r'^rss (\d+)$', result.stderr, re.M).group(1))
+    return total / 1000, rss / 1024
+
+
+def main():
+    for label, statement in CASES.items():
+        samples = [run(statement) for _ in range(RUNS)]
+        if None in samples:
+            print('%-26s skipped (import failed)' % label)
+            continue
+        import_ms = sorted(s[0] for s in samples)[RUNS // 2]
+        rss_mb = sorted(s[1] for s in samples)[RUNS // 2]
+        print('%-26s imports %7.1f ms   peak RSS %6.1f MB' % (label, import_ms, rss_mb))
+
+
+if __name__ == '__main__':
+    main()
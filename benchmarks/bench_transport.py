@@ -0,0 +1,44 @@
+"""
+Compares per-call urllib connections with the pooled keep-alive transport
+over 1,000 sequential spotify.get_tracks calls against the local stub.
+
+    $ python -m benchmarks.bench_transport
+"""
+import statistics
+import time
+
+from benchmarks.stub_server import StubServer, point_helpers_at
+from helpers import spotify
+from helpers import transport
+
+CALLS = 1000
+
+
+def percentile(samples: list, p: float):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def run(label: str, chosen):
+    transport.set_transport(chosen)
+    spotify.get_tracks('warmup')
+    samples = []
+    for n in range(CALLS):
+        start = time.perf_counter()
+        spotify.get_tracks('radiohead %d' % n)
+        samples.append((time.perf_counter() - start) * 1000)
+    chosen.close()
+    print('%-8s p50 %.3f ms  p99 %.3f ms  mean %.3f ms' % (
+        label, percentile(samples, 50), percentile(samples, 99), statistics.mean(samples)))
+
+
+def main():
+    server = StubServer().start()
+    point_helpers_at(server)
+    run('urllib', transport.UrllibTransport())
+    run('pooled', transport.PooledTransport())
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
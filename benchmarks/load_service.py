@@ -0,0 +1,101 @@
+"""
+Load-tests helpers.service against the local stub upstream. The service
+runs in a background thread with its own event loop; clients keep their
+connections alive and each sends requests back to back for the duration
+of the run. Queries repeat, so concurrent callers often ask for the same
+thing and share one upstream fetch.
+
+    $ python -m benchmarks.load_service [--clients 64] [--seconds 10] [--latency 0.05]
+"""
+import argparse
+import asyncio
+import random
+import threading
+import time
+
+from benchmarks.stub_server import StubServer, point_helpers_at
+from helpers import async_spotify
+from helpers import async_transport
+from helpers import service
+from helpers import spotify
+
+
+def percentile(samples: list, p: float):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] if ordered else 0.0
+
+
+def start_service(max_pending: int, concurrency: int):
+    # Runs the service on its own loop in a daemon thread; returns its base URL
+    ready = threading.Event()
+    state = {}
+
+    def run():
+        async def main():
+            state['service'] = service.RecommendationService(async_spotify.AsyncSpotify(concurrency), max_pending)
+            server = await state['service'].start('127.0.0.1', 0)
+            state['url'] = 'http://127.0.0.1:%d' % server.sockets[0].getsockname()[1]
+            ready.set()
+            await state['service'].serve_forever()
+        asyncio.run(main())
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return state['url'], state['service']
+
+
+async def client(base_url: str, http, deadline: float, rng: random.Random, samples: list, statuses: dict):
+    paths = ['/search/artists?q=artist+%d' % n for n in range(20)] + \
+            ['/search/tracks?q=track+%d' % n for n in range(20)] + \
+            ['/artists/artist%06d/top-tracks' % n for n in range(10)] + \
+            ['/recommendations?genres=rock&artist_ids=artist%06d' % n for n in range(10)]
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            response = await http.get(base_url + rng.choice(paths))
+            status = response.status
+        except Exception as e:
+            status = getattr(e, 'code', type(e).__name__)
+        samples.append((time.perf_counter() - start) * 1000)
+        statuses[status] = statuses.get(status, 0) + 1
+
+
+async def load(base_url: str, clients: int, seconds: float):
+    http = async_transport.AsyncPooledTransport(pool_size=clients, max_per_host=clients)
+    samples, statuses = [], {}
+    deadline = time.monotonic() + seconds
+    started = time.perf_counter()
+    await asyncio.gather(*(client(base_url, http, deadline, random.Random(n), samples, statuses)
+                           for n in range(clients)))
+    elapsed = time.perf_counter() - started
+    await http.close()
+    return samples, statuses, elapsed
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--latency', type=float, default=0.05, help='upstream latency in seconds')
+    parser.add_argument('--max-pending', type=int, default=service.DEFAULT_MAX_PENDING)
+    parser.add_argument('--concurrency', type=int, default=32, help='upstream requests in flight at once')
+    args = parser.parse_args(argv)
+
+    upstream = StubServer(latency=args.latency).start()
+    point_helpers_at(upstream)
+    spotify.set_rate_limit(10000)
+    base_url, running = start_service(args.max_pending, args.concurrency)
+
+    samples, statuses, elapsed = asyncio.run(load(base_url, args.clients, args.seconds))
+    upstream_calls = sum(n for path, n in upstream.hits.items() if not path.endswith('/key'))
+    print('%d requests in %.1f s from %d clients: %.0f req/s' % (len(samples), elapsed, args.clients, len(samples) / elapsed))
+    print('latency    p50 %.2f ms  p95 %.2f ms  p99 %.2f ms  max %.2f ms' % (
+        percentile(samples, 50), percentile(samples, 95), percentile(samples, 99), max(samples)))
+    print('statuses   %s' % ', '.join('%s: %d' % item for item in sorted(statuses.items(), key=str)))
+    print('upstream   %d calls, %d requests shared an in-flight fetch, %d rejected' % (
+        upstream_calls, running.shared, running.rejected))
+    upstream.shutdown()
+
+
+if __name__ == '__main__':
+    main()
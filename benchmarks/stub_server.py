@@ -0,0 +1,290 @@
+"""
+A local stand-in for the apitutor key endpoint and the Spotify Web API,
+used by the benchmarks so they never touch the network.
+"""
+import gzip
+import http.server
+import json
+import os
+import random
+import threading
+import time
+import urllib.parse
+import zlib
+
+# API responses to replay, one file per kind of request (see load_fixtures).
+# The ones shipped are synthetic until replaced by benchmarks.suite --record,
+# which also removes the marker file saying so.
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+SYNTHETIC_MARKER = 'SYNTHETIC'
+FIXTURE_NAMES = ('key', 'search_track', 'search_artist', 'top_tracks', 'recommendations')
+
+
+# Paths of the cover art and preview clips the stub serves (see StubServer.asset)
+ASSET_PATHS = ('/image/', '/mp3-preview/')
+ASSETS_MODIFIED = 'Mon, 05 Oct 2026 12:00:00 GMT'
+
+# What /recommendations/available-genre-seeds answers
+GENRE_SEEDS = [
+    'acoustic', 'afrobeat', 'alt-rock', 'alternative', 'ambient', 'anime', 'black-metal', 'bluegrass', 'blues',
+    'bossanova', 'brazil', 'breakbeat', 'british', 'cantopop', 'chicago-house', 'children', 'chill',
+    'classical', 'club', 'comedy', 'country', 'dance', 'dancehall', 'death-metal', 'deep-house',
+    'detroit-techno', 'disco', 'disney', 'drum-and-bass', 'dub', 'dubstep', 'edm', 'electro', 'electronic',
+    'emo', 'folk', 'forro', 'french', 'funk', 'garage', 'german', 'gospel', 'goth', 'grindcore', 'groove',
+    'grunge', 'guitar', 'happy', 'hard-rock', 'hardcore', 'hardstyle', 'heavy-metal', 'hip-hop', 'holidays',
+    'honky-tonk', 'house', 'idm', 'indian', 'indie', 'indie-pop', 'industrial', 'iranian', 'j-dance', 'j-idol',
+    'j-pop', 'j-rock', 'jazz', 'k-pop', 'kids', 'latin', 'latino', 'malay', 'mandopop', 'metal', 'metal-misc',
+    'metalcore', 'minimal-techno', 'movies', 'mpb', 'new-age', 'new-release', 'opera', 'pagode', 'party',
+    'philippines-opm', 'piano', 'pop', 'pop-film', 'post-dubstep', 'power-pop', 'progressive-house',
+    'psych-rock', 'punk', 'punk-rock', 'r-n-b', 'rainy-day', 'reggae', 'reggaeton', 'road-trip', 'rock',
+    'rock-n-roll', 'rockabilly', 'romance', 'sad', 'salsa', 'samba', 'sertanejo', 'show-tunes',
+    'singer-songwriter', 'ska', 'sleep', 'songwriter', 'soul', 'soundtracks', 'spanish', 'study', 'summer',
+    'swedish', 'synth-pop', 'tango', 'techno', 'trance', 'trip-hop', 'turkish', 'work-out', 'world-music'
+]
+
+
+def fake_track(n: int):
+    return {
+        'id': 'track%06d' % n,
+        'name': 'Track %d' % n,
+        'preview_url': 'https://p.scdn.co/mp3-preview/%06d' % n,
+        'album': {
+            'id': 'album%06d' % (n // 10),
+            'name': 'Album %d' % (n // 10),
+            'images': [
+                {'url': 'https://i.scdn.co/image/large%06d' % (n // 10)},
+                {'url': 'https://i.scdn.co/image/small%06d' % (n // 10)}
+            ],
+            'artists': [{'id': 'artist%06d' % (n // 100), 'name': 'Artist %d' % (n // 100)}]
+        }
+    }
+
+
+def fake_artist(n: int):
+    return {
+        'id': 'artist%06d' % n,
+        'name': 'Artist %d' % n,
+        'genres': ['indie', 'rock'],
+        'images': [
+            {'url': 'https://i.scdn.co/image/artist-large%06d' % n},
+            {'url': 'https://i.scdn.co/image/artist-small%06d' % n}
+        ]
+    }
+
+
+def load_fixtures(folder: str = FIXTURES_DIR):
+    """
+    Reads the responses in folder, e.g. recommendations.json, into
+    a dictionary keyed by FIXTURE_NAMES for StubServer(fixtures=...).
+    """
+    fixtures = {}
+    for name in FIXTURE_NAMES:
+        path = os.path.join(folder, name + '.json')
+        if os.path.exists(path):
+            with open(path) as f:
+                fixtures[name] = json.load(f)
+    return fixtures
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        parts = urllib.parse.urlsplit(self.path)
+        self.server.count(parts.path)
+        if self.server.latency and not parts.path.endswith('/key'):
+            time.sleep(self.server.delay())
+        if self.server.should_fail(parts.path):
+            self.send_response(self.server.error_status)
+            if self.server.retry_after is not None:
+                self.send_header('Retry-After', str(self.server.retry_after))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if parts.path.startswith(ASSET_PATHS):
+            self.send_asset(parts.path)
+            return
+        payload = self.server.route(parts.path, urllib.parse.parse_qs(parts.query))
+        if payload is None:
+            self.send_error(404)
+            return
+
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        # A fake SendGrid: /v3/mail/send accepts any JSON body with 202
+        parts = urllib.parse.urlsplit(self.path)
+        self.server.count(parts.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.server.latency:
+            time.sleep(self.server.delay())
+        if parts.path != '/v3/mail/send':
+            self.send_error(404)
+            return
+        if self.server.should_fail(parts.path):
+            self.send_response(self.server.error_status)
+        else:
+            self.server.record_mail(json.loads(body))
+            self.send_response(202)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def send_asset(self, path: str):
+        # Cover art and preview clips: generated bytes with validators, answering
+        # conditional requests with 304 like the image and preview hosts
+        body = self.server.asset(path)
+        etag = '"%08x"' % zlib.crc32(body)
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg' if path.startswith('/image/') else 'audio/mpeg')
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', ASSETS_MODIFIED)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(http.server.ThreadingHTTPServer):
+    """
+    Answers like the key endpoint and the Spotify Web API, with generated
+    data or, given fixtures, with their responses replayed verbatim.
+        * page_size (int):    Items per generated search or recommendations page.
+        * total (int):        Number of results a generated search has in all.
+        * latency (float):    Seconds added to every API call (not key fetches).
+        * jitter (float):     Latency varies uniformly by up to this many seconds either way.
+        * error_rate (float): Share of API calls answered with error_status.
+        * fixtures (dict):    Recorded responses from load_fixtures; kinds missing from it are generated.
+        * asset_size (int):   Bytes in each image under /image/; previews under /mp3-preview/ are 100 times larger.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, page_size: int = 20, latency: float = 0,
+                 error_rate: float = 0, error_status: int = 503, retry_after: float = None,
+                 jitter: float = 0, fixtures: dict = None, total: int = 1000, asset_size: int = 4096):
+        super().__init__((host, port), StubHandler)
+        self.page_size = page_size
+        self.total = total
+        self.asset_size = asset_size
+        self.latency = latency
+        self.jitter = jitter
+        self.fixtures = fixtures or {}
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.hits = {}
+        self.emails = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return 'http://%s:%d' % self.server_address
+
+    def count(self, path: str):
+        with self._lock:
+            self.hits[path] = self.hits.get(path, 0) + 1
+
+    def record_mail(self, payload: dict):
+        with self._lock:
+            self.emails += len(payload.get('personalizations', []))
+
+    def delay(self):
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)) if self.jitter else self.latency
+
+    def should_fail(self, path: str):
+        return not path.endswith('/key') and self.error_rate and random.random() < self.error_rate
+
+    def route(self, path: str, query: dict):
+        recorded = self.fixtures.get(self.fixture_name(path, query))
+        if recorded is not None:
+            return recorded
+        if path.endswith('/key'):
+            return {'token': 'stub-token', 'expires_in': 3600}
+        if path == '/v1/search':
+            kind = query.get('type', ['track'])[0]
+            offset = int(query.get('offset', ['0'])[0])
+            limit = int(query.get('limit', [self.page_size])[0])
+            count = max(0, min(limit, self.total - offset))
+            if kind == 'artist':
+                items = [fake_artist(offset + n) for n in range(count)]
+            else:
+                items = [fake_track(offset + n) for n in range(count)]
+            following = None
+            if offset + count < self.total:
+                following = '%s/v1/search?type=%s&offset=%d&limit=%d' % (self.base_url, kind, offset + count, limit)
+            return {kind + 's': {'items': items, 'offset': offset, 'limit': limit, 'next': following,
+                                 'total': self.total}}
+        if path.startswith('/v1/artists/') and path.endswith('/top-tracks'):
+            return {'tracks': [fake_track(n) for n in range(10)]}
+        if path == '/v1/recommendations/available-genre-seeds':
+            return {'genres': GENRE_SEEDS}
+        if path == '/v1/recommendations':
+            return {'tracks': [fake_track(n) for n in range(self.page_size)]}
+        if path in ('/v1/tracks', '/v1/artists'):
+            kind = path[4:-1]
+            ids = [n for n in query.get('ids', [''])[0].split(',') if n]
+            return {kind + 's': [self.lookup(kind, item_id) for item_id in ids]}
+        if path.startswith(('/v1/tracks/', '/v1/artists/')) and path.count('/') == 3:
+            return self.lookup(path.split('/')[2][:-1], path.split('/')[3])
+        return None
+
+    def asset(self, path: str):
+        # Small images are a few kilobytes, previews a few hundred
+        size = self.asset_size * (100 if path.startswith('/mp3-preview/') else 1)
+        seed = path.encode()
+        return (seed * (size // len(seed) + 1))[:size]
+
+    @staticmethod
+    def lookup(kind: str, item_id: str):
+        # Generated IDs look like track000123; anything else is unknown
+        number = item_id[len(kind):]
+        if not item_id.startswith(kind) or not number.isdigit():
+            return None
+        return fake_track(int(number)) if kind == 'track' else fake_artist(int(number))
+
+    @staticmethod
+    def fixture_name(path: str, query: dict):
+        if path.endswith('/key'):
+            return 'key'
+        if path == '/v1/search':
+            return 'search_' + query.get('type', ['track'])[0]
+        if path.startswith('/v1/artists/') and path.endswith('/top-tracks'):
+            return 'top_tracks'
+        if path == '/v1/recommendations':
+            return 'recommendations'
+        return None
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def point_helpers_at(server: StubServer):
+    """
+    Redirects helpers.spotify to the stub server. The response cache is
+    switched off so every call reaches the stub; install one explicitly to
+    measure it.
+    """
+    from helpers import spotify
+    spotify.set_cache(None)
+    spotify.SPOTIFY_API = server.base_url + '/v1'
+    spotify.SPOTIFY_KEY_URL = server.base_url + '/spotify/key'
@@ -0,0 +1,231 @@
+"""
+Times every stage of the recommendation pipeline against the stub server
+replaying the responses in benchmarks/fixtures: the spotify
+calls, _simplify_tracks, utilities.get_dataframe (when pandas is
+installed) and get_formatted_tracklist_table_html, then all of them in a
+row. Results can be written as JSON and compared with an earlier run, so
+a regression between commits shows up as a non-zero exit.
+
+The fixtures in the repository are synthetic: made up in the
+shape of Spotify's responses, not recorded from the live API. While the
+SYNTHETIC marker sits next to them the suite says so; --record replaces
+them with real responses and removes the marker.
+
+    $ python -m benchmarks.suite [--iterations 200] [--latency 0] [--error-rate 0] [--json results.json]
+    $ python -m benchmarks.suite --compare baseline.json [--threshold 0.1]
+    $ python -m benchmarks.suite --record    # refresh the fixtures from the live API
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from benchmarks.stub_server import FIXTURES_DIR, SYNTHETIC_MARKER, StubServer, load_fixtures, point_helpers_at
+from helpers import spotify
+from helpers import utilities
+
+FORMAT_VERSION = 1
+
+
+def percentile(samples: list, p: float):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] if ordered else 0.0
+
+
+def has_pandas():
+    try:
+        import pandas  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_stages(fixtures: dict):
+    """
+    Returns (name, function) for each stage; each function does one iteration.
+    """
+    artist_id = fixtures['search_artist']['artists']['items'][0]['id']
+    raw_tracks = fixtures['recommendations']['tracks']
+    simplified = spotify._simplify_tracks(raw_tracks)
+    seeds = ([artist_id], [], ['indie'])
+
+    stages = [
+        ('spotify.get_tracks', lambda: spotify.get_tracks('glass')),
+        ('spotify.get_artists', lambda: spotify.get_artists('glass')),
+        ('spotify.get_top_tracks_by_artist', lambda: spotify.get_top_tracks_by_artist(artist_id)),
+        ('spotify.get_similar_tracks', lambda: spotify.get_similar_tracks(*seeds)),
+        ('spotify._simplify_tracks', lambda: spotify._simplify_tracks(raw_tracks)),
+    ]
+    if has_pandas():
+        stages.append(('utilities.get_dataframe', lambda: utilities.get_dataframe(simplified)))
+    stages.append(('utilities.get_formatted_tracklist_table_html',
+                   lambda: utilities.get_formatted_tracklist_table_html(simplified)))
+
+    def pipeline():
+        tracks = spotify.get_similar_tracks(*seeds)
+        if has_pandas():
+            tracks = utilities.get_dataframe(tracks)
+        return utilities.get_formatted_tracklist_table_html(tracks)
+
+    stages.append(('pipeline', pipeline))
+    return stages
+
+
+def measure(function, iterations: int):
+    function()
+    samples, errors = [], 0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        try:
+            function()
+        except spotify.SpotifyError:
+            errors += 1
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        'iterations': iterations,
+        'errors': errors,
+        'mean_ms': round(sum(samples) / len(samples), 4),
+        'min_ms': round(min(samples), 4),
+        'p50_ms': round(percentile(samples, 50), 4),
+        'p95_ms': round(percentile(samples, 95), 4),
+        'p99_ms': round(percentile(samples, 99), 4),
+    }
+
+
+def get_commit():
+    # The commit measured, marked dirty if the tree has uncommitted changes
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('-dirty' if dirty else '')
+
+
+def run(args):
+    fixtures = load_fixtures(args.fixtures)
+    if os.path.exists(os.path.join(args.fixtures, SYNTHETIC_MARKER)):
+        print('Replaying synthetic fixtures from %s, not recorded API responses (see --record)\n' % args.fixtures,
+              file=sys.stderr)
+    server = StubServer(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                        fixtures=fixtures).start()
+    point_helpers_at(server)
+    spotify.set_rate_limit(100000)
+
+    results = {}
+    for name, function in get_stages(fixtures):
+        results[name] = measure(function, args.iterations)
+        print('%-46s p50 %9.3f ms  p95 %9.3f ms  p99 %9.3f ms  errors %d' % (
+            name, results[name]['p50_ms'], results[name]['p95_ms'], results[name]['p99_ms'],
+            results[name]['errors']), file=sys.stderr)
+    server.shutdown()
+
+    return {
+        'version': FORMAT_VERSION,
+        'commit': get_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {
+            'iterations': args.iterations,
+            'latency': args.latency,
+            'jitter': args.jitter,
+            'error_rate': args.error_rate,
+            'pandas': has_pandas()
+        },
+        'results': results
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float):
+    """
+    Prints the change in median time of each stage since the baseline.
+    Returns the names of the stages more than threshold slower.
+    """
+    slower = []
+    if baseline.get('settings') != report['settings']:
+        print('\nThe baseline was run with different settings: %s' % json.dumps(baseline.get('settings')),
+              file=sys.stderr)
+    print('\n%-46s %12s %12s %8s' % ('compared with ' + str(baseline.get('commit'))[:12], 'before ms',
+                                      'after ms', 'change'), file=sys.stderr)
+    for name, result in report['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if before is None:
+            continue
+        change = result['p50_ms'] / before['p50_ms'] - 1 if before['p50_ms'] else 0.0
+        if change > threshold:
+            slower.append(name)
+        print('%-46s %12.3f %12.3f %+7.1f%%%s' % (name, before['p50_ms'], result['p50_ms'], change * 100,
+                                                 '  SLOWER' if change > threshold else ''), file=sys.stderr)
+    return slower
+
+
+def record(folder: str):
+    """
+    Saves fresh responses from the live API as fixtures. The API key is not saved.
+    """
+    spotify.set_cache(None)
+    responses = {
+        'key': {'token': 'fixture-token', 'expires_in': 3600},
+        'search_track': spotify.get_tracks('glass', simplify=False),
+        'search_artist': spotify.get_artists('glass', simplify=False)
+    }
+    artist_id = responses['search_artist']['artists']['items'][0]['id']
+    responses['top_tracks'] = spotify.get_top_tracks_by_artist(artist_id, simplify=False)
+    responses['recommendations'] = spotify.get_similar_tracks([artist_id], [], ['indie'], simplify=False)
+
+    os.makedirs(folder, exist_ok=True)
+    for name, payload in responses.items():
+        with open(os.path.join(folder, name + '.json'), 'w') as f:
+            json.dump(payload, f, indent=1)
+            f.write('\n')
+        print('Recorded %s' % os.path.join(folder, name + '.json'), file=sys.stderr)
+    marker = os.path.join(folder, SYNTHETIC_MARKER)
+    if os.path.exists(marker):
+        os.remove(marker)
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--iterations', type=int, default=200, help='timed iterations per stage')
+    parser.add_argument('--latency', type=float, default=0, help='seconds added to every API call')
+    parser.add_argument('--jitter', type=float, default=0, help='latency varies by up to this many seconds')
+    parser.add_argument('--error-rate', type=float, default=0, help='share of API calls answered with 503')
+    parser.add_argument('--fixtures', default=FIXTURES_DIR, metavar='DIR', help='responses to replay')
+    parser.add_argument('--json', metavar='FILE', help="write the results as JSON ('-' for standard output)")
+    parser.add_argument('--compare', metavar='FILE', help='JSON results of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='fail if a median is this much slower than in --compare (default 0.1, 10%%)')
+    parser.add_argument('--record', action='store_true', help='record new fixtures from the live API and exit')
+    args = parser.parse_args(argv)
+
+    if args.record:
+        record(args.fixtures)
+        return 0
+
+    report = run(args)
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    elif args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+
+    if args.compare:
+        with open(args.compare) as f:
+            slower = compare(report, json.load(f), args.threshold)
+        if slower:
+            print('\n%d stage(s) slower than the baseline: %s' % (len(slower), ', '.join(slower)), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
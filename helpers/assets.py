@@ -0,0 +1,264 @@
+import base64
+import concurrent.futures
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import urllib.error
+
+from helpers import metrics
+from helpers import transport
+from helpers import utilities
+
+DEFAULT_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'spotify_recommendations', 'assets')
+
+# Bytes of blobs kept on disk before the least recently used are evicted
+MAX_BYTES = 256 * 1024 * 1024
+
+# Seconds a download is used as is; after that it is revalidated with a conditional request
+MAX_AGE = 7 * 24 * 3600
+
+# Downloads in flight at once
+DEFAULT_WORKERS = 8
+
+
+class AssetCache:
+    """
+    Downloads cover art and preview clips into a content-addressed store:
+    each blob is kept once under the SHA-256 of its bytes, however many
+    URLs or tracks share it, and an SQLite index maps URLs to blobs along
+    with the ETag and Last-Modified they were served with. Downloads older
+    than max_age are revalidated with If-None-Match/If-Modified-Since, so
+    an unchanged file costs a 304 rather than its bytes. When the blobs
+    outgrow max_bytes the least recently used are deleted.
+        * path (str):        Folder the blobs and index are kept in.
+        * max_bytes (int):   Bytes of blobs to keep.
+        * max_age (float):   Seconds before a download is revalidated.
+        * workers (int):     Downloads in flight at once in prefetch().
+        * client:            Transport to download with (see transport.set_transport); by
+                             default a pool allowing `workers` connections to each host.
+    The hits, revalidated, downloaded and failed attributes count fetches by outcome.
+    """
+
+    def __init__(self, path: str = DEFAULT_DIR, max_bytes: int = MAX_BYTES, max_age: float = MAX_AGE,
+                 workers: int = DEFAULT_WORKERS, client=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.workers = workers
+        self.client = client or transport.PooledTransport(pool_size=workers, max_per_host=workers)
+        self.hits = self.revalidated = self.downloaded = self.failed = 0
+        self._lock = threading.Lock()
+        self._open()
+
+    def get(self, url: str):
+        """
+        Returns the local file holding the URL's content, without any
+        request, or None if it has not been downloaded.
+        """
+        with self._lock:
+            row = self._db.execute('SELECT digest FROM urls WHERE url = ?', (url,)).fetchone()
+        blob = self._blob_path(row[0]) if row else None
+        return blob if blob and os.path.isfile(blob) else None
+
+    def fetch(self, url: str):
+        """
+        Returns the local file holding the URL's content, downloading it if
+        it is missing and revalidating it if it is older than max_age, or
+        None if it cannot be downloaded.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._db.execute('SELECT digest, etag, last_modified, checked_at FROM urls WHERE url = ?',
+                                   (url,)).fetchone()
+        blob = self._blob_path(row[0]) if row else None
+        if blob and not os.path.isfile(blob):
+            row = blob = None
+
+        if row and now - row[3] < self.max_age:
+            self._touch(url, row[0], row[3], now)
+            return self._count('hit', blob)
+
+        headers = {}
+        if row and row[1]:
+            headers['If-None-Match'] = row[1]
+        if row and row[2]:
+            headers['If-Modified-Since'] = row[2]
+        try:
+            with metrics.timer('asset_request_seconds'):
+                response = self.client.get(url, headers=headers)
+        except urllib.error.HTTPError as e:
+            if e.code != 304 or not row:
+                return self._count('failed')
+            response = None
+        except (urllib.error.URLError, OSError, ValueError):
+            return self._count('failed')
+
+        if response is None or response.status == 304:
+            self._touch(url, row[0], now, now)
+            return self._count('revalidated', blob)
+
+        digest = hashlib.sha256(response.body).hexdigest()
+        blob = self._blob_path(digest)
+        if not os.path.isfile(blob):
+            # Written under a temporary name so a reader never sees part of a blob
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            temporary = '%s.%d.%d.tmp' % (blob, os.getpid(), threading.get_ident())
+            with open(temporary, 'wb') as f:
+                f.write(response.body)
+            os.replace(temporary, blob)
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO urls (url, digest, content_type, etag, last_modified, checked_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (url, digest, response.headers.get('Content-Type'), response.headers.get('ETag'),
+                 response.headers.get('Last-Modified'), now))
+            if self._db.execute('SELECT 1 FROM blobs WHERE digest = ?', (digest,)).fetchone() is None:
+                self._db.execute('INSERT INTO blobs (digest, size, used_at) VALUES (?, ?, ?)',
+                                 (digest, len(response.body), now))
+                self._size += len(response.body)
+            else:
+                self._db.execute('UPDATE blobs SET used_at = ? WHERE digest = ?', (now, digest))
+            if self._size > self.max_bytes:
+                self._evict(digest)
+            self._db.commit()
+        return self._count('downloaded', blob)
+
+    def prefetch(self, urls):
+        """
+        Fetches many URLs at once, each only once however often it is
+        given, with at most `workers` downloads in flight.
+            * urls (iterable): [Required] URLs; None and empty strings are skipped
+        Returns a dictionary of the local file for each URL (None for failures).
+        """
+        unique = list(dict.fromkeys(url for url in urls if url))
+        if not unique:
+            return {}
+        with concurrent.futures.ThreadPoolExecutor(min(self.workers, len(unique))) as pool:
+            return dict(zip(unique, pool.map(self.fetch, unique)))
+
+    def data_uris(self, urls):
+        """
+        Fetches the URLs (see prefetch) and returns a data: URI of each
+        one's content, for pages that must show them without the network.
+        URLs that could not be fetched are left out.
+        """
+        found = self.prefetch(urls)
+        with self._lock:
+            types = dict(self._db.execute(
+                'SELECT url, content_type FROM urls WHERE url IN (%s)' % ','.join('?' * len(found)),
+                list(found)).fetchall()) if found else {}
+        uris = {}
+        for url, blob in found.items():
+            if blob is None:
+                continue
+            with open(blob, 'rb') as f:
+                encoded = base64.b64encode(f.read()).decode('ascii')
+            uris[url] = 'data:%s;base64,%s' % (types.get(url) or 'application/octet-stream', encoded)
+        return uris
+
+    def stats(self):
+        with self._lock:
+            blobs, size = self._db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs').fetchone()
+            urls = self._db.execute('SELECT COUNT(*) FROM urls').fetchone()[0]
+            return {
+                'hits': self.hits,
+                'revalidated': self.revalidated,
+                'downloaded': self.downloaded,
+                'failed': self.failed,
+                'urls': urls,
+                'blobs': blobs,
+                'bytes': size
+            }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+        self.client.close()
+
+    def _open(self):
+        os.makedirs(self.path, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(self.path, 'index.sqlite3'), check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, digest TEXT, content_type TEXT, '
+            'etag TEXT, last_modified TEXT, checked_at REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS urls_digest ON urls (digest)')
+        self._db.execute('CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER, used_at REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS blobs_used_at ON blobs (used_at)')
+        self._db.commit()
+        self._size = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+
+    def _blob_path(self, digest: str):
+        # Fanned out over 256 folders so none grows too large
+        return os.path.join(self.path, digest[:2], digest)
+
+    def _touch(self, url: str, digest: str, checked_at: float, now: float):
+        with self._lock:
+            self._db.execute('UPDATE urls SET checked_at = ? WHERE url = ?', (checked_at, url))
+            self._db.execute('UPDATE blobs SET used_at = ? WHERE digest = ?', (now, digest))
+            self._db.commit()
+
+    def _count(self, outcome: str, blob: str = None):
+        with self._lock:
+            if outcome == 'hit':
+                self.hits += 1
+            elif outcome == 'revalidated':
+                self.revalidated += 1
+            elif outcome == 'downloaded':
+                self.downloaded += 1
+            else:
+                self.failed += 1
+        metrics.increment('asset_fetches_total', outcome=outcome)
+        return blob
+
+    def _evict(self, keep: str):
+        # Delete the least recently used blobs, never the one just stored, until under max_bytes
+        rows = self._db.execute('SELECT digest, size FROM blobs WHERE digest != ? ORDER BY used_at',
+                                (keep,)).fetchall()
+        evicted = []
+        for digest, size in rows:
+            if self._size <= self.max_bytes:
+                break
+            evicted.append((digest,))
+            self._size -= size
+            try:
+                os.remove(self._blob_path(digest))
+            except FileNotFoundError:
+                pass
+        self._db.executemany('DELETE FROM urls WHERE digest = ?', evicted)
+        self._db.executemany('DELETE FROM blobs WHERE digest = ?', evicted)
+
+
+def get_urls(tracks, kinds: tuple = ('art', 'preview')):
+    """
+    Lists the cover art (the small image the reports show) and preview
+    clip URLs of tracks, each once.
+        * tracks (iterable): [Required] Tracks as returned by the spotify helpers
+        * kinds (tuple):     'art', 'preview' or both
+    """
+    urls = []
+    for track in tracks:
+        if 'art' in kinds:
+            urls.append(utilities._track_field(track, 'album', 'image_url_small'))
+        if 'preview' in kinds:
+            urls.append(track.get('preview_url'))
+    return list(dict.fromkeys(url for url in urls if url))
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = AssetCache()
+    return _cache
+
+
+def set_cache(asset_cache: AssetCache):
+    global _cache
+    _cache = asset_cache
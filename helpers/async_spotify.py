@@ -0,0 +1,196 @@
+import asyncio
+
+from helpers import authentication
+from helpers import metrics
+from helpers import spotify
+from helpers import async_transport
+
+DEFAULT_CONCURRENCY = 8
+
+# asyncio reports timeouts and dropped connections with its own types
+_REQUEST_FAILURES = spotify._REQUEST_FAILURES + (asyncio.TimeoutError, asyncio.IncompleteReadError)
+
+
+class AsyncSpotify:
+    """
+    asyncio client for the Spotify endpoints wrapped by helpers.spotify.
+        * concurrency (int): Maximum number of requests in flight at once.
+    Results are shaped by the same _simplify_* helpers and failures raise the
+    same exceptions as the blocking functions. Every call can be cancelled.
+    """
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY, http=None):
+        self.concurrency = concurrency
+        self.http = http or async_transport.AsyncPooledTransport(
+            pool_size=concurrency, max_per_host=concurrency)
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        await self.http.close()
+
+    async def get_tracks(self, search_term: str, simplify: bool = True, models: bool = False):
+        """
+        Retrieves a list of Spotify tracks, given the search term passed in.
+            * search_term (str): [Required] A search term (for a song), represented as a string.
+            * simplify (bool):   Indicates whether you want to simplify the data that is returned.
+            * models (bool):     Return simplified tracks as compact Track objects instead of dicts.
+        Returns a list of tracks.
+        """
+        data = await self._issue_get_request(spotify._search_url(search_term, 'track'))
+        if not simplify:
+            return data
+        return spotify._simplify_tracks(data['tracks']['items'], models)
+
+    async def get_top_tracks_by_artist(self, artist_id: str, simplify: bool = True, models: bool = False):
+        """
+        Retrieves a list of Spotify "top tracks" by an artist
+            * artist_id (str): [Required] The Spotify id of the artist.
+            * simplify (bool):   Indicates whether you want to simplify the data that is returned.
+            * models (bool):     Return simplified tracks as compact Track objects instead of dicts.
+        Returns a list of tracks.
+        """
+        data = await self._issue_get_request(spotify._top_tracks_url(artist_id))
+        if not simplify:
+            return data
+        return spotify._simplify_tracks(data['tracks'], models)
+
+    async def get_artists(self, search_term: str, simplify: bool = True, models: bool = False):
+        """
+        Retrieves a list of Spotify artists, given the search term passed in.
+            * search_term (str): [Required] A search term (for an artist), represented as a string.
+            * simplify (bool):   Indicates whether you want to simplify the data that is returned.
+            * models (bool):     Return simplified artists as compact Artist objects instead of dicts.
+        Returns a list of artists.
+        """
+        data = await self._issue_get_request(spotify._search_url(search_term, 'artist'))
+        if not simplify:
+            return data
+        return spotify._simplify_artists(data['artists']['items'], models)
+
+    async def get_similar_tracks(self, artist_ids: list, track_ids: list, genres: list, simplify: bool = True, models: bool = False):
+        """
+        Spotify's recommendations for up to 5 seeds in total; see
+        spotify.get_similar_tracks for the seed rules.
+            * artist_ids (list): A list of artist ids
+            * track_ids (list): A list of track ids
+            * genres (genres): A list of genres
+            * models (bool): Return compact Track objects instead of dicts
+        Returns a list of tracks that are similar
+        """
+        if spotify._recommender is not None:
+            return spotify._recommender.get_similar_tracks(artist_ids, track_ids, genres, simplify, models)
+
+        url = spotify._recommendations_url(artist_ids, track_ids, genres)
+        data = await self._issue_get_request(url)
+        if not simplify:
+            return data
+        return spotify._simplify_tracks(data['tracks'], models)
+
+    async def _issue_get_request(self, url: str):
+        if not metrics.enabled():
+            return await self._get(url)
+        endpoint = spotify._endpoint(url)
+        with metrics.timer('spotify_request_seconds', endpoint=endpoint):
+            return await self._get(url, endpoint)
+
+    async def _get(self, url: str, endpoint: str = None):
+        # SQLite calls block, so only memory hits are answered on the event loop
+        if spotify._cache_configured:
+            response_cache = spotify.get_cache()
+        else:
+            response_cache = await asyncio.to_thread(spotify.get_cache)
+        if response_cache is not None:
+            data = response_cache.peek(url)
+            if data is None:
+                data = await self._off_loop(response_cache, response_cache.get, url)
+            if data is not None:
+                metrics.increment('spotify_requests_total', endpoint=endpoint, outcome='cached')
+                return data
+
+        ticket = spotify._breaker.allow()
+        if not ticket:
+            metrics.increment('spotify_requests_total', endpoint=endpoint, outcome='circuit_open')
+            raise spotify._circuit_open(url)
+
+        # Hand back a trial request however the call ends, including by cancellation
+        try:
+            attempt = 0
+            while True:
+                attempt += 1
+                async with self._semaphore:
+                    wait = spotify._limiter.try_acquire()
+                    while wait:
+                        await asyncio.sleep(wait)
+                        wait = spotify._limiter.try_acquire()
+
+                    token = authentication.peek_token(spotify.SPOTIFY_KEY_URL)
+                    if token is None:
+                        token = await asyncio.to_thread(authentication.get_token, spotify.SPOTIFY_KEY_URL)
+                    try:
+                        response = await self.http.get(url, {
+                            'Authorization': 'Bearer ' + token
+                        })
+                        data = response.json()
+                    except _REQUEST_FAILURES as e:
+                        # give a good error message:
+                        error = spotify._error_for(e, url)
+                    else:
+                        spotify._breaker.record_success()
+                        if response_cache is not None:
+                            await self._off_loop(response_cache, response_cache.set, url, data)
+                        metrics.increment('spotify_requests_total', endpoint=endpoint, outcome='ok')
+                        return data
+
+                # Back off outside the semaphore so waiting retries do not hold slots
+                delay = spotify._next_delay(error, attempt)
+                if delay is None:
+                    metrics.increment('spotify_requests_total', endpoint=endpoint, outcome='error', status=error.status)
+                    raise spotify._give_up(error)
+                metrics.increment('spotify_retries_total', endpoint=endpoint, status=error.status)
+                await asyncio.sleep(delay)
+        finally:
+            spotify._breaker.release(ticket)
+
+    @staticmethod
+    async def _off_loop(response_cache, method, *args):
+        # Runs a cache method on a thread if the cache has a file behind it
+        if response_cache.path:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+
+###################################################
+# Module-level shortcuts sharing a default client #
+###################################################
+_client = None
+_client_loop = None
+
+
+def _default_client():
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        _client, _client_loop = AsyncSpotify(), loop
+    return _client
+
+
+async def get_tracks(search_term: str, simplify: bool = True, models: bool = False):
+    return await _default_client().get_tracks(search_term, simplify, models)
+
+
+async def get_top_tracks_by_artist(artist_id: str, simplify: bool = True, models: bool = False):
+    return await _default_client().get_top_tracks_by_artist(artist_id, simplify, models)
+
+
+async def get_artists(search_term: str, simplify: bool = True, models: bool = False):
+    return await _default_client().get_artists(search_term, simplify, models)
+
+
+async def get_similar_tracks(artist_ids: list, track_ids: list, genres: list, simplify: bool = True, models: bool = False):
+    return await _default_client().get_similar_tracks(artist_ids, track_ids, genres, simplify, models)
@@ -0,0 +1,132 @@
+import asyncio
+import http.client
+import io
+import urllib.parse
+
+from helpers.transport import Response, _decode_body, _raise_for_status
+
+# Kept apart from helpers.transport so the blocking helpers do not pay for
+# importing asyncio at startup
+
+
+class AsyncPooledTransport:
+    """
+    The asyncio counterpart of PooledTransport, speaking HTTP/1.1 over
+    asyncio streams so requests can be awaited and cancelled.
+        * pool_size (int):    Maximum number of idle connections kept open in total.
+        * max_per_host (int): Maximum number of connections open to one host at a time.
+        * timeout (float):    Seconds allowed for one request and its response.
+    A request that is cancelled midway closes its connection instead of
+    returning it to the pool.
+    """
+
+    def __init__(self, pool_size: int = 10, max_per_host: int = 4, timeout: float = 30):
+        self.pool_size = pool_size
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self._idle = {}
+        self._idle_count = 0
+        self._slots = {}
+
+    async def get(self, url: str, headers: dict = None, timeout: float = None):
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        headers = dict(headers or {})
+        headers.setdefault('Host', parts.netloc)
+        headers.setdefault('Accept-Encoding', 'gzip')
+        headers.setdefault('Connection', 'keep-alive')
+        request = 'GET %s HTTP/1.1\r\n' % path
+        request += ''.join('%s: %s\r\n' % item for item in headers.items()) + '\r\n'
+
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = asyncio.Semaphore(self.max_per_host)
+
+        async with slot:
+            timeout = timeout if timeout is not None else self.timeout
+            stream, reused = await self._checkout(key, timeout)
+            try:
+                try:
+                    status, reason, response_headers, body, keep = await asyncio.wait_for(
+                        self._exchange(stream, request.encode('latin-1')), timeout)
+                except (asyncio.IncompleteReadError, ConnectionResetError, BrokenPipeError):
+                    if not reused:
+                        raise
+                    # The server dropped an idle keep-alive connection; retry once on a new one
+                    stream[1].close()
+                    stream = await self._connect(key, timeout)
+                    status, reason, response_headers, body, keep = await asyncio.wait_for(
+                        self._exchange(stream, request.encode('latin-1')), timeout)
+            except BaseException:
+                stream[1].close()
+                raise
+
+            if keep:
+                self._checkin(key, stream)
+            else:
+                stream[1].close()
+
+        body = _decode_body(body, response_headers.get('Content-Encoding'))
+        _raise_for_status(url, status, reason, response_headers, body)
+        return Response(url, status, response_headers, body)
+
+    async def close(self):
+        idle, self._idle, self._idle_count = self._idle, {}, 0
+        for streams in idle.values():
+            for reader, writer in streams:
+                writer.close()
+
+    async def _exchange(self, stream, request: bytes):
+        reader, writer = stream
+        writer.write(request)
+        await writer.drain()
+
+        head = await reader.readuntil(b'\r\n\r\n')
+        status_line, _, raw_headers = head.partition(b'\r\n')
+        version, status, reason = (status_line.decode('latin-1').split(' ', 2) + [''])[:3]
+        response_headers = http.client.parse_headers(io.BytesIO(raw_headers))
+        keep = version == 'HTTP/1.1' and response_headers.get('Connection', '').lower() != 'close'
+
+        if response_headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await reader.readuntil(b'\r\n')
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b''.join(chunks)
+        elif 'Content-Length' in response_headers:
+            body = await reader.readexactly(int(response_headers['Content-Length']))
+        else:
+            body = await reader.read()
+            keep = False
+
+        return int(status), reason.strip(), response_headers, body, keep
+
+    async def _checkout(self, key, timeout):
+        streams = self._idle.get(key)
+        while streams:
+            self._idle_count -= 1
+            stream = streams.pop()
+            if not stream[0].at_eof():
+                return stream, True
+            stream[1].close()
+        return await self._connect(key, timeout), False
+
+    def _checkin(self, key, stream):
+        if self._idle_count < self.pool_size:
+            self._idle.setdefault(key, []).append(stream)
+            self._idle_count += 1
+        else:
+            stream[1].close()
+
+    async def _connect(self, key, timeout):
+        scheme, host, port = key
+        return await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=(scheme == 'https') or None), timeout)
@@ -1,22 +1,156 @@
-import json
+import threading
+import time
 import urllib.error
-import urllib.request
 
+from helpers import metrics
+from helpers import transport
 from helpers import utilities
 
 API_TUTOR_TOKEN = 'API.fda8c628-f8f0-448d-aad8-42c2fcd067ec'
 
+# Spotify and SendGrid keys issued by apitutor are good for an hour unless
+# the endpoint tells us otherwise; refresh a little before they run out, but
+# never more than this share of a token's lifetime, so short-lived tokens are
+# not refreshed on every call
+DEFAULT_TOKEN_LIFETIME = 3600
+REFRESH_MARGIN = 300
+MAX_MARGIN_SHARE = 0.25
 
-def get_token(url):
+
+class TokenManager:
+    """
+    Keeps one bearer token per key URL and refreshes it only when needed.
+
+    A token that is close to expiring is still handed out while a single
+    background thread fetches its replacement. A missing or expired token
+    blocks the caller, but only one caller per URL performs the fetch and
+    the rest wait for its result.
+    """
+
+    def __init__(self, lifetime: int = DEFAULT_TOKEN_LIFETIME, margin: int = REFRESH_MARGIN):
+        self.lifetime = lifetime
+        self.margin = margin
+        self.fetch_count = 0
+        self._tokens = {}
+        self._locks = {}
+        self._refreshing = set()
+        self._guard = threading.Lock()
+
+    def get(self, url: str):
+        """
+        Returns a valid token for the key URL, fetching one if necessary.
+            * url (str): [Required] The apitutor key endpoint.
+        Returns the token as a string.
+        """
+        entry = self._tokens.get(url)
+        now = time.monotonic()
+
+        if entry is not None:
+            token, expires_at, refresh_at = entry
+            if now < refresh_at:
+                return token
+            if now < expires_at:
+                self._refresh_in_background(url)
+                return token
+
+        # No usable token: fetch one, letting only one caller per URL do so
+        with self._lock_for(url):
+            entry = self._tokens.get(url)
+            if entry is not None and time.monotonic() < entry[1]:
+                return entry[0]
+            return self._fetch(url)
+
+    def peek(self, url: str):
+        """
+        Returns the cached token for the key URL if it is still fresh, else None.
+        Never blocks, so async callers can skip a thread hop on the common path.
+        """
+        entry = self._tokens.get(url)
+        if entry is not None and time.monotonic() < entry[2]:
+            return entry[0]
+        return None
+
+    def invalidate(self, url: str):
+        """
+        Drops the cached token for the key URL, e.g. after the API rejects it.
+        """
+        with self._guard:
+            self._tokens.pop(url, None)
+
+    def clear(self):
+        with self._guard:
+            self._tokens.clear()
+
+    def _lock_for(self, url: str):
+        with self._guard:
+            lock = self._locks.get(url)
+            if lock is None:
+                lock = self._locks[url] = threading.Lock()
+            return lock
+
+    def _refresh_in_background(self, url: str):
+        with self._guard:
+            if url in self._refreshing:
+                return
+            self._refreshing.add(url)
+
+        def refresh():
+            try:
+                with self._lock_for(url):
+                    self._fetch(url)
+            except Exception:
+                # The current token is still valid; the next caller retries
+                pass
+            finally:
+                with self._guard:
+                    self._refreshing.discard(url)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def _fetch(self, url: str):
+        with metrics.timer('token_fetch_seconds', key=_key_name(url)):
+            token, lifetime = _request_token(url)
+        lifetime = lifetime or self.lifetime
+        expires_at = time.monotonic() + lifetime
+        with self._guard:
+            self.fetch_count += 1
+            self._tokens[url] = (token, expires_at, expires_at - min(self.margin, lifetime * MAX_MARGIN_SHARE))
+        return token
+
+
+def _key_name(url: str):
+    # 'spotify' for https://www.apitutor.org/spotify/key
+    return url.rstrip('/').rsplit('/', 2)[-2]
+
+
+def _request_token(url):
 
     try:
-        response = urllib.request.urlopen(url + '?auth_manager_token=' + API_TUTOR_TOKEN)
-        data = response.read()
-        results = data.decode('utf-8', 'ignore')
-        return json.loads(results)['token']
+        response = transport.get_transport().get(url + '?auth_manager_token=' + API_TUTOR_TOKEN)
+        results = response.json()
+        return results['token'], results.get('expires_in')
 
     except urllib.error.HTTPError as e:
         # give a good error message:
         error = utilities.get_error_message(e, url)
 
     raise Exception(error)
+
+
+_manager = TokenManager()
+
+
+def get_token(url):
+    if not metrics.enabled():
+        return _manager.get(url)
+    # Time spent waiting, which is near zero unless a token had to be fetched
+    with metrics.timer('token_wait_seconds', key=_key_name(url)):
+        return _manager.get(url)
+
+
+def invalidate_token(url):
+    _manager.invalidate(url)
+
+
+def peek_token(url):
+    return _manager.peek(url)
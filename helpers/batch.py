@@ -0,0 +1,222 @@
+import argparse
+import concurrent.futures
+import csv
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+from helpers import planner
+from helpers import ratelimit
+
+SEED_KEYS = ('artist_ids', 'track_ids', 'genres')
+
+
+#################
+# Reading Seeds #
+#################
+
+def _split_ids(value):
+    if isinstance(value, list):
+        return [str(n).strip() for n in value if str(n).strip()]
+    return [n for n in re.split(r'[,;|\s]+', value or '') if n]
+
+
+def read_seed_sets(path: str):
+    """
+    Yields seed sets from a JSONL or CSV file, one per line or row.
+
+    JSONL lines are objects with any of "artist_ids", "track_ids" and
+    "genres" as lists. CSV files have a header naming the same columns, with
+    several values in one cell separated by commas, semicolons or spaces.
+    Either format may carry an "id" used to identify the set in the output;
+    otherwise its position in the file is used.
+
+    :param path: location of the seed file
+    :return: generator of (id, seed set dictionary) tuples
+    """
+
+    with open(path, newline='') as f:
+        yield from parse_seed_sets(f, csv_format=path.lower().endswith('.csv'))
+
+
+def parse_seed_sets(lines, csv_format: bool = False):
+    """
+    Yields seed sets from an open file or any other iterable of lines, such
+    as sys.stdin, in the formats read_seed_sets accepts.
+
+    :param lines: iterable of JSONL lines, or of CSV lines if csv_format is set
+    :param csv_format: whether the lines are CSV with a header row
+    :return: generator of (id, seed set dictionary) tuples
+    """
+
+    if csv_format:
+        rows = csv.DictReader(lines)
+    else:
+        rows = (json.loads(line) for line in lines if line.strip())
+
+    for n, row in enumerate(rows):
+        seeds = {key: _split_ids(row.get(key)) for key in SEED_KEYS}
+        yield str(row.get('id') or n), seeds
+
+
+###############
+# Checkpoints #
+###############
+
+def load_completed(output_path: str):
+    """
+    Collects the IDs of seed sets whose tracks are already written to the
+    output file and trims a partially written last line left behind by a
+    crash. Sets recorded only with an error do not count, so they are
+    retried.
+
+    :param output_path: location of the JSONL results file
+    :return: set of completed seed set IDs
+    """
+
+    completed = set()
+    if not os.path.isfile(output_path):
+        return completed
+
+    with open(output_path, 'rb+') as f:
+        good = 0
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                result = json.loads(line)
+                if 'tracks' in result:
+                    completed.add(result['id'])
+            except (ValueError, KeyError):
+                break
+            good += len(line)
+        f.truncate(good)
+
+    return completed
+
+
+###########
+# Running #
+###########
+
+class BatchStats:
+    """
+    Thread-safe counters reported while a batch runs.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.done = 0
+        self.errors = 0
+        self.skipped = 0
+        self.tracks = 0
+        self._lock = threading.Lock()
+
+    def record(self, result: dict):
+        with self._lock:
+            self.done += 1
+            if 'error' in result:
+                self.errors += 1
+            else:
+                self.tracks += len(result['tracks'])
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed else 0.0
+        return ('%d seed sets in %.1fs (%.1f/s), %d tracks, %d errors, %d skipped from checkpoint'
+                % (self.done, elapsed, rate, self.tracks, self.errors, self.skipped))
+
+
+def recommend(seed_id: str, seeds: dict, limiter: ratelimit.TokenBucket = None):
+    """
+    Runs one seed set through planner.get_similar_tracks, so it may have more than five seeds.
+
+    :param seed_id: identifier written alongside the result
+    :param seeds: dictionary of artist_ids, track_ids and genres
+    :param limiter: optional token bucket shared by all workers, charged one token per request
+    :return: result dictionary with either "tracks" or "error"
+    """
+
+    try:
+        if limiter is not None:
+            # A seed set with more than five seeds is sent as several requests
+            for _ in planner.plan(seeds['artist_ids'], seeds['track_ids'], seeds['genres']):
+                limiter.acquire()
+        tracks = planner.get_similar_tracks(seeds['artist_ids'], seeds['track_ids'], seeds['genres'])
+        return {'id': seed_id, 'seeds': seeds, 'tracks': tracks}
+    except Exception as e:
+        return {'id': seed_id, 'seeds': seeds, 'error': str(e).split('\n')[0]}
+
+
+def run_batch(input_path: str, output_path: str, workers: int = 8, requests_per_second: float = 10,
+              report_every: float = 10, out=sys.stderr):
+    """
+    Produces recommendations for every seed set in the input file, streaming
+    one JSON line per set to the output file as results arrive. Sets whose
+    tracks are already in the output are skipped, so rerunning after a crash
+    resumes where the last run stopped. Sets that failed are tried again and
+    their new result appended, so when an ID appears on several lines the
+    last one is current.
+
+    :param input_path: JSONL or CSV file of seed sets
+    :param output_path: JSONL file results are appended to
+    :param workers: number of concurrent requests
+    :param requests_per_second: global budget shared by all workers (0 for none)
+    :param report_every: seconds between progress lines
+    :param out: stream progress and statistics are printed to
+    :return: BatchStats for the run
+    """
+
+    completed = load_completed(output_path)
+    limiter = ratelimit.TokenBucket(requests_per_second) if requests_per_second else None
+    stats = BatchStats()
+    last_report = stats.started
+
+    with open(output_path, 'a') as f, concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        pending = set()
+
+        def drain(return_when):
+            nonlocal pending, last_report
+            done, pending = concurrent.futures.wait(pending, return_when=return_when)
+            for future in done:
+                result = future.result()
+                f.write(json.dumps(result) + '\n')
+                stats.record(result)
+            f.flush()
+            if time.monotonic() - last_report >= report_every:
+                last_report = time.monotonic()
+                print(stats.summary(), file=out)
+
+        for seed_id, seeds in read_seed_sets(input_path):
+            if seed_id in completed:
+                stats.skipped += 1
+                continue
+            pending.add(pool.submit(recommend, seed_id, seeds, limiter))
+
+            # Keep a bounded window of work in flight instead of queueing the whole file
+            if len(pending) >= workers * 4:
+                drain(concurrent.futures.FIRST_COMPLETED)
+
+        drain(concurrent.futures.ALL_COMPLETED)
+
+    print(stats.summary(), file=out)
+    return stats
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description='Generate recommendations for many seed sets.')
+    parser.add_argument('input', help='JSONL or CSV file of seed sets')
+    parser.add_argument('output', help='JSONL file to append results to')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rps', type=float, default=10, help='global requests per second (0 for no limit)')
+    args = parser.parse_args(argv)
+
+    stats = run_batch(args.input, args.output, workers=args.workers, requests_per_second=args.rps)
+    return 1 if stats.errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,213 @@
+import collections
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'spotify_recommendations', 'responses.sqlite3')
+
+# Seconds each class of endpoint stays fresh. Artist and track metadata
+# barely changes, top tracks drift slowly, recommendations are meant to vary.
+DEFAULT_TTLS = {
+    'artist': 7 * 24 * 3600,
+    'track': 7 * 24 * 3600,
+    'search': 24 * 3600,
+    'top-tracks': 24 * 3600,
+    'genres': 7 * 24 * 3600,
+    'recommendations': 10 * 60,
+    'default': 3600
+}
+
+
+def normalize_url(url: str):
+    """
+    Reduces a Spotify URL to a canonical cache key so that different
+    encodings of the same query (quote vs quote_plus, letter case or extra
+    spaces in the search term, parameter order) share one entry.
+        * url (str): [Required] The request URL.
+    Returns the normalized URL as a string.
+    """
+    parts = urllib.parse.urlsplit(url)
+    params = []
+    for key, value in urllib.parse.parse_qsl(parts.query, keep_blank_values=True):
+        key = key.lower()
+        if key in ('q', 'type', 'country', 'market'):
+            # Search terms are case-insensitive; IDs elsewhere are not
+            value = ' '.join(value.lower().split())
+        params.append((key, value))
+    params.sort()
+    return urllib.parse.urlunsplit((
+        parts.scheme.lower(),
+        parts.netloc.lower(),
+        urllib.parse.unquote(parts.path).rstrip('/'),
+        urllib.parse.urlencode(params, quote_via=urllib.parse.quote),
+        ''
+    ))
+
+
+def endpoint_class(url: str):
+    """
+    Names the endpoint a URL belongs to, which selects its TTL.
+    """
+    path = urllib.parse.urlsplit(url).path.rstrip('/')
+    if path.endswith('/recommendations'):
+        return 'recommendations'
+    if path.endswith('/available-genre-seeds'):
+        return 'genres'
+    if path.endswith('/top-tracks'):
+        return 'top-tracks'
+    if path.endswith('/search'):
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)
+        return 'artist' if query.get('type') == ['artist'] else 'search'
+    if '/artists' in path:
+        return 'artist'
+    if '/tracks' in path:
+        return 'track'
+    return 'default'
+
+
+class ResponseCache:
+    """
+    Two-tier cache of decoded Spotify responses: an in-process LRU in front
+    of an SQLite file that survives between runs.
+        * path (str):           SQLite file, or None to keep only the memory tier.
+        * memory_entries (int): Maximum number of responses held in memory.
+        * disk_entries (int):   Maximum number of responses kept on disk.
+        * ttls (dict):          Seconds to live per endpoint class (see endpoint_class).
+    Entries are keyed on normalize_url(url). The hits and misses attributes
+    count lookups by tier.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, memory_entries: int = 512,
+                 disk_entries: int = 20000, ttls: dict = None):
+        self.path = path
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.hits = {'memory': 0, 'disk': 0}
+        self.misses = 0
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._writes = 0
+        if path:
+            self._open(path)
+
+    def get(self, url: str):
+        """
+        Returns the cached response for the URL, or None if it is missing or stale.
+        """
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    self.hits['memory'] += 1
+                    return entry[0]
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    'SELECT data, expires_at FROM responses WHERE key = ?', (key,)).fetchone()
+                if row is not None and row[1] > now:
+                    data = json.loads(row[0])
+                    self._db.execute('UPDATE responses SET used_at = ? WHERE key = ?', (now, key))
+                    self._db.commit()
+                    self._remember(key, data, row[1])
+                    self.hits['disk'] += 1
+                    return data
+
+            self.misses += 1
+            return None
+
+    def peek(self, url: str):
+        """
+        Returns the response for the URL if the memory tier holds a fresh one,
+        otherwise None, without touching the disk or counting a miss. Lets
+        asyncio code answer memory hits inline and send only the rest to
+        get() on a thread.
+        """
+        key = normalize_url(url)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None or entry[1] <= time.time():
+                return None
+            self._memory.move_to_end(key)
+            self.hits['memory'] += 1
+            return entry[0]
+
+    def set(self, url: str, data):
+        self.set_many([(url, data)])
+
+    def set_many(self, items: list):
+        """
+        Stores several responses, given as (url, data) pairs, in one transaction.
+        """
+        now = time.time()
+        rows = []
+        with self._lock:
+            for url, data in items:
+                key = normalize_url(url)
+                expires_at = now + self.ttls.get(endpoint_class(url), self.ttls['default'])
+                self._remember(key, data, expires_at)
+                rows.append((key, json.dumps(data), expires_at, now))
+            if self._db is not None and rows:
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO responses (key, data, expires_at, used_at) VALUES (?, ?, ?, ?)', rows)
+                # Evict once every 100 writes, however they are batched
+                if (self._writes + len(rows)) // 100 > self._writes // 100:
+                    self._evict_disk(now)
+                self._writes += len(rows)
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits['memory'] + self.hits['disk'] + self.misses
+            return {
+                'memory_hits': self.hits['memory'],
+                'disk_hits': self.hits['disk'],
+                'misses': self.misses,
+                'hit_rate': (lookups - self.misses) / lookups if lookups else 0.0,
+                'memory_entries': len(self._memory)
+            }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute('DELETE FROM responses')
+                self._db.commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _open(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS responses '
+            '(key TEXT PRIMARY KEY, data TEXT, expires_at REAL, used_at REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at)')
+        self._db.commit()
+
+    def _remember(self, key: str, data, expires_at: float):
+        self._memory[key] = (data, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, now: float):
+        # Drop stale rows first, then the least recently used beyond the bound
+        self._db.execute('DELETE FROM responses WHERE expires_at <= ?', (now,))
+        self._db.execute(
+            'DELETE FROM responses WHERE key IN '
+            '(SELECT key FROM responses ORDER BY used_at DESC LIMIT -1 OFFSET ?)',
+            (self.disk_entries,))
@@ -0,0 +1,241 @@
+import bz2
+import csv
+import gzip
+import json
+import lzma
+import os
+import tempfile
+
+from helpers import metrics
+from helpers import schema
+from helpers import utilities
+
+# Columns of every export, in order: the flat track layout of schema.TRACK_SCHEMA
+COLUMNS = [column for column, _, _ in schema.TRACK_SCHEMA]
+
+# Rows written at once, and rows per Parquet row group or Feather record batch
+CHUNK_SIZE = utilities.ROWS_PER_WRITE
+
+FORMATS = ('jsonl', 'csv', 'm3u', 'parquet', 'feather')
+EXTENSIONS = {'.jsonl': 'jsonl', '.ndjson': 'jsonl', '.csv': 'csv', '.m3u': 'm3u', '.m3u8': 'm3u',
+              '.parquet': 'parquet', '.feather': 'feather', '.arrow': 'feather'}
+
+# Formats written as text, which may be compressed as a whole
+TEXT_FORMATS = ('jsonl', 'csv', 'm3u')
+
+# Compression of text formats, by name and by file extension
+OPENERS = {'gzip': gzip.open, 'bz2': bz2.open, 'xz': lzma.open}
+COMPRESSIONS = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz'}
+
+
+def _getter(column: str):
+    group, _, key = column.partition('_')
+    if group in schema.NESTED_GROUPS and key:
+        return lambda track: utilities._track_field(track, group, key)
+    return lambda track: track.get(column)
+
+
+_GETTERS = [_getter(column) for column in COLUMNS]
+
+
+def rows(tracks):
+    """
+    Yields each track as a tuple of values in COLUMNS order. Accepts the
+    nested or flattened dictionaries and the compact models the spotify helpers return.
+        * tracks (iterable): [Required] Tracks
+    """
+    for track in tracks:
+        yield tuple(get(track) for get in _GETTERS)
+
+
+def _chunks(tracks, chunk_size: int):
+    chunk = []
+    for row in rows(tracks):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_jsonl(tracks, out, chunk_size: int = CHUNK_SIZE):
+    """
+    Streams tracks to a text stream as JSON lines, one object per track
+    laid out as the spotify helpers return it.
+    Returns the number of tracks written.
+    """
+    count = 0
+    chunk = []
+    for track in tracks:
+        chunk.append(json.dumps(track.to_dict() if hasattr(track, 'to_dict') else track) + '\n')
+        if len(chunk) == chunk_size:
+            out.write(''.join(chunk))
+            count += len(chunk)
+            chunk.clear()
+    out.write(''.join(chunk))
+    return count + len(chunk)
+
+
+def write_csv(tracks, out, chunk_size: int = CHUNK_SIZE):
+    """
+    Streams tracks to a text stream as CSV with a header row. Open files
+    with newline='' so the csv module controls line endings.
+    Returns the number of tracks written.
+    """
+    writer = csv.writer(out)
+    writer.writerow(COLUMNS)
+    count = 0
+    for chunk in _chunks(tracks, chunk_size):
+        writer.writerows(chunk)
+        count += len(chunk)
+    return count
+
+
+def write_m3u(tracks, out, chunk_size: int = CHUNK_SIZE, link: str = 'preview_url', files: dict = None):
+    """
+    Streams tracks to a text stream as an extended M3U playlist. Tracks
+    without a link (spotify has no preview of some tracks) are left out.
+        * link (str):   'preview_url' for the 30 second clips any player can
+                        play, or 'share_url' for links that open in spotify
+        * files (dict): Local copies to link to instead, by URL, e.g. from
+                        assets.AssetCache.prefetch
+    Returns the number of tracks written.
+    """
+    files = files or {}
+    if link not in ('preview_url', 'share_url'):
+        raise ValueError('link must be preview_url or share_url, not %r' % link)
+    url = COLUMNS.index(link)
+    name, artist = COLUMNS.index('name'), COLUMNS.index('artist_name')
+    out.write('#EXTM3U\n')
+    count = 0
+    for chunk in _chunks(tracks, chunk_size):
+        entries = ['#EXTINF:-1,%s - %s\n%s\n' % (row[artist] or '', row[name] or '',
+                                                  files.get(row[url]) or row[url])
+                   for row in chunk if row[url]]
+        out.write(''.join(entries))
+        count += len(entries)
+    return count
+
+
+def _arrow_batches(tracks, chunk_size: int):
+    import pyarrow as pa
+    arrow_schema = pa.schema([(column, pa.string()) for column in COLUMNS])
+    batches = (pa.RecordBatch.from_arrays([pa.array(values, pa.string()) for values in zip(*chunk)],
+                                          schema=arrow_schema)
+               for chunk in _chunks(tracks, chunk_size))
+    return arrow_schema, batches
+
+
+def write_parquet(tracks, path: str, chunk_size: int = CHUNK_SIZE, compression: str = 'snappy'):
+    """
+    Writes tracks to a Parquet file, one row group per chunk, so the
+    tracks are never all held in memory at once. Requires pyarrow.
+        * compression (str): Any codec pyarrow supports, e.g. 'snappy', 'zstd', or None
+    Returns the number of tracks written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    arrow_schema, batches = _arrow_batches(tracks, chunk_size)
+    count = 0
+    with pq.ParquetWriter(path, arrow_schema, compression=compression or 'none') as writer:
+        for batch in batches:
+            writer.write_table(pa.Table.from_batches([batch]))
+            count += batch.num_rows
+    return count
+
+
+def write_feather(tracks, path: str, chunk_size: int = CHUNK_SIZE, compression: str = None):
+    """
+    Writes tracks to a Feather (Arrow IPC) file, one record batch per
+    chunk. Requires pyarrow.
+        * compression (str): 'lz4', 'zstd' or None
+    Returns the number of tracks written.
+    """
+    import pyarrow as pa
+    arrow_schema, batches = _arrow_batches(tracks, chunk_size)
+    count = 0
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, arrow_schema, options=options) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            count += batch.num_rows
+    return count
+
+
+WRITERS = {'jsonl': write_jsonl, 'csv': write_csv, 'm3u': write_m3u,
+           'parquet': write_parquet, 'feather': write_feather}
+
+
+def guess_format(path: str):
+    """
+    Works out the format and compression a file name implies, e.g.
+    ('csv', 'gzip') for 'tracks.csv.gz'. Either is None if not implied.
+    """
+    stem, extension = os.path.splitext(path.lower())
+    compression = COMPRESSIONS.get(extension)
+    if compression:
+        stem, extension = os.path.splitext(stem)
+    return EXTENSIONS.get(extension), compression
+
+
+def write(tracks, out, output_format: str, chunk_size: int = CHUNK_SIZE, **options):
+    """
+    Streams tracks to an open text stream in one of the text formats,
+    e.g. standard output.
+        * tracks (iterable): [Required] Tracks as returned by the spotify helpers
+        * out (file):        [Required] Anything with write(str)
+        * output_format (str): [Required] 'jsonl', 'csv' or 'm3u'
+    Returns the number of tracks written.
+    """
+    if output_format not in TEXT_FORMATS:
+        raise ValueError('%s cannot be written to a stream; give a file name' % output_format)
+    with metrics.timer('render_seconds', output=output_format):
+        return WRITERS[output_format](tracks, out, chunk_size, **options)
+
+
+def export(tracks, path: str, output_format: str = None, compression: str = None,
+           chunk_size: int = CHUNK_SIZE, **options):
+    """
+    Writes tracks to a file in any of FORMATS. The file is written under a
+    temporary name in the same folder and renamed into place when complete,
+    so readers never see half a file and a failed export leaves nothing behind.
+        * tracks (iterable):   [Required] Tracks as returned by the spotify helpers
+        * path (str):          [Required] File to write, e.g. from utilities.name_file
+        * output_format (str): One of FORMATS; by default implied by the file extension
+        * compression (str):   For text formats 'gzip', 'bz2' or 'xz', by default implied
+                               by a .gz, .bz2 or .xz extension; for parquet and feather,
+                               the codec passed to pyarrow
+        * chunk_size (int):    Tracks written at once
+        * options:             Passed to the writer, e.g. link='share_url' for m3u
+    Returns the number of tracks written.
+    """
+    implied_format, implied_compression = guess_format(path)
+    output_format = output_format or implied_format
+    if output_format not in WRITERS:
+        raise ValueError('Cannot tell what format to write %s in; choose one of %s' % (path, ', '.join(FORMATS)))
+    if output_format in TEXT_FORMATS:
+        compression = compression or implied_compression
+        if compression and compression not in OPENERS:
+            raise ValueError('Unknown compression %r; choose one of %s' % (compression, ', '.join(OPENERS)))
+    elif compression is None:
+        compression = 'snappy' if output_format == 'parquet' else None
+
+    folder, name = os.path.split(os.path.abspath(path))
+    handle, temporary = tempfile.mkstemp(prefix='.' + name + '.', suffix='.tmp', dir=folder)
+    os.close(handle)
+    try:
+        with metrics.timer('render_seconds', output=output_format):
+            if output_format not in TEXT_FORMATS:
+                count = WRITERS[output_format](tracks, temporary, chunk_size, compression, **options)
+            else:
+                opener = OPENERS[compression] if compression else open
+                with opener(temporary, 'wt', encoding='utf-8', newline='') as out:
+                    count = WRITERS[output_format](tracks, out, chunk_size, **options)
+        # mkstemp makes files only their owner can read
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+    return count
@@ -0,0 +1,186 @@
+import bisect
+import json
+import os
+import threading
+import time
+
+from helpers import search_index
+from helpers import spotify
+
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'spotify_recommendations', 'genres.json')
+
+# The seed list rarely changes; refetch it after a week, or sooner with refresh()
+MAX_AGE = 7 * 24 * 3600
+
+# Fuzzy matches sharing less than this share of trigrams are left out
+MIN_SCORE = 0.3
+
+
+class GenreCatalog:
+    """
+    Every genre Spotify accepts as a recommendations seed. The list is
+    fetched from /recommendations/available-genre-seeds once, kept on disk
+    and fetched again when older than max_age. If it cannot be fetched and
+    nothing is on disk, the abridged list stands in and nothing is rejected.
+
+    Membership tests use a set, so seeds are checked in constant time
+    before any request is made; filter() finds genres by prefix,
+    substring or fuzzy match.
+        * path (str):      File the list is kept in, or None to keep it in memory only.
+        * max_age (float): Seconds before the list on disk is fetched again.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, max_age: float = MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self.complete = False
+        self.fetched = None
+        self._genres = []
+        self._set = frozenset()
+        self._keys = []
+        self._by_key = {}
+        self._trigrams = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.load())
+
+    def __iter__(self):
+        return iter(self.load())
+
+    def __contains__(self, genre: str):
+        self.load()
+        return genre in self._set
+
+    @property
+    def genres(self):
+        """
+        The genres in alphabetical order.
+        """
+        return list(self.load())
+
+    def invalid(self, genres: list):
+        """
+        Returns the genres Spotify would reject, or an empty list while
+        only the abridged list is available.
+        """
+        self.load()
+        if not self.complete:
+            return []
+        return [genre for genre in genres if genre not in self._set]
+
+    def suggest(self, text: str):
+        """
+        Returns the genre text most likely means, or None.
+        """
+        found = self.filter(text, 1)
+        return found[0] if found else None
+
+    def filter(self, text: str, limit: int = None):
+        """
+        Finds genres matching free text: genres starting with it first, then
+        genres containing it, then the closest fuzzy matches. Case is ignored
+        and hyphens count as spaces, so 'Hip Hop' finds 'hip-hop'.
+            * text (str):  [Required] What the user typed
+            * limit (int): Most genres to return
+        Returns a list of genres, best first.
+        """
+        self.load()
+        query = search_index.normalize(text)
+        if not query:
+            return self.genres[:limit]
+
+        # Keys are sorted, so genres starting with the query are one contiguous run
+        start = bisect.bisect_left(self._keys, query)
+        end = bisect.bisect_left(self._keys, query + '\uffff', start)
+        found = dict.fromkeys(self._keys[start:end])
+        found.update(dict.fromkeys(key for key in self._keys if query in key))
+        if limit is None or len(found) < limit:
+            # Share of trigrams in common, as search_index scores names
+            grams = search_index._trigrams(query)
+            scored = sorted(((2 * len(grams & other) / (len(grams) + len(other)), key)
+                             for key, other in self._trigrams.items() if key not in found), reverse=True)
+            found.update(dict.fromkeys(key for score, key in scored if score >= MIN_SCORE))
+        return [self._by_key[key] for key in found][:limit]
+
+    def refresh(self):
+        """
+        Fetches the list from Spotify now and saves it.
+        """
+        data = spotify._issue_get_request(spotify.SPOTIFY_API + '/recommendations/available-genre-seeds',
+                                          use_cache=False)
+        with self._lock:
+            self._use(data['genres'], time.time(), True)
+            self._loaded = True
+            if self.path:
+                self._save()
+        return self.genres
+
+    def load(self):
+        """
+        Reads the list from disk, fetching it first if it is missing or
+        stale. Every other method calls this, so it only needs calling to
+        load the list ahead of time.
+        """
+        if self._loaded:
+            return self._genres
+        stale = False
+        with self._lock:
+            if not self._loaded:
+                saved = self._read()
+                if saved is not None:
+                    self._use(saved['genres'], saved['fetched'], True)
+                    stale = time.time() - saved['fetched'] > self.max_age
+                else:
+                    stale = True
+                    self._use(spotify.get_genres_abridged(), None, False)
+                self._loaded = True
+        if stale:
+            try:
+                self.refresh()
+            except Exception:
+                # Keep what is on disk, or the abridged list, until the next run
+                pass
+        return self._genres
+
+    def _use(self, genres: list, fetched: float, complete: bool):
+        self._genres = sorted(set(genres))
+        self._set = frozenset(self._genres)
+        self._by_key = {search_index.normalize(genre): genre for genre in self._genres}
+        self._keys = sorted(self._by_key)
+        self._trigrams = {key: search_index._trigrams(key) for key in self._keys}
+        self.fetched = fetched
+        self.complete = complete
+
+    def _read(self):
+        if not self.path or not os.path.isfile(self.path):
+            return None
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+            return saved if saved.get('genres') and saved.get('fetched') else None
+        except (OSError, ValueError):
+            return None
+
+    def _save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump({'fetched': self.fetched, 'genres': self._genres}, f)
+        os.replace(temporary, self.path)
+
+
+_catalog = None
+
+
+def get_catalog():
+    global _catalog
+    if _catalog is None:
+        _catalog = GenreCatalog()
+    return _catalog
+
+
+def set_catalog(catalog: GenreCatalog):
+    global _catalog
+    _catalog = catalog
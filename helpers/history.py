@@ -0,0 +1,273 @@
+import array
+import bisect
+import hashlib
+import heapq
+import json
+import mmap
+import os
+import sqlite3
+import threading
+import time
+
+from helpers import spotify
+
+DEFAULT_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'spotify_recommendations', 'history')
+
+# Sorted runs kept per recipient before the smallest are merged
+MAX_RUNS = 8
+
+
+def id_key(spotify_id: str):
+    """
+    Maps a Spotify ID to the 64-bit integer stored for it. With ten million
+    IDs delivered to a recipient, a new ID is mistaken for a delivered one
+    with odds of about one in 10^12, at worst hiding one track.
+    """
+    return int.from_bytes(hashlib.blake2b(spotify_id.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def merge_runs(left, right):
+    """
+    Merges two sorted runs of 64-bit keys into one without repeats, as a
+    numpy array if numpy is installed, otherwise an array.array. Either
+    way the keys take 8 bytes each rather than becoming Python ints.
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        return array.array('Q', _unique(heapq.merge(left, right)))
+
+    keys = np.concatenate((np.frombuffer(left, dtype=np.uint64), np.frombuffer(right, dtype=np.uint64)))
+    # A stable sort is a timsort, which merges two sorted runs in linear time
+    keys.sort(kind='stable')
+    first = np.ones(len(keys), dtype=bool)
+    np.not_equal(keys[1:], keys[:-1], out=first[1:])
+    return keys[first]
+
+
+def _unique(keys):
+    last = None
+    for key in keys:
+        if key != last:
+            yield key
+            last = key
+
+
+class DeliveredSet:
+    """
+    The IDs already sent to one recipient, stored as 8-byte keys (see
+    id_key) in a few sorted run files that are opened with mmap. Lookups
+    bisect each run, so they stay fast at tens of millions of IDs without
+    loading them into memory. add() buffers new IDs until save() writes
+    them as a new run; once there are more than MAX_RUNS, the smallest
+    neighbouring runs are merged.
+        * folder (str): Directory holding this recipient's runs.
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self._pending = set()
+        self._runs = []
+        self._open()
+
+    def __len__(self):
+        # An ID added again before its runs are merged is counted twice
+        return sum(len(run) for _, _, run in self._runs) + len(self._pending)
+
+    def __contains__(self, spotify_id: str):
+        return self._has(id_key(spotify_id))
+
+    def unseen(self, spotify_ids):
+        """
+        Returns the IDs that are not in the set, in the order given.
+        """
+        return [n for n in spotify_ids if not self._has(id_key(n))]
+
+    def add(self, spotify_ids):
+        self._pending.update(map(id_key, spotify_ids))
+
+    def save(self):
+        """
+        Writes the IDs added since the last save as a new sorted run.
+        """
+        if not self._pending:
+            return
+        keys = array.array('Q', sorted(self._pending))
+        self._pending.clear()
+        os.makedirs(self.folder, exist_ok=True)
+        number = max([entry[0] for entry in self._runs], default=0) + 1
+        self._write(number, keys)
+        self._runs.append(self._map(number))
+        if len(self._runs) > MAX_RUNS:
+            self._compact()
+
+    def close(self):
+        for _, files, run in self._runs:
+            self._unmap(files, run)
+        self._runs = []
+
+    def _has(self, key: int):
+        return key in self._pending or self._has_saved(key)
+
+    def _has_saved(self, key: int):
+        for _, _, run in self._runs:
+            n = bisect.bisect_left(run, key)
+            if n < len(run) and run[n] == key:
+                return True
+        return False
+
+    def _path(self, number: int):
+        return os.path.join(self.folder, 'run-%06d.q' % number)
+
+    def _open(self):
+        if not os.path.isdir(self.folder):
+            return
+        for name in sorted(os.listdir(self.folder)):
+            # Runs are never empty, and mmap cannot map an empty file
+            if name.startswith('run-') and name.endswith('.q') and os.path.getsize(os.path.join(self.folder, name)):
+                self._runs.append(self._map(int(name[4:-2])))
+
+    def _map(self, number: int):
+        handle = open(self._path(number), 'rb')
+        mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        return number, (handle, mapped, view), view.cast('Q')
+
+    @staticmethod
+    def _unmap(files: tuple, run: memoryview):
+        handle, mapped, view = files
+        run.release()
+        view.release()
+        mapped.close()
+        handle.close()
+
+    def _write(self, number: int, keys):
+        temporary = self._path(number) + '.tmp'
+        with open(temporary, 'wb') as f:
+            keys.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self._path(number))
+
+    def _compact(self):
+        # Merge the adjacent pair with the fewest keys, dropping repeats
+        sizes = [len(run) for _, _, run in self._runs]
+        n = min(range(len(sizes) - 1), key=lambda i: sizes[i] + sizes[i + 1])
+        left, right = self._runs[n][2], self._runs[n + 1][2]
+        number = max(entry[0] for entry in self._runs) + 1
+        self._write(number, merge_runs(left, right))
+        old = self._runs[n:n + 2]
+        self._runs[n:n + 2] = [self._map(number)]
+        for merged, files, run in old:
+            self._unmap(files, run)
+            os.remove(self._path(merged))
+
+
+class History:
+    """
+    Recurring digests: named seed sets, each sent to one recipient, and the
+    tracks already delivered to every recipient. refresh() gets the
+    current recommendations for a digest and keeps only the tracks its
+    recipient has not been sent; mark_delivered() records them once sent.
+        * folder (str): Directory for the digest database and the delivered ID runs.
+    """
+
+    def __init__(self, folder: str = DEFAULT_DIR):
+        self.folder = folder
+        self._sets = {}
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(folder, 'digests.sqlite3'), check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS digests (name TEXT PRIMARY KEY, recipient TEXT, seeds TEXT, '
+            'created REAL, refreshed REAL, runs INTEGER DEFAULT 0, delivered INTEGER DEFAULT 0)')
+        self._db.commit()
+
+    def save_digest(self, name: str, recipient: str, artist_ids: list = (), track_ids: list = (), genres: list = (),
+                    labels: dict = None):
+        """
+        Creates or replaces a digest's recipient and seeds.
+            * labels (dict): Names to show for the seeds in reports, as {'artists': [...], 'tracks': [...]}
+        """
+        seeds = {'artist_ids': list(artist_ids), 'track_ids': list(track_ids), 'genres': list(genres),
+                 'labels': dict(labels or {})}
+        with self._lock:
+            self._db.execute(
+                'INSERT INTO digests (name, recipient, seeds, created) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (name) DO UPDATE SET recipient = excluded.recipient, seeds = excluded.seeds',
+                (name, recipient, json.dumps(seeds), time.time()))
+            self._db.commit()
+
+    def get_digest(self, name: str):
+        """
+        Returns the digest as a dictionary, or None if there is no such digest.
+        """
+        with self._lock:
+            row = self._db.execute(
+                'SELECT name, recipient, seeds, created, refreshed, runs, delivered FROM digests WHERE name = ?',
+                (name,)).fetchone()
+        if row is None:
+            return None
+        digest = dict(zip(('name', 'recipient', 'seeds', 'created', 'refreshed', 'runs', 'delivered'), row))
+        digest['seeds'] = json.loads(digest['seeds'])
+        return digest
+
+    def digests(self):
+        with self._lock:
+            return [row[0] for row in self._db.execute('SELECT name FROM digests ORDER BY name')]
+
+    def delivered(self, recipient: str):
+        """
+        Returns the DeliveredSet of the tracks sent to a recipient.
+        """
+        with self._lock:
+            found = self._sets.get(recipient)
+            if found is None:
+                folder = os.path.join(self.folder, hashlib.sha1(recipient.lower().encode('utf-8')).hexdigest())
+                found = self._sets[recipient] = DeliveredSet(folder)
+            return found
+
+    def refresh(self, name: str, fetch=None):
+        """
+        Gets recommendations for a digest's seeds and drops every track its
+        recipient has already been sent.
+            * name (str):  [Required] The digest
+            * fetch:       Called with (artist_ids, track_ids, genres) for the candidate
+                           tracks; spotify.get_similar_tracks (and its response cache) by default
+        Returns (new tracks, number of tracks left out as already sent).
+        """
+        digest = self.get_digest(name)
+        if digest is None:
+            raise KeyError('No digest named %r' % name)
+        seeds = digest['seeds']
+        tracks = (fetch or spotify.get_similar_tracks)(seeds['artist_ids'], seeds['track_ids'], seeds['genres'])
+
+        sent = self.delivered(digest['recipient'])
+        unseen = set(sent.unseen([track['id'] for track in tracks]))
+        new = [track for track in tracks if track['id'] in unseen]
+        with self._lock:
+            self._db.execute('UPDATE digests SET refreshed = ?, runs = runs + 1 WHERE name = ?', (time.time(), name))
+            self._db.commit()
+        return new, len(tracks) - len(new)
+
+    def mark_delivered(self, name: str, tracks: list):
+        """
+        Records tracks as sent to a digest's recipient, so later refreshes leave them out.
+        """
+        digest = self.get_digest(name)
+        if digest is None:
+            raise KeyError('No digest named %r' % name)
+        sent = self.delivered(digest['recipient'])
+        sent.add(track['id'] for track in tracks)
+        sent.save()
+        with self._lock:
+            self._db.execute('UPDATE digests SET delivered = delivered + ? WHERE name = ?', (len(tracks), name))
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            for found in self._sets.values():
+                found.close()
+            self._sets = {}
+            self._db.close()
@@ -0,0 +1,387 @@
+import base64
+import hashlib
+import http.client
+import json
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+from helpers import authentication
+from helpers import metrics
+from helpers import retry
+
+SENDGRID_API = 'https://api.sendgrid.com'
+SENDGRID_KEY_URL = 'https://www.apitutor.org/sendgrid/key'
+
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'spotify_recommendations', 'mail.sqlite3')
+DEFAULT_SENDERS = 2
+ATTACHMENT_NAME = 'Music_Recommendations.html'
+
+# SendGrid accepts up to this many personalizations (recipient groups) per request
+MAX_PERSONALIZATIONS = 1000
+
+# Seconds a claimed batch belongs to its sender; after that it is taken to have
+# died with the program that claimed it, and the batch is sent again
+DEFAULT_LEASE = 300
+
+# Longest wait between looks at the database for changes made by other programs
+POLL_INTERVAL = 1.0
+
+
+class MailError(Exception):
+    """
+    SendGrid refused a message; status is None for network failures.
+    """
+
+    def __init__(self, message: str, status: int = None, retry_after: float = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class SendGridClient:
+    """
+    Posts v3 mail/send requests, keeping one connection alive per thread
+    and one API key for every message until SendGrid rejects it.
+        * host (str):    Base URL of the API, e.g. a local fake for benchmarks.
+        * key_url (str): Where the API key is fetched from (see authentication).
+        * timeout (float): Socket timeout in seconds.
+    """
+
+    def __init__(self, host: str = SENDGRID_API, key_url: str = SENDGRID_KEY_URL, timeout: float = 30):
+        self.host = host
+        self.key_url = key_url
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def send(self, payload: dict):
+        token = authentication.get_token(self.key_url)
+        body = json.dumps(payload).encode('utf-8')
+        headers = {
+            'Authorization': 'Bearer ' + token,
+            'Content-Type': 'application/json',
+            'Connection': 'keep-alive'
+        }
+        try:
+            response = self._request(body, headers)
+        except (http.client.HTTPException, OSError) as e:
+            self._drop_connection()
+            raise MailError('Could not reach SendGrid: %s' % e) from e
+
+        text = response.read()
+        if response.will_close:
+            self._drop_connection()
+        if response.status == 401:
+            authentication.invalidate_token(self.key_url)
+        if response.status >= 300:
+            raise MailError('SendGrid answered %d: %s' % (response.status, text[:200].decode('utf-8', 'replace')),
+                            response.status, retry.parse_retry_after(response.headers.get('Retry-After')))
+
+    def close(self):
+        self._drop_connection()
+
+    def _request(self, body: bytes, headers: dict):
+        conn = getattr(self._local, 'conn', None)
+        reused = conn is not None
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        try:
+            conn.request('POST', '/v3/mail/send', body, headers)
+            return conn.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            if not reused:
+                raise
+            # The server dropped an idle keep-alive connection; retry once on a new one
+            self._drop_connection()
+            conn = self._local.conn = self._connect()
+            conn.request('POST', '/v3/mail/send', body, headers)
+            return conn.getresponse()
+
+    def _connect(self):
+        parts = urllib.parse.urlsplit(self.host)
+        if parts.scheme == 'https':
+            return http.client.HTTPSConnection(parts.hostname, parts.port, timeout=self.timeout)
+        return http.client.HTTPConnection(parts.hostname, parts.port, timeout=self.timeout)
+
+    def _drop_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class MailQueue:
+    """
+    A durable outbox for report emails, kept in SQLite so nothing queued is
+    lost if the program exits before it is sent.
+
+    enqueue() stores a message and returns at once; a pool of sender
+    threads delivers it. Each distinct report (HTML body plus attachment)
+    is stored and base64-encoded once, however many messages share it, and
+    messages sharing a report, sender and subject go out together as the
+    personalizations of one request. Failures are retried with jittered
+    backoff; messages that run out of attempts are marked failed.
+
+    Several programs may share one queue file: a batch is claimed in one
+    write transaction, and held for lease seconds, so only one of them
+    sends it.
+        * path (str):          SQLite file holding the queue.
+        * client:              Anything with send(payload dict); a SendGridClient by default.
+        * senders (int):       Number of sender threads.
+        * retry_policy:        retry.RetryPolicy deciding retries and their delays.
+        * batch_size (int):    Most messages per request.
+        * lease (float):       Seconds before a batch claimed by a program that stopped is sent again.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, client=None, senders: int = DEFAULT_SENDERS,
+                 retry_policy: retry.RetryPolicy = None, batch_size: int = MAX_PERSONALIZATIONS,
+                 lease: float = DEFAULT_LEASE):
+        self.path = path
+        self.client = client or SendGridClient()
+        self.senders = senders
+        self.retry_policy = retry_policy or retry.RetryPolicy(attempts=6, base=1, cap=300)
+        self.batch_size = batch_size
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._stopping = False
+        self._threads = []
+        self._reports = {}
+        self._attachments = {}
+        self._open(path)
+
+    def enqueue(self, sender: str, receivers: tuple, subject: str, html_content: str, file_name: str = None):
+        """
+        Queues one email and returns its ID without waiting for it to be sent.
+            * sender (str):      [Required] From address
+            * receivers (tuple): [Required] To addresses, all in one personalization
+            * subject (str):     [Required] Subject line
+            * html_content (str): [Required] Body of the email
+            * file_name (str):   HTML file to attach, if it exists
+        """
+        attachment = self._encoded_attachment(file_name) if file_name else None
+        digest = hashlib.sha256(html_content.encode('utf-8') + b'\0' + (attachment or '').encode('ascii')).hexdigest()
+        with self._lock:
+            self._db.execute('INSERT OR IGNORE INTO reports (digest, html, attachment) VALUES (?, ?, ?)',
+                             (digest, html_content, attachment))
+            cursor = self._db.execute(
+                'INSERT INTO messages (digest, sender, recipients, subject, next_attempt, created) '
+                "VALUES (?, ?, ?, ?, 0, ?)",
+                (digest, sender, json.dumps(list(receivers)), subject, time.time()))
+            self._db.commit()
+            self._changed.notify_all()
+            return cursor.lastrowid
+
+    def start(self):
+        """
+        Starts the sender threads, if they are not already running.
+        """
+        with self._lock:
+            self._stopping = False
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < self.senders:
+                thread = threading.Thread(target=self._run, name='mail-sender', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        return self
+
+    def flush(self, timeout: float = None):
+        """
+        Waits until no message is waiting to be sent or the timeout passes.
+        Returns True if the queue emptied.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self._unsent():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._changed.wait(POLL_INTERVAL if remaining is None else min(remaining, POLL_INTERVAL))
+            return True
+
+    def wait(self, message_id: int, timeout: float = None):
+        """
+        Waits until a message has been sent or has failed for good, or the
+        timeout passes. Returns its status: sent, failed, or queued or
+        sending if it is still on its way.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while True:
+                status = self._db.execute('SELECT status FROM messages WHERE id = ?', (message_id,)).fetchone()[0]
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if status in ('sent', 'failed') or (remaining is not None and remaining <= 0):
+                    return status
+                # Another program sharing the queue may be the one sending it
+                self._changed.wait(POLL_INTERVAL if remaining is None else min(remaining, POLL_INTERVAL))
+
+    def stop(self, timeout: float = None):
+        """
+        Stops the sender threads after the batches they are sending.
+        Messages still queued stay on disk for the next run.
+        """
+        with self._lock:
+            self._stopping = True
+            self._changed.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def close(self):
+        self.stop()
+        self.client.close()
+        with self._lock:
+            self._db.close()
+
+    def stats(self):
+        """
+        Returns the number of messages in each state: queued, sending, sent and failed.
+        """
+        with self._lock:
+            counts = dict(self._db.execute('SELECT status, COUNT(*) FROM messages GROUP BY status'))
+        return {status: counts.get(status, 0) for status in ('queued', 'sending', 'sent', 'failed')}
+
+    def _open(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS reports (digest TEXT PRIMARY KEY, html TEXT, attachment TEXT)')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS messages '
+            '(id INTEGER PRIMARY KEY, digest TEXT, sender TEXT, recipients TEXT, subject TEXT, '
+            "status TEXT DEFAULT 'queued', attempts INTEGER DEFAULT 0, next_attempt REAL, "
+            'error TEXT, created REAL, sent REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS messages_due ON messages (status, next_attempt)')
+        columns = [row[1] for row in self._db.execute('PRAGMA table_info(messages)')]
+        if 'lease_until' not in columns:
+            # Queues from before leases: their 'sending' batches count as expired
+            self._db.execute('ALTER TABLE messages ADD COLUMN lease_until REAL')
+        self._db.commit()
+
+    def _encoded_attachment(self, file_name: str):
+        # Read and encoded once per version of the file
+        try:
+            info = os.stat(file_name)
+        except OSError:
+            return None
+        key = (os.path.abspath(file_name), info.st_mtime_ns, info.st_size)
+        encoded = self._attachments.get(key)
+        if encoded is None:
+            with open(file_name, 'rb') as f:
+                encoded = base64.b64encode(f.read()).decode('ascii')
+            self._attachments = {key: encoded}
+        return encoded
+
+    def _unsent(self):
+        return self._db.execute(
+            "SELECT COUNT(*) FROM messages WHERE status IN ('queued', 'sending')").fetchone()[0]
+
+    def _run(self):
+        while True:
+            with self._lock:
+                batch = self._claim()
+                while batch is None and not self._stopping:
+                    self._changed.wait(self._next_due())
+                    batch = self._claim()
+                if batch is None:
+                    return
+            self._deliver(*batch)
+
+    def _next_due(self):
+        # Seconds until the earliest retry is due or lease runs out, capped so
+        # that mail queued by other programs is noticed
+        row = self._db.execute(
+            "SELECT MIN(CASE status WHEN 'queued' THEN next_attempt ELSE IFNULL(lease_until, 0) END) "
+            "FROM messages WHERE status IN ('queued', 'sending')").fetchone()
+        if row[0] is None:
+            return POLL_INTERVAL
+        return min(POLL_INTERVAL, max(0.0, row[0] - time.time()) + 0.01)
+
+    def _claim(self):
+        # Picking the batch and marking it as being sent happen in one write
+        # transaction, so two programs sharing the file never claim the same messages
+        now = time.time()
+        due = ("((status = 'queued' AND next_attempt <= :now) "
+               "OR (status = 'sending' AND IFNULL(lease_until, 0) <= :now))")
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            first = self._db.execute(
+                'SELECT digest, sender, subject FROM messages WHERE ' + due + ' ORDER BY id LIMIT 1',
+                {'now': now}).fetchone()
+            rows = []
+            if first is not None:
+                rows = self._db.execute(
+                    "UPDATE messages SET status = 'sending', lease_until = :lease WHERE id IN "
+                    '(SELECT id FROM messages WHERE ' + due + ' AND digest = :digest AND sender = :sender '
+                    'AND subject = :subject ORDER BY id LIMIT :limit) RETURNING id, recipients, attempts',
+                    {'now': now, 'lease': now + self.lease, 'digest': first[0], 'sender': first[1],
+                     'subject': first[2], 'limit': self.batch_size}).fetchall()
+            self._db.commit()
+        except BaseException:
+            self._db.rollback()
+            raise
+        if not rows:
+            return None
+        return first + (sorted(rows), self._report(first[0]))
+
+    def _report(self, digest: str):
+        report = self._reports.get(digest)
+        if report is None:
+            html_content, attachment = self._db.execute(
+                'SELECT html, attachment FROM reports WHERE digest = ?', (digest,)).fetchone()
+            if len(self._reports) >= 16:
+                self._reports.clear()
+            report = self._reports[digest] = (html_content, attachment)
+        return report
+
+    def _deliver(self, digest: str, sender: str, subject: str, rows: list, report: tuple):
+        html_content, attachment = report
+        payload = {
+            'personalizations': [{'to': [{'email': address} for address in json.loads(recipients)]}
+                                 for _, recipients, _ in rows],
+            'from': {'email': sender},
+            'subject': subject,
+            'content': [{'type': 'text/html', 'value': html_content}]
+        }
+        if attachment:
+            payload['attachments'] = [{
+                'content': attachment,
+                'type': 'text/html',
+                'filename': ATTACHMENT_NAME,
+                'disposition': 'attachment'
+            }]
+
+        try:
+            with metrics.timer('sendgrid_request_seconds'):
+                self.client.send(payload)
+            error = None
+        except MailError as e:
+            error = e
+        except Exception as e:
+            error = MailError('%s: %s' % (type(e).__name__, e), 0)
+
+        now = time.time()
+        with self._lock:
+            if error is None:
+                self._db.executemany("UPDATE messages SET status = 'sent', sent = ?, attempts = attempts + 1 "
+                                     'WHERE id = ?', [(now, row[0]) for row in rows])
+                metrics.increment('email_messages_total', len(rows), outcome='sent')
+            else:
+                updates = []
+                for message_id, _, attempts in rows:
+                    delay = None
+                    # A rejected key has been dropped, so the first 401 is worth one more try
+                    status = None if error.status == 401 and not attempts else error.status
+                    if self.retry_policy.should_retry(attempts + 1, status):
+                        delay = self.retry_policy.delay(attempts + 1, error.retry_after)
+                    status = 'queued' if delay is not None else 'failed'
+                    updates.append((status, now + (delay or 0), str(error), message_id))
+                    metrics.increment('email_messages_total', outcome='retried' if delay is not None else 'failed',
+                                      status=error.status)
+                self._db.executemany('UPDATE messages SET status = ?, next_attempt = ?, error = ?, '
+                                     'attempts = attempts + 1 WHERE id = ?', updates)
+            self._db.commit()
+            self._changed.notify_all()
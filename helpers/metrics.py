@@ -0,0 +1,236 @@
+import bisect
+import threading
+import time
+
+# Upper bounds, in seconds, of the latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_recording = False
+_hooks = []
+# True while recording or while any hook is set; the only thing probes check when off
+_active = False
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+
+
+class _Histogram:
+    __slots__ = ('counts', 'sum', 'count', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(DEFAULT_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+
+class Timer:
+    """
+    Times the block it wraps and records the duration (see observe).
+    Use timer() rather than making one directly.
+    """
+
+    __slots__ = ('name', 'labels', 'started')
+
+    def __init__(self, name: str, labels: dict):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, error_type, error, tb):
+        _record(self.name, time.perf_counter() - self.started, self.labels, error)
+        return False
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, error_type, error, tb):
+        return False
+
+
+_NO_TIMER = _NoTimer()
+
+
+######################
+# Turning metrics on #
+######################
+def enabled():
+    """
+    Returns True if measurements are being recorded or passed to hooks.
+    Probes that need work to build their labels check this first.
+    """
+    return _active
+
+
+def enable():
+    """
+    Starts recording histograms and counters for timings() and prometheus_text().
+    """
+    global _recording, _active
+    _recording = _active = True
+
+
+def disable():
+    global _recording, _active
+    _recording = False
+    _active = bool(_hooks)
+
+
+def reset():
+    """
+    Forgets everything recorded so far.
+    """
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def add_hook(hook):
+    """
+    Calls hook(name, labels, started, seconds, error) for every timed span,
+    e.g. to forward them to a tracer. started is the wall-clock start time
+    and error the exception that ended the span, or None. Hooks run on the
+    thread that did the work, so they should be quick.
+    """
+    global _active
+    _hooks.append(hook)
+    _active = True
+
+
+def remove_hook(hook):
+    global _active
+    _hooks.remove(hook)
+    _active = _recording or bool(_hooks)
+
+
+################
+# Measurements #
+################
+def timer(name: str, **labels):
+    """
+    Returns a context manager that records how long its block takes under
+    the histogram name and labels. When metrics are off this is a shared
+    object that does nothing.
+    """
+    if not _active:
+        return _NO_TIMER
+    return Timer(name, labels)
+
+
+def observe(name: str, seconds: float, **labels):
+    """
+    Records a duration measured elsewhere.
+    """
+    if _active:
+        _record(name, seconds, labels, None)
+
+
+def increment(name: str, amount: int = 1, **labels):
+    """
+    Adds to a counter.
+    """
+    if not _recording:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def _record(name: str, seconds: float, labels: dict, error):
+    if _recording:
+        key = (name, tuple(sorted(labels.items())))
+        with _lock:
+            histogram = _histograms.get(key)
+            if histogram is None:
+                histogram = _histograms[key] = _Histogram()
+            histogram.counts[bisect.bisect_left(DEFAULT_BUCKETS, seconds)] += 1
+            histogram.sum += seconds
+            histogram.count += 1
+            histogram.max = max(histogram.max, seconds)
+    for hook in list(_hooks):
+        hook(name, labels, time.time() - seconds, seconds, error)
+
+
+#############
+# Exporting #
+#############
+def counters():
+    """
+    Returns {(name, labels): value}, with labels as a tuple of (key, value) pairs.
+    """
+    with _lock:
+        return dict(_counters)
+
+
+def timings():
+    """
+    Returns {(name, labels): (count, total seconds, slowest seconds)} for every histogram.
+    """
+    with _lock:
+        return {key: (h.count, h.sum, h.max) for key, h in _histograms.items()}
+
+
+def _format_labels(labels: tuple, extra: tuple = ()):
+    pairs = labels + extra
+    if not pairs:
+        return ''
+    escaped = ('%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for key, value in pairs)
+    return '{' + ','.join(escaped) + '}'
+
+
+def prometheus_text():
+    """
+    Renders every histogram and counter in the Prometheus text exposition format.
+    """
+    with _lock:
+        histograms = sorted((key, list(h.counts), h.sum, h.count) for key, h in _histograms.items())
+        counted = sorted(_counters.items())
+
+    lines = []
+    previous = None
+    for (name, labels), counts, total, count in histograms:
+        if name != previous:
+            lines.append('# TYPE %s histogram' % name)
+            previous = name
+        cumulative = 0
+        for bound, n in zip(DEFAULT_BUCKETS + ('+Inf',), counts):
+            cumulative += n
+            lines.append('%s_bucket%s %d' % (name, _format_labels(labels, (('le', bound),)), cumulative))
+        lines.append('%s_sum%s %.6f' % (name, _format_labels(labels), total))
+        lines.append('%s_count%s %d' % (name, _format_labels(labels), count))
+    for (name, labels), value in counted:
+        if name != previous:
+            lines.append('# TYPE %s counter' % name)
+            previous = name
+        lines.append('%s%s %d' % (name, _format_labels(labels), value))
+    return '\n'.join(lines) + '\n'
+
+
+def write_timings(out):
+    """
+    Writes a table of where the time went, slowest total first, followed by the counters.
+        * out (file): [Required] Anything with write(str)
+    """
+    rows = [('%s%s' % (name, _format_labels(labels)), '%d' % count, '%.3f' % total,
+             '%.2f' % (total / count * 1000), '%.2f' % (slowest * 1000))
+            for (name, labels), (count, total, slowest) in sorted(timings().items(), key=lambda item: -item[1][1])]
+    rows.extend(('%s%s' % (name, _format_labels(labels)), '%d' % value, '', '', '')
+                for (name, labels), value in sorted(counters().items()))
+    if not rows:
+        out.write('No timings recorded.\n')
+        return
+
+    cells = [('', 'count', 'total s', 'mean ms', 'max ms')] + rows
+    widths = [max(len(row[i]) for row in cells) for i in range(5)]
+    for row in cells:
+        out.write((row[0].ljust(widths[0]) + '  ' +
+                   '  '.join(cell.rjust(width) for cell, width in zip(row[1:], widths[1:]))).rstrip() + '\n')
@@ -0,0 +1,228 @@
+import array
+import sys
+import weakref
+
+from helpers import schema
+
+SHARE_URL = schema.SHARE_URL
+
+
+class _Model:
+    """
+    Lets the compact classes stand in for the dictionaries the spotify
+    helpers return: item['name'], item.get('album') and to_dict() all work.
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, key: str):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default=None):
+        value = getattr(self, key, None)
+        return default if value is None else value
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self._fields}
+
+
+class Artist(_Model):
+
+    __slots__ = ('id', 'name', 'genres', 'image_url', 'image_url_small', '__weakref__')
+    _fields = ('id', 'name', 'genres', 'share_url', 'image_url', 'image_url_small')
+
+    def __init__(self, id: str, name: str, genres: str = None, image_url: str = None, image_url_small: str = None):
+        self.id = id
+        self.name = name
+        self.genres = genres
+        self.image_url = image_url
+        self.image_url_small = image_url_small
+
+    def __repr__(self):
+        return 'Artist(%r, %r)' % (self.id, self.name)
+
+    @property
+    def share_url(self):
+        return SHARE_URL + 'artist/' + self.id
+
+
+class Album(_Model):
+
+    __slots__ = ('id', 'name', 'image_url', 'image_url_small', '__weakref__')
+    _fields = ('id', 'name', 'image_url', 'image_url_small', 'share_url')
+
+    def __init__(self, id: str, name: str, image_url: str = None, image_url_small: str = None):
+        self.id = id
+        self.name = name
+        self.image_url = image_url
+        self.image_url_small = image_url_small
+
+    def __repr__(self):
+        return 'Album(%r, %r)' % (self.id, self.name)
+
+    @property
+    def share_url(self):
+        return SHARE_URL + 'album/' + self.id
+
+
+class Track(_Model):
+
+    __slots__ = ('id', 'name', 'preview_url', 'album', 'artist')
+    _fields = ('id', 'name', 'preview_url', 'share_url', 'album', 'artist')
+    # A track's artist has only these, as in the dictionaries from spotify._simplify_tracks
+    _artist_fields = ('id', 'name', 'share_url')
+
+    def __init__(self, id: str, name: str, preview_url: str = None, album: Album = None, artist: Artist = None):
+        self.id = id
+        self.name = name
+        self.preview_url = preview_url
+        self.album = album
+        self.artist = artist
+
+    def __repr__(self):
+        return 'Track(%r, %r)' % (self.id, self.name)
+
+    @property
+    def share_url(self):
+        return SHARE_URL + 'track/' + self.id
+
+    def to_dict(self):
+        record = super().to_dict()
+        if self.album is None:
+            del record['album']
+        else:
+            record['album'] = self.album.to_dict()
+        if self.artist is None:
+            del record['artist']
+        else:
+            record['artist'] = {key: getattr(self.artist, key) for key in self._artist_fields}
+        return record
+
+
+#############
+# Interning #
+#############
+# Tracks on the same album share one Album (and one Artist) object for as
+# long as any of them is alive; IDs are interned so repeats share one string.
+_albums = weakref.WeakValueDictionary()
+_artists = weakref.WeakValueDictionary()
+
+
+def _intern(value):
+    return sys.intern(value) if value is not None else None
+
+
+def _album(album_id, name, image_url, image_url_small):
+    album = _albums.get(album_id)
+    if album is None:
+        album = Album(_intern(album_id), name, image_url, image_url_small)
+        _albums[album.id] = album
+    return album
+
+
+def _track_artist(artist_id, name):
+    artist = _artists.get(artist_id)
+    if artist is None:
+        artist = Artist(_intern(artist_id), name)
+        _artists[artist.id] = artist
+    return artist
+
+
+_extract_track = schema.compile_schema([
+    ('id', ('id',), None),
+    ('name', ('name',), None),
+    ('preview_url', ('preview_url',), None),
+    ('album_id', ('album', 'id'), None),
+    ('album_name', ('album', 'name'), None),
+    ('album_image_url', ('album', 'images', 0, 'url'), None),
+    ('album_image_url_small', ('album', 'images', -1, 'url'), None),
+    ('artist_id', ('album', 'artists', 0, 'id'), None),
+    ('artist_name', ('album', 'artists', 0, 'name'), None),
+])
+
+
+def track_from_api(item: dict):
+    """
+    Builds a Track from a raw Spotify track object.
+    """
+    track_id, name, preview_url, album_id, album_name, image_url, image_url_small, \
+        artist_id, artist_name = _extract_track(item)
+    album = _album(album_id, album_name, image_url, image_url_small) if album_id is not None else None
+    artist = _track_artist(artist_id, artist_name) if artist_id is not None else None
+    return Track(_intern(track_id), name, preview_url, album, artist)
+
+
+def artist_from_api(item: dict):
+    """
+    Builds an Artist from a raw Spotify artist object.
+    """
+    values = schema.extract_artist(item)
+    artist_id, name, genres, _, image_url, image_url_small = values
+    return Artist(_intern(artist_id), name, genres, image_url, image_url_small)
+
+
+class TrackBatch:
+    """
+    Columnar storage for large numbers of tracks. Track fields live in
+    parallel lists, and albums and artists are stored once each and
+    referenced by position from compact integer arrays (-1 for none).
+    Indexing or iterating yields Track objects built on demand.
+    """
+
+    __slots__ = ('ids', 'names', 'preview_urls', 'album_refs', 'artist_refs',
+                 'albums', 'artists', '_album_positions', '_artist_positions')
+
+    def __init__(self, tracks=()):
+        self.ids = []
+        self.names = []
+        self.preview_urls = []
+        self.album_refs = array.array('i')
+        self.artist_refs = array.array('i')
+        self.albums = []
+        self.artists = []
+        self._album_positions = {}
+        self._artist_positions = {}
+        self.extend(tracks)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, n: int):
+        album = self.album_refs[n]
+        artist = self.artist_refs[n]
+        return Track(self.ids[n], self.names[n], self.preview_urls[n],
+                     self.albums[album] if album >= 0 else None,
+                     self.artists[artist] if artist >= 0 else None)
+
+    def __iter__(self):
+        for n in range(len(self.ids)):
+            yield self[n]
+
+    def append(self, track):
+        """
+        Adds a Track, or a raw Spotify track object.
+        """
+        if not isinstance(track, Track):
+            track = track_from_api(track)
+        self.ids.append(track.id)
+        self.names.append(track.name)
+        self.preview_urls.append(track.preview_url)
+        self.album_refs.append(self._position(track.album, self.albums, self._album_positions))
+        self.artist_refs.append(self._position(track.artist, self.artists, self._artist_positions))
+
+    def extend(self, tracks):
+        for track in tracks:
+            self.append(track)
+
+    @staticmethod
+    def _position(item, items: list, positions: dict):
+        if item is None:
+            return -1
+        position = positions.get(item.id)
+        if position is None:
+            position = positions[item.id] = len(items)
+            items.append(item)
+        return position
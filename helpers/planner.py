@@ -0,0 +1,128 @@
+import asyncio
+import concurrent.futures
+
+from helpers import spotify
+
+# Spotify's limit on seeds per recommendations request
+MAX_SEEDS = 5
+
+# Queries sent at once; a seed set needs one per MAX_SEEDS seeds
+DEFAULT_WORKERS = 8
+
+# Damping of the rank bonus that breaks ties between equally scored tracks
+RANK_DAMPING = 60
+
+
+def plan(artist_ids: list, track_ids: list, genres: list, max_seeds: int = MAX_SEEDS):
+    """
+    Splits a seed set of any size into as few queries of at most max_seeds
+    seeds as possible, dealing the seeds out in turn so that the queries
+    differ in size by at most one and each mixes artists, tracks and genres.
+    Repeated seeds are dropped and each kind is sorted, so the same seeds
+    always make the same queries and their cached responses are reused.
+
+    :param artist_ids: list of artist IDs
+    :param track_ids: list of track IDs
+    :param genres: list of genres
+    :param max_seeds: most seeds in one query
+    :return: list of (artist_ids, track_ids, genres) tuples, one per query
+    """
+
+    kinds = [sorted(set(seeds or [])) for seeds in (artist_ids, track_ids, genres)]
+    seeds = [(kind, seed) for kind, values in enumerate(kinds) for seed in values]
+    if not seeds:
+        raise spotify.InvalidSeedsError('Either artist_ids, track_ids, or genres  are required')
+
+    count = -(-len(seeds) // max_seeds)
+    queries = [([], [], []) for _ in range(count)]
+    for n, (kind, seed) in enumerate(seeds):
+        queries[n % count][kind].append(seed)
+    return queries
+
+
+def merge(queries: list, results: list):
+    """
+    Combines the tracks recommended for each query into one list without
+    repeats, best first. A track scores the share of queries that returned
+    it plus the share of all seeds in those queries, so tracks several
+    queries agree on, or that cover more of the seeds, come first. Ties
+    go to the track ranked higher by spotify across its queries.
+
+    :param queries: the queries made, as returned by plan
+    :param results: the list of tracks returned for each query, in the same order
+    :return: list of tracks
+    """
+
+    total_seeds = sum(len(values) for query in queries for values in query)
+    found = {}
+    for query, tracks in zip(queries, results):
+        seeds = sum(len(values) for values in query)
+        for rank, track in enumerate(tracks):
+            entry = found.get(track['id'])
+            if entry is None:
+                entry = found[track['id']] = [track, 0, 0, 0.0]
+            entry[1] += 1
+            entry[2] += seeds
+            entry[3] += 1 / (RANK_DAMPING + rank)
+
+    def score(entry):
+        return entry[1] / len(queries) + entry[2] / total_seeds, entry[3]
+
+    return [entry[0] for entry in sorted(found.values(), key=score, reverse=True)]
+
+
+def get_similar_tracks(artist_ids: list, track_ids: list, genres: list, simplify: bool = True,
+                       models: bool = False, workers: int = DEFAULT_WORKERS):
+    """
+    spotify.get_similar_tracks without the five-seed limit. Larger seed sets
+    are split into several queries (see plan), sent at once on a thread
+    pool, and their results merged and reranked (see merge); smaller ones
+    are a single call. simplify=False returns {'tracks': [...], 'seeds': [...]}
+    like the API.
+
+    :param artist_ids: list of artist IDs
+    :param track_ids: list of track IDs
+    :param genres: list of genres
+    :param simplify: return simplified tracks, as spotify.get_similar_tracks does
+    :param models: return compact Track objects instead of dicts
+    :param workers: most queries in flight at once
+    :return: list of tracks
+    """
+
+    queries = plan(artist_ids, track_ids, genres)
+    if spotify._recommender is not None:
+        # The local recommender has no seed limit
+        return spotify.get_similar_tracks(artist_ids, track_ids, genres, simplify, models)
+    if len(queries) == 1:
+        return spotify.get_similar_tracks(*queries[0], simplify, models)
+
+    with concurrent.futures.ThreadPoolExecutor(min(workers, len(queries))) as pool:
+        responses = list(pool.map(lambda query: spotify.get_similar_tracks(*query, simplify=False), queries))
+    return _combine(queries, responses, simplify, models)
+
+
+async def get_similar_tracks_async(client, artist_ids: list, track_ids: list, genres: list, simplify: bool = True,
+                                   models: bool = False):
+    """
+    get_similar_tracks for asyncio code: the queries are sent at once
+    through an async_spotify.AsyncSpotify client, which bounds how many are in flight.
+
+    :param client: an AsyncSpotify
+    :return: list of tracks
+    """
+
+    queries = plan(artist_ids, track_ids, genres)
+    if spotify._recommender is not None:
+        return await client.get_similar_tracks(artist_ids, track_ids, genres, simplify, models)
+    if len(queries) == 1:
+        return await client.get_similar_tracks(*queries[0], simplify, models)
+
+    responses = await asyncio.gather(*(client.get_similar_tracks(*query, simplify=False) for query in queries))
+    return _combine(queries, responses, simplify, models)
+
+
+def _combine(queries: list, responses: list, simplify: bool, models: bool):
+    tracks = merge(queries, [response['tracks'] for response in responses])
+    if not simplify:
+        return {'tracks': tracks, 'seeds': [seed for response in responses for seed in response.get('seeds', [])]}
+    return spotify._simplify_tracks(tracks, models)
@@ -0,0 +1,169 @@
+import csv
+
+from helpers import spotify
+
+# Audio features used when a catalog does not name its own
+FEATURES = (
+    'danceability', 'energy', 'loudness', 'speechiness', 'acousticness',
+    'instrumentalness', 'liveness', 'valence', 'tempo'
+)
+
+# Catalog columns that describe a track rather than its sound
+TEXT_COLUMNS = ('id', 'name', 'artist_id', 'artist_name', 'album_id', 'album_name', 'genres')
+
+
+class LocalRecommender:
+    """
+    Recommends tracks from a local catalog by audio-feature similarity,
+    as an offline alternative to Spotify's /recommendations endpoint.
+
+    Features are standardized and scaled to unit length once, so cosine
+    similarity against every track is a single matrix product, computed in
+    blocks of block_size rows to bound memory. Seeds are not limited to five:
+    each track seed contributes its own vector, each artist seed the mean of
+    that artist's tracks, and each genre seed the mean of the tracks tagged
+    with it. Candidates are ranked by their mean similarity to all seeds.
+        * ids (list):         Track IDs, one per catalog row.
+        * features (array):   Numeric features, one row per track.
+        * metadata (dict):    Optional column name -> list of values (see TEXT_COLUMNS).
+        * block_size (int):   Rows scored per matrix product.
+        * normalize (bool):   Standardize the features; False if they already are (see save).
+    Requires numpy.
+    """
+
+    def __init__(self, ids: list, features, metadata: dict = None, block_size: int = 65536,
+                 normalize: bool = True):
+        import numpy as np
+
+        self.ids = list(ids)
+        self.metadata = metadata or {}
+        self.block_size = block_size
+        self._positions = {track_id: n for n, track_id in enumerate(self.ids)}
+
+        vectors = np.asarray(features, dtype=np.float32)
+        if normalize:
+            std = vectors.std(axis=0)
+            std[std == 0] = 1
+            vectors = (vectors - vectors.mean(axis=0)) / std
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        self.vectors = np.ascontiguousarray(vectors / norms, dtype=np.float32)
+
+        self._by_artist = self._group(self.metadata.get('artist_id'))
+        self._by_genre = self._group(self.metadata.get('genres'), split=True)
+
+    @classmethod
+    def from_file(cls, path: str, features: tuple = FEATURES, **kwargs):
+        """
+        Loads a catalog from CSV (a header with id, the feature columns and
+        any of TEXT_COLUMNS; genres separated by semicolons) or from an .npz
+        written by save(), which loads much faster for large catalogs.
+        """
+        import numpy as np
+
+        if path.endswith('.npz'):
+            with np.load(path, allow_pickle=False) as data:
+                metadata = {key[5:]: data[key].tolist() for key in data.files if key.startswith('meta_')}
+                return cls(data['ids'].tolist(), data['features'], metadata, normalize=False, **kwargs)
+
+        with open(path, newline='') as f:
+            rows = csv.DictReader(f)
+            columns = [n for n in rows.fieldnames if n in TEXT_COLUMNS and n != 'id']
+            ids, values = [], []
+            metadata = {n: [] for n in columns}
+            for row in rows:
+                ids.append(row['id'])
+                values.append([float(row[n] or 0) for n in features])
+                for n in columns:
+                    metadata[n].append(row[n])
+        return cls(ids, np.array(values, dtype=np.float32), metadata, **kwargs)
+
+    def save(self, path: str):
+        """
+        Writes the catalog to an .npz file (features are stored normalized).
+        """
+        import numpy as np
+
+        arrays = {'ids': np.array(self.ids), 'features': self.vectors}
+        for key, values in self.metadata.items():
+            arrays['meta_' + key] = np.array(values)
+        np.savez(path, **arrays)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get_similar_tracks(self, artist_ids: list, track_ids: list, genres: list,
+                           simplify: bool = True, models: bool = False, limit: int = 20):
+        """
+        Local counterpart of spotify.get_similar_tracks, with no limit on seeds.
+            * artist_ids (list): A list of artist ids
+            * track_ids (list): A list of track ids
+            * genres (genres): A list of genres
+            * limit (int): Number of tracks to return
+        Returns a list of tracks that are similar, shaped like the spotify helpers' tracks
+        """
+        import numpy as np
+
+        queries, exclude = self._seed_vectors(artist_ids or [], track_ids or [], genres or [])
+        if not queries:
+            raise spotify.InvalidSeedsError(
+                'None of the artist_ids, track_ids, or genres were found in the local catalog')
+        query = np.stack(queries).mean(axis=0)
+
+        best_scores = np.empty(0, dtype=np.float32)
+        best_rows = np.empty(0, dtype=np.int64)
+        wanted = limit + len(exclude)
+        for start in range(0, len(self.ids), self.block_size):
+            scores = self.vectors[start:start + self.block_size] @ query
+            if len(scores) > wanted:
+                top = np.argpartition(scores, -wanted)[-wanted:]
+            else:
+                top = np.arange(len(scores))
+            best_scores = np.concatenate([best_scores, scores[top]])
+            best_rows = np.concatenate([best_rows, top + start])
+            if len(best_scores) > wanted:
+                keep = np.argpartition(best_scores, -wanted)[-wanted:]
+                best_scores, best_rows = best_scores[keep], best_rows[keep]
+
+        ranked = best_rows[np.argsort(-best_scores, kind='stable')]
+        rows = [n for n in ranked.tolist() if n not in exclude][:limit]
+        data = {'tracks': [self._track(n) for n in rows]}
+        if not simplify:
+            return data
+        return spotify._simplify_tracks(data['tracks'], models)
+
+    def _seed_vectors(self, artist_ids: list, track_ids: list, genres: list):
+        queries, exclude = [], set()
+        for track_id in track_ids:
+            n = self._positions.get(track_id)
+            if n is not None:
+                queries.append(self.vectors[n])
+                exclude.add(n)
+        for key, groups in ((artist_ids, self._by_artist), (genres, self._by_genre)):
+            for value in key:
+                rows = groups.get(value)
+                if rows:
+                    queries.append(self.vectors[rows].mean(axis=0))
+        return queries, exclude
+
+    def _group(self, values: list, split: bool = False):
+        groups = {}
+        for n, value in enumerate(values or []):
+            for key in (value.split(';') if split else [value]):
+                key = key.strip()
+                if key:
+                    groups.setdefault(key, []).append(n)
+        return groups
+
+    def _track(self, n: int):
+        # Mirrors the raw Spotify track object so the usual shaping applies
+        meta = {key: values[n] for key, values in self.metadata.items()}
+        track = {'id': self.ids[n], 'name': meta.get('name'), 'preview_url': None}
+        if meta.get('album_id') or meta.get('album_name') or meta.get('artist_id'):
+            track['album'] = {
+                'id': meta.get('album_id'),
+                'name': meta.get('album_name'),
+                'images': [],
+                'artists': [{'id': meta.get('artist_id'), 'name': meta.get('artist_name')}]
+            }
+        return track
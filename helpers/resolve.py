@@ -0,0 +1,87 @@
+import concurrent.futures
+
+from helpers import search_index
+from helpers import spotify
+from helpers import transport
+
+# Searches run at once; each name costs one search round trip
+DEFAULT_WORKERS = 16
+
+# Best matches scoring below this (see search_index.similarity) count as not found
+MIN_SCORE = 0.3
+
+
+def best_match(query: str, items: list, min_score: float = MIN_SCORE):
+    """
+    Picks the item whose name best matches the query. Ties go to the item
+    spotify ranked first.
+
+    :param query: the free-text name searched for
+    :param items: artists or tracks returned by the search
+    :param min_score: lowest acceptable score
+    :return: (item, score) tuple, or (None, 0) if nothing scores well enough
+    """
+
+    best, best_score = None, 0.0
+    for item in items:
+        score = search_index.similarity(query, item.get('name'))
+        if score > best_score:
+            best, best_score = item, score
+    if best_score < min_score:
+        return None, 0.0
+    return best, best_score
+
+
+def resolve(names: list, kind: str = 'artist', workers: int = DEFAULT_WORKERS, min_score: float = MIN_SCORE):
+    """
+    Resolves free-text artist or track names to spotify artists or tracks,
+    searching for all of them at once on a thread pool. Names that only
+    differ in case, accents or punctuation are searched for once.
+
+    The transport is given a connection per worker (see
+    transport.PooledTransport.reserve), so the searches in flight are
+    bounded only by workers and by the spotify rate limit's burst.
+
+    :param names: free-text names, e.g. ['radiohead', 'Sigur Ros']
+    :param kind: 'artist' or 'track'
+    :param workers: number of concurrent searches
+    :param min_score: lowest acceptable match score (see best_match)
+    :return: dictionary of each name, in the order given, to its best match or None
+    """
+
+    if kind not in ('artist', 'track'):
+        raise ValueError("kind must be 'artist' or 'track', not %r" % kind)
+    search = spotify.get_artists if kind == 'artist' else spotify.get_tracks
+
+    queries = {}
+    for name in names:
+        key = search_index.normalize(name)
+        if key:
+            queries.setdefault(key, name)
+
+    matches = {}
+    if queries:
+        workers = min(workers, len(queries))
+        reserve = getattr(transport.get_transport(), 'reserve', None)
+        if reserve is not None:
+            reserve(workers)
+        with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+            futures = {key: pool.submit(search, name) for key, name in queries.items()}
+            for key, future in futures.items():
+                matches[key] = best_match(key, future.result(), min_score)[0]
+
+    return {name: matches.get(search_index.normalize(name)) for name in names}
+
+
+def resolve_artists(names: list, workers: int = DEFAULT_WORKERS):
+    """
+    Resolves artist names; see resolve.
+    """
+    return resolve(names, 'artist', workers)
+
+
+def resolve_tracks(names: list, workers: int = DEFAULT_WORKERS):
+    """
+    Resolves track titles; see resolve.
+    """
+    return resolve(names, 'track', workers)
@@ -0,0 +1,143 @@
+import email.utils
+import random
+import threading
+import time
+
+# Statuses worth retrying: rate limiting and transient upstream failures
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+
+def parse_retry_after(value):
+    """
+    Reads a Retry-After header given either in seconds or as an HTTP date.
+
+    :param value: header value, or None
+    :return: seconds to wait, or None if the header is absent or malformed
+    """
+
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Jittered exponential backoff that defers to Retry-After when given.
+        * attempts (int):    Total tries per request, including the first.
+        * base (float):      Delay before the first retry, in seconds.
+        * cap (float):       Longest delay between tries, in seconds.
+        * max_wait (float):  Longest Retry-After honored; anything longer fails fast.
+    """
+
+    def __init__(self, attempts: int = 4, base: float = 0.5, cap: float = 20, max_wait: float = 60):
+        self.attempts = attempts
+        self.base = base
+        self.cap = cap
+        self.max_wait = max_wait
+
+    def should_retry(self, attempt: int, status: int = None):
+        """
+        :param attempt: number of tries made so far, starting at 1
+        :param status: HTTP status of the failure, or None for a network error
+        """
+        if attempt >= self.attempts:
+            return False
+        return status is None or status in RETRYABLE_STATUSES
+
+    def delay(self, attempt: int, retry_after: float = None):
+        """
+        Seconds to wait before the next try, or None if the server asked for
+        a longer pause than max_wait.
+        """
+        if retry_after is not None:
+            if retry_after > self.max_wait:
+                return None
+            # Spread callers that were told the same instant
+            return retry_after + random.uniform(0, self.base)
+        # Full jitter keeps concurrent callers from retrying in lockstep
+        return random.uniform(0, min(self.cap, self.base * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """
+    Stops calling an upstream that keeps failing.
+        * threshold (int):     Consecutive failures that open the circuit.
+        * reset_after (float): Seconds the circuit stays open before one trial request.
+    While open, allow() returns False so callers fail immediately instead of
+    adding load. After reset_after, one caller is let through; its success
+    closes the circuit and its failure reopens it. A trial that ends without
+    either (the token fetch failed, the caller was cancelled) is handed back
+    with release(), and one that is never handed back expires after
+    reset_after, so the circuit cannot stay open for good.
+    """
+
+    def __init__(self, threshold: int = 5, reset_after: float = 30):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self._trial = None
+        self._trial_started = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at >= self.reset_after:
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        """
+        Returns False while the circuit is open. Otherwise returns a ticket,
+        which is true, to pass to release() when the call is over.
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at < self.reset_after:
+                return False
+            if self._trial is not None and now - self._trial_started < self.reset_after:
+                return False
+            self._trial = object()
+            self._trial_started = now
+            return self._trial
+
+    def release(self, ticket):
+        """
+        Ends the call allow() returned the ticket for. If it was the trial
+        and neither record_success nor record_failure was called, the next
+        caller may try instead.
+        """
+        with self._lock:
+            if ticket is self._trial:
+                self._trial = None
+
+    def retry_in(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 0.0
+            return max(0.0, self.reset_after - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._trial = None
@@ -0,0 +1,157 @@
+SHARE_URL = 'https://open.spotify.com/'
+
+
+def _share_url(kind: str):
+    prefix = SHARE_URL + kind + '/'
+    return lambda spotify_id: prefix + spotify_id
+
+
+# A schema lists (column, path, transform) entries. The path walks the raw
+# API object by key or list index, e.g. ('album', 'images', -1, 'url'); a
+# missing key, None or an out-of-range index yields None rather than raising.
+# The transform, if any, is applied to values that are not None.
+TRACK_SCHEMA = [
+    ('id', ('id',), None),
+    ('name', ('name',), None),
+    ('preview_url', ('preview_url',), None),
+    ('share_url', ('id',), _share_url('track')),
+    ('album_id', ('album', 'id'), None),
+    ('album_name', ('album', 'name'), None),
+    ('album_image_url', ('album', 'images', 0, 'url'), None),
+    ('album_image_url_small', ('album', 'images', -1, 'url'), None),
+    ('album_share_url', ('album', 'id'), _share_url('album')),
+    ('artist_id', ('album', 'artists', 0, 'id'), None),
+    ('artist_name', ('album', 'artists', 0, 'name'), None),
+    ('artist_share_url', ('album', 'artists', 0, 'id'), _share_url('artist')),
+]
+
+ARTIST_SCHEMA = [
+    ('id', ('id',), None),
+    ('name', ('name',), None),
+    ('genres', ('genres',), ', '.join),
+    ('share_url', ('id',), _share_url('artist')),
+    ('image_url', ('images', 0, 'url'), None),
+    ('image_url_small', ('images', -1, 'url'), None),
+]
+
+# Columns named <group>_<key> are nested under <group> in the 'nested' shape
+NESTED_GROUPS = ('album', 'artist')
+
+
+def _step_code(source: str, step, target: str):
+    # One step of a path walk that yields None rather than raising
+    if isinstance(step, int):
+        bound = step + 1 if step >= 0 else -step
+        return '%s = %s[%d] if type(%s) is list and len(%s) >= %d else None' % (
+            target, source, step, source, source, bound)
+    return '%s = %s.get(%r) if type(%s) is dict else None' % (target, source, step, source)
+
+
+def compile_schema(schema: list, shape: str = 'tuple'):
+    """
+    Generates one function that shapes a raw API object according to the
+    schema. Paths sharing a prefix (e.g. everything under 'album') walk it once.
+        * schema (list): [Required] (column, path, transform) entries
+        * shape (str):   'tuple' for values in column order, 'flat' for a dictionary
+                         keyed by column, 'nested' for the layout the spotify helpers return
+    Returns the extractor function; its `columns` attribute lists the column names.
+    """
+    namespace = {}
+    body = []
+    walked = {(): 'item'}
+    values = []
+    for n, (column, path, transform) in enumerate(schema):
+        for depth in range(1, len(path) + 1):
+            prefix = tuple(path[:depth])
+            if prefix not in walked:
+                walked[prefix] = 'p%d' % len(walked)
+                body.append(_step_code(walked[prefix[:-1]], prefix[-1], walked[prefix]))
+        value = walked[tuple(path)]
+        if transform is not None:
+            namespace['t%d' % n] = transform
+            body.append('v%d = t%d(%s) if %s is not None else None' % (n, n, value, value))
+            value = 'v%d' % n
+        values.append(value)
+
+    columns = [column for column, _, _ in schema]
+    if shape == 'tuple':
+        body.append('return (%s,)' % ', '.join(values))
+    elif shape == 'flat':
+        body.append('return {%s}' % ', '.join('%r: %s' % pair for pair in zip(columns, values)))
+    else:
+        top, groups = [], {}
+        for column, value in zip(columns, values):
+            group, _, key = column.partition('_')
+            if group in NESTED_GROUPS and key:
+                groups.setdefault(group, []).append((key, value))
+            else:
+                top.append((column, value))
+        body.append('record = {%s}' % ', '.join('%r: %s' % pair for pair in top))
+        for group, pairs in groups.items():
+            body.append('if %s:' % ' or '.join('%s is not None' % value for _, value in pairs))
+            body.append('    record[%r] = {%s}' % (group, ', '.join('%r: %s' % pair for pair in pairs)))
+        body.append('return record')
+
+    source = 'def extract(item):\n' + '\n'.join('    ' + line for line in body)
+    exec(compile(source, '<schema>', 'exec'), namespace)
+
+    extract = namespace['extract']
+    extract.columns = columns
+    return extract
+
+
+def unnest(schema: list):
+    """
+    Turns a schema for raw API objects into one for the records its 'nested'
+    extractor returns (the same as 'flat' when no column is grouped), so that
+    simplified tracks and artists can be shaped again, e.g. into a DataFrame.
+    """
+    entries = []
+    for column, _, _ in schema:
+        group, _, key = column.partition('_')
+        entries.append((column, (group, key) if group in NESTED_GROUPS and key else (column,), None))
+    return entries
+
+
+extract_track = compile_schema(TRACK_SCHEMA)
+extract_artist = compile_schema(ARTIST_SCHEMA)
+nested_track = compile_schema(TRACK_SCHEMA, 'nested')
+flat_artist = compile_schema(ARTIST_SCHEMA, 'flat')
+simplified_track = compile_schema(unnest(TRACK_SCHEMA))
+simplified_artist = compile_schema(unnest(ARTIST_SCHEMA))
+
+
+def to_records(items: list, extract=extract_track):
+    """
+    Shapes raw API objects into flat dictionaries.
+    """
+    columns = extract.columns
+    return [dict(zip(columns, row)) for row in map(extract, items)]
+
+
+def to_columns(items: list, extract=extract_track):
+    """
+    Shapes raw API objects into a dictionary of equal-length column lists.
+    """
+    rows = list(map(extract, items))
+    if not rows:
+        return {column: [] for column in extract.columns}
+    return dict(zip(extract.columns, map(list, zip(*rows))))
+
+
+def to_dataframe(items: list, extract=extract_track):
+    """
+    Shapes raw API objects straight into a pandas DataFrame indexed from 1.
+    """
+    import pandas as pd
+    frame = pd.DataFrame(to_columns(items, extract), columns=extract.columns)
+    frame.index = pd.RangeIndex(1, len(frame) + 1, name='num')
+    return frame
+
+
+def to_arrow(items: list, extract=extract_track):
+    """
+    Shapes raw API objects straight into a pyarrow Table.
+    """
+    import pyarrow as pa
+    return pa.table(to_columns(items, extract))
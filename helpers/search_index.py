@@ -0,0 +1,446 @@
+import array
+import bisect
+import collections
+import json
+import mmap
+import os
+import struct
+import threading
+import unicodedata
+
+DEFAULT_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'spotify_recommendations')
+
+# A typo changes at most three of the query's trigrams, so the name meant
+# shares at least one of any four of them: entries in the postings of the
+# four rarest are the candidates, and the other trigrams only rank them
+SEED_GRAMS = 4
+# Bound the work per query so lookups stay fast on very large indexes
+MAX_SEED_POSTINGS = 5000
+MAX_POSTINGS_VISITED = 20000
+MAX_CANDIDATES = 32
+
+_MAGIC = b'SPIDX001'
+# File sections in order, with the array type of each (None for UTF-8 blobs)
+_SECTIONS = {
+    'names': None, 'name_offsets': 'Q',
+    'payloads': None, 'payload_offsets': 'Q',
+    'ids': None, 'id_offsets': 'Q',
+    'by_name': 'I', 'by_id': 'I',
+    'gram_keys': 'Q', 'gram_offsets': 'Q', 'postings': 'I'
+}
+
+
+def normalize(text: str):
+    """
+    Folds case and accents and reduces punctuation to single spaces, so that
+    'Sigur Rós' and 'sigur  ros!' compare equal.
+    """
+    text = unicodedata.normalize('NFKD', text or '').casefold()
+    text = ''.join(c if c.isalnum() else ' ' for c in text if not unicodedata.combining(c))
+    return ' '.join(text.split())
+
+
+def default_path(kind: str):
+    """
+    Where the index of artists ('artist') or tracks ('track') is kept by default.
+    """
+    return os.path.join(DEFAULT_DIR, kind + 's.idx')
+
+
+def _trigrams(name: str):
+    padded = ' ' + name + ' '
+    return set(zip(padded, padded[1:], padded[2:]))
+
+
+def _grams(name: str):
+    # Trigrams packed into integers (21 bits per character), the posting keys
+    return {(ord(a) << 42) | (ord(b) << 21) | ord(c) for a, b, c in _trigrams(name)}
+
+
+def _edit_distance(a: str, b: str):
+    # Levenshtein distance, computed a column at a time with the bits of
+    # one integer standing for the cells of a (Myers' bit-parallel method)
+    if not a:
+        return len(b)
+    matches = {}
+    for n, char in enumerate(a):
+        matches[char] = matches.get(char, 0) | (1 << n)
+    mask = (1 << len(a)) - 1
+    last = 1 << (len(a) - 1)
+    positive, negative, distance = mask, 0, len(a)
+    for char in b:
+        equal = matches.get(char, 0)
+        vertical = equal | negative
+        horizontal = (((equal & positive) + positive) ^ positive) | equal
+        up = negative | (~(horizontal | positive) & mask)
+        down = positive & horizontal
+        if up & last:
+            distance += 1
+        elif down & last:
+            distance -= 1
+        up = ((up << 1) | 1) & mask
+        down = (down << 1) & mask
+        positive = down | (~(vertical | up) & mask)
+        negative = up & vertical
+    return distance
+
+
+def _score(query: str, query_trigrams: set, name: str):
+    # The mean of the share of trigrams in common (Dice coefficient) and of
+    # characters that need no edit, plus 1 for a name starting with the
+    # query and 2 for an exact match. Trigrams alone rank a name with one
+    # typo below others that merely share a word with the query.
+    trigrams = _trigrams(name)
+    shared = 2 * len(query_trigrams & trigrams) / (len(query_trigrams) + len(trigrams))
+    unedited = 1 - _edit_distance(query, name) / max(len(query), len(name))
+    score = (shared + unedited) / 2
+    if name == query:
+        score += 2
+    elif name.startswith(query):
+        score += 1
+    return score
+
+
+def similarity(query: str, name: str):
+    """
+    Scores how well a name matches free text the way search() ranks results:
+    from 0 (nothing in common) to 3 (identical once normalized). Names a
+    typo or two away from the query score up to 1, plus 1 when the name
+    starts with the query.
+    """
+    query, name = normalize(query), normalize(name)
+    if not query or not name:
+        return 0.0
+    return _score(query, _trigrams(query), name)
+
+
+def _most_shared(counts: dict, limit: int):
+    # The entries with the highest counts; ties at the cut-off are taken in
+    # any order. Counts are small integers, so a histogram of them finds the
+    # cut-off without sorting every entry.
+    threshold = 0
+    taken = 0
+    histogram = collections.Counter(counts.values())
+    for count in sorted(histogram, reverse=True):
+        threshold = count
+        taken += histogram[count]
+        if taken >= limit:
+            break
+    best = [entry for entry, count in counts.items() if count >= threshold]
+    if len(best) > limit:
+        best.sort(key=counts.__getitem__, reverse=True)
+        del best[limit:]
+    return best
+
+
+class _Strings:
+    """
+    Read-only sequence of strings stored as one UTF-8 blob plus offsets.
+    """
+
+    __slots__ = ('blob', 'offsets')
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, n: int):
+        return bytes(self.blob[self.offsets[n]:self.offsets[n + 1]]).decode('utf-8')
+
+
+class _Sorted:
+    """
+    Presents strings in the order given by a permutation, for bisecting.
+    """
+
+    __slots__ = ('strings', 'order')
+
+    def __init__(self, strings, order):
+        self.strings = strings
+        self.order = order
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, n: int):
+        return self.strings[self.order[n]]
+
+
+class SearchIndex:
+    """
+    Typo-tolerant local search over Spotify artists or tracks.
+
+    Names are indexed by trigram for fuzzy matching and kept in sorted order
+    for prefix matching. Entries added with add() live in memory on top of
+    whatever was loaded from disk; save() merges both into one file that
+    later runs open with mmap, so a large index loads instantly and is paged
+    in on demand. Each entry keeps the raw API object it came from, so
+    results can be shaped exactly like the API's. An index can be shared
+    between threads.
+        * path (str): Index file to open, if it exists.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self._file = None
+        self._map = None
+        self._views = []
+        self._base_size = 0
+        self._lock = threading.Lock()
+        self._reset()
+        if path and os.path.isfile(path):
+            self._open(path)
+
+    def __len__(self):
+        return self._base_size + len(self._names)
+
+    def __contains__(self, spotify_id: str):
+        with self._lock:
+            return self._find_id(spotify_id) is not None
+
+    @property
+    def unsaved(self):
+        """
+        Number of entries added since the index was last loaded or saved.
+        """
+        return len(self._names)
+
+    def add(self, item: dict):
+        """
+        Adds a raw Spotify artist or track object; items already indexed are skipped.
+        Returns True if the item was added.
+        """
+        with self._lock:
+            return self._add(item)
+
+    def add_many(self, items):
+        with self._lock:
+            return sum(self._add(item) for item in items)
+
+    def _add(self, item: dict):
+        spotify_id = item.get('id')
+        name = normalize(item.get('name'))
+        if not spotify_id or not name or self._find_id(spotify_id) is not None:
+            return False
+
+        entry = len(self)
+        self._positions[spotify_id] = entry
+        self._names.append(name)
+        self._payloads.append(json.dumps(item, separators=(',', ':')))
+        self._by_name.append((name, entry))
+        self._by_name_sorted = False
+        for gram in _grams(name):
+            self._grams.setdefault(gram, []).append(entry)
+        return True
+
+    def add_from_file(self, path: str):
+        """
+        Bulk-loads a catalog of raw API objects, one JSON object per line.
+        Returns the number of items added.
+        """
+        with open(path) as f:
+            return self.add_many(json.loads(line) for line in f if line.strip())
+
+    def search(self, query: str, limit: int = 10, min_score: float = 0):
+        """
+        Finds the entries whose names best match the query, tolerating typos.
+            * query (str):       [Required] Free text, e.g. 'radiohed'
+            * limit (int):       Maximum number of results
+            * min_score (float): Drop weaker matches; see similarity() for the scale
+        Returns a list of raw API objects, best match first.
+        """
+        query = normalize(query)
+        if not query:
+            return []
+        query_trigrams = _trigrams(query)
+        with self._lock:
+            return self._search(query, query_trigrams, limit, min_score)
+
+    def _search(self, query: str, query_trigrams: set, limit: int, min_score: float):
+        # Gather the entries sharing one of the rarest trigrams, then count
+        # the other trigrams they share, each within a budget of postings
+        candidates = collections.Counter()
+        postings = sorted((self._postings(gram) for gram in _grams(query)), key=len)
+        budget = MAX_SEED_POSTINGS
+        for posting in postings[:SEED_GRAMS]:
+            candidates.update(posting[:budget])
+            budget -= len(posting)
+            if budget <= 0:
+                break
+        budget = MAX_POSTINGS_VISITED
+        for posting in postings[SEED_GRAMS:]:
+            if budget <= 0:
+                break
+            for entry in candidates.keys() & posting:
+                candidates[entry] += 1
+            budget -= len(posting)
+        best = _most_shared(candidates, MAX_CANDIDATES)
+
+        # Entries whose names start with the query are strong candidates too
+        best.extend(self._prefix_matches(query, MAX_CANDIDATES // 2))
+
+        scored = []
+        for entry in set(best):
+            score = _score(query, query_trigrams, self._name(entry))
+            if score >= min_score:
+                scored.append((score, -entry, entry))
+        scored.sort(reverse=True)
+        return [json.loads(self._payload(entry)) for _, _, entry in scored[:limit]]
+
+    def save(self, path: str = None):
+        """
+        Writes every entry, loaded and added, to one file that can be opened
+        with mmap. The file is replaced atomically.
+        """
+        with self._lock:
+            self._save(path or self.path)
+
+    def _save(self, path: str):
+        size = len(self)
+        names = [self._name(n) for n in range(size)]
+        payloads = [self._payload(n) for n in range(size)]
+        ids = [json.loads(p)['id'] for p in payloads]
+
+        grams = {}
+        for entry, name in enumerate(names):
+            for gram in _grams(name):
+                grams.setdefault(gram, []).append(entry)
+        keys = sorted(grams)
+        gram_offsets = array.array('Q', [0])
+        posting_list = array.array('I')
+        for key in keys:
+            posting_list.extend(grams[key])
+            gram_offsets.append(len(posting_list))
+
+        sections = {}
+        for label, strings in (('names', names), ('payloads', payloads), ('ids', ids)):
+            blob, offsets = bytearray(), array.array('Q', [0])
+            for value in strings:
+                blob += value.encode('utf-8')
+                offsets.append(len(blob))
+            sections[label] = bytes(blob)
+            sections[label[:-1] + '_offsets'] = offsets.tobytes()
+        sections['by_name'] = array.array('I', sorted(range(size), key=names.__getitem__)).tobytes()
+        sections['by_id'] = array.array('I', sorted(range(size), key=ids.__getitem__)).tobytes()
+        sections['gram_keys'] = array.array('Q', keys).tobytes()
+        sections['gram_offsets'] = gram_offsets.tobytes()
+        sections['postings'] = posting_list.tobytes()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temporary = path + '.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(_MAGIC)
+            position = len(_MAGIC) + 16 * len(_SECTIONS)
+            table = []
+            for label in _SECTIONS:
+                position += -position % 8
+                table.append((position, len(sections[label])))
+                position += len(sections[label])
+            for offset, length in table:
+                f.write(struct.pack('<QQ', offset, length))
+            for label, (offset, _) in zip(_SECTIONS, table):
+                f.write(b'\0' * (offset - f.tell()))
+                f.write(sections[label])
+        self._close()
+        os.replace(temporary, path)
+        self.path = path
+        self._reset()
+        self._open(path)
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._map is not None:
+            # Every view into the map must be released before it can close
+            for view in reversed(self._views):
+                view.release()
+            self._views = []
+            self._base_size = 0
+            self._map.close()
+            self._file.close()
+            self._map = self._file = None
+
+    def _reset(self):
+        self._names = []
+        self._payloads = []
+        self._positions = {}
+        self._by_name = []
+        self._by_name_sorted = True
+        self._grams = {}
+
+    def _open(self, path: str):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(_MAGIC)] != _MAGIC:
+            raise ValueError('%s is not a search index' % path)
+
+        view = memoryview(self._map)
+        self._views.append(view)
+        parts = {}
+        for n, (label, typecode) in enumerate(_SECTIONS.items()):
+            offset, length = struct.unpack_from('<QQ', self._map, len(_MAGIC) + 16 * n)
+            part = view[offset:offset + length]
+            self._views.append(part)
+            if typecode is not None:
+                part = part.cast(typecode)
+                self._views.append(part)
+            parts[label] = part
+
+        self._base_names = _Strings(parts['names'], parts['name_offsets'])
+        self._base_payloads = _Strings(parts['payloads'], parts['payload_offsets'])
+        self._base_ids = _Strings(parts['ids'], parts['id_offsets'])
+        self._base_by_name = _Sorted(self._base_names, parts['by_name'])
+        self._base_by_id = _Sorted(self._base_ids, parts['by_id'])
+        self._gram_keys = parts['gram_keys']
+        self._gram_offsets = parts['gram_offsets']
+        self._base_postings = parts['postings']
+        self._base_size = len(self._base_names)
+
+    def _name(self, entry: int):
+        if entry < self._base_size:
+            return self._base_names[entry]
+        return self._names[entry - self._base_size]
+
+    def _payload(self, entry: int):
+        if entry < self._base_size:
+            return self._base_payloads[entry]
+        return self._payloads[entry - self._base_size]
+
+    def _find_id(self, spotify_id: str):
+        entry = self._positions.get(spotify_id)
+        if entry is None and self._base_size:
+            n = bisect.bisect_left(self._base_by_id, spotify_id)
+            if n < self._base_size and self._base_by_id[n] == spotify_id:
+                entry = self._base_by_id.order[n]
+        return entry
+
+    def _postings(self, gram: int):
+        found = self._grams.get(gram, [])
+        if self._base_size:
+            n = bisect.bisect_left(self._gram_keys, gram)
+            if n < len(self._gram_keys) and self._gram_keys[n] == gram:
+                base = self._base_postings[self._gram_offsets[n]:self._gram_offsets[n + 1]]
+                return base.tolist() + found if found else base
+        return found
+
+    def _prefix_matches(self, query: str, limit: int):
+        matches = []
+        if self._base_size:
+            n = bisect.bisect_left(self._base_by_name, query)
+            while n < self._base_size and len(matches) < limit and self._base_by_name[n].startswith(query):
+                matches.append(self._base_by_name.order[n])
+                n += 1
+        if not self._by_name_sorted:
+            # Sorted on first lookup after additions, so bulk loads stay linear
+            self._by_name.sort()
+            self._by_name_sorted = True
+        n = bisect.bisect_left(self._by_name, (query, -1))
+        while n < len(self._by_name) and len(matches) < limit and self._by_name[n][0].startswith(query):
+            matches.append(self._by_name[n][1])
+            n += 1
+        return matches
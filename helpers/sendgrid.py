@@ -1,80 +1,98 @@
+import atexit
 import os
-import base64
-
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import (
-    Mail, Attachment, FileContent, FileName,
-    FileType, Disposition)
-
-from helpers import authentication
-
-
-def send_mail(message):
-
-    try:
-        token = authentication.get_token('https://www.apitutor.org/sendgrid/key')
-        sg = SendGridAPIClient(token)
-        sg.send(message)
-        return True
-
-    except Exception as e:
-        print(e)
-        return False
-
-
-def build_message(from_email: str, to_emails: tuple, subject: str,
-                  html_content: str, file_name: str):
-
-    message = Mail(
-        from_email=from_email,
-        to_emails=to_emails,
-        subject=subject,
-        html_content=html_content
-    )
-
-    if os.path.isfile(file_name):
-
-        with open(file=file_name, mode='rb') as f:
-            data = f.read()
-            f.close()
-
-        encoded = base64.b64encode(data).decode()
-
-        attachment = Attachment()
-        attachment.file_content = FileContent(encoded)
-        attachment.file_type = FileType('application/html')
-        attachment.file_name = FileName('Music_Recommendations.html')
-        attachment.disposition = Disposition('attachment')
-
-        message.attachment = attachment
-
-    return message
-
-
-def email(html_content: str, file_name: str):
-
-    ans = input('Would you like to email this list to yourself?[y/n] ')
-
-    if ans.lower() == 'yes' or ans.lower() == 'y':
-
+import sys
+
+from helpers import mail_queue
+from helpers import metrics
+
+
+def email(html_content: str, file_name: str, sender: str = None, receivers: tuple = None,
+          prompt: bool = True):
+    """
+    Emails the recommendations, asking whether to and to whom unless told.
+        * html_content (str): [Required] Body of the email
+        * file_name (str):    [Required] HTML file to attach, if it exists
+        * sender (str):       Sender address; asked for if missing and prompt is set
+        * receivers (tuple):  Recipient addresses; the sender is copied if there is only one
+        * prompt (bool):      Ask on standard input for anything not given. Without it,
+                              nothing is sent unless sender and receivers are both given.
+    The email is queued and sent in the background (see mail_queue).
+    Returns the ID of the queued message (see get_queue().wait), or False if nothing was queued.
+    """
+
+    if sender is None and receivers is None:
+        if not prompt:
+            return False
+        ans = input('Would you like to email this list to yourself?[y/n] ')
+        if ans.lower() != 'yes' and ans.lower() != 'y':
+            return False
+
+    if sender is None:
+        if not prompt:
+            return False
         sender = input('Enter your email: ')
-        receiver = input('Enter recipient email(s): ')
-        receiver = tuple([n.strip() for n in receiver.split(',')])
-
-        if len(receiver) <= 1:
-            receiver = (receiver[0], sender)
-
-        message = build_message(
-            from_email=sender,
-            to_emails=receiver,
-            subject='New Music Recommendations',
-            html_content=html_content,
-            file_name=file_name
-        )
-
-        result = send_mail(message=message)
-
-        if result:
-            print('Email sent successfully!\n')
-        else:
-            print('Email sent unsuccessfully.\n')
+
+    if receivers is None:
+        if not prompt:
+            return False
+        receivers = input('Enter recipient email(s): ').split(',')
+
+    receiver = tuple([n.strip() for n in receivers if n.strip()])
+
+    if len(receiver) <= 1:
+        receiver = receiver + (sender,)
+
+    # Sent in the background; anything still unsent at exit goes out on the next run
+    message_id = get_queue().enqueue(sender, receiver, 'New Music Recommendations', html_content, file_name)
+    metrics.increment('email_messages_total', outcome='queued')
+    print('Email queued for delivery!\n')
+    return message_id
+
+
+# delivers the emails queued by email() in the background:
+_queue = None
+
+# seconds a finishing program waits for queued mail before leaving it for the next run
+EXIT_FLUSH_TIMEOUT = 15
+
+
+def get_queue():
+    global _queue
+    if _queue is None:
+        _queue = mail_queue.MailQueue(mail_queue.DEFAULT_PATH).start()
+    return _queue
+
+
+def set_queue(queue):
+    """
+    Replaces the mail queue used by email(), e.g. with one pointed at another
+    database or client. The queue is started if it is not running.
+    """
+    global _queue
+    _queue = queue.start() if queue is not None else None
+
+
+def send_queued(timeout: float = None):
+    """
+    Sends the emails earlier runs left queued, waiting for them up to timeout
+    seconds; with a timeout of 0 they go out in the background. Does nothing
+    if no email has ever been queued.
+    Returns the number of messages in each state (see MailQueue.stats).
+    """
+    if _queue is None and not os.path.isfile(mail_queue.DEFAULT_PATH):
+        return {}
+    queue = get_queue()
+    if timeout != 0:
+        queue.flush(timeout)
+    return queue.stats()
+
+
+@atexit.register
+def _flush_at_exit():
+    # Written to stderr so that it never mixes with results on stdout
+    if _queue is None or _queue.flush(0):
+        return
+    print('Sending queued emails...', file=sys.stderr)
+    if not _queue.flush(EXIT_FLUSH_TIMEOUT):
+        print('Some emails are still queued; they are sent the next time the menu opens, '
+              'or with "music_finder.py mail".', file=sys.stderr)
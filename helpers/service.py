@@ -0,0 +1,351 @@
+import argparse
+import asyncio
+import json
+import re
+import sys
+import time
+import urllib.parse
+
+from helpers import async_spotify
+from helpers import genres
+from helpers import metrics
+from helpers import planner
+from helpers import spotify
+
+DEFAULT_PORT = 8080
+
+# Requests being handled at once before new ones are turned away with 503
+DEFAULT_MAX_PENDING = 256
+
+# List items encoded per chunk of a streamed response
+ITEMS_PER_CHUNK = 64
+
+# Longest request line or header line accepted, and most headers per request
+MAX_LINE = 8192
+MAX_HEADERS = 100
+
+STATUS_TEXT = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    429: 'Too Many Requests', 431: 'Request Header Fields Too Large', 500: 'Internal Server Error',
+    502: 'Bad Gateway', 503: 'Service Unavailable'
+}
+
+
+class HTTPError(Exception):
+    """
+    Ends a request with the given status and message.
+    """
+
+    def __init__(self, status: int, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def _error_status(e: spotify.SpotifyError):
+    # How a failure of the spotify helpers is reported to callers
+    if isinstance(e, spotify.InvalidSeedsError):
+        return 400
+    if isinstance(e, spotify.RateLimitedError):
+        return 429
+    if isinstance(e, spotify.CircuitOpenError):
+        return 503
+    return 502
+
+
+def _chunk(data: bytes):
+    return b'%x\r\n%s\r\n' % (len(data), data)
+
+
+def _split_values(query: dict, key: str):
+    # Accepts both ?genres=a,b and ?genres=a&genres=b
+    return [n for value in query.get(key, []) for n in value.split(',') if n]
+
+
+class RecommendationService:
+    """
+    An asyncio HTTP/1.1 server exposing the spotify helpers as JSON endpoints:
+
+        GET /search/artists?q=...
+        GET /search/tracks?q=...
+        GET /artists/{id}/top-tracks
+        GET /recommendations?artist_ids=...&track_ids=...&genres=...  (any number of seeds)
+        GET /health
+        GET /metrics  (Prometheus text format, while helpers.metrics is enabled)
+
+    Identical requests arriving while one is already being fetched share
+    that fetch. Once max_pending requests are being handled, new ones are
+    answered at once with 503 and Retry-After instead of queueing without
+    bound. Lists are streamed with chunked encoding, a few dozen items per
+    chunk, waiting for slow clients to catch up between chunks.
+        * client (AsyncSpotify): Client used for upstream calls; one is made if not given.
+        * max_pending (int):     Requests handled at once before shedding load.
+    """
+
+    def __init__(self, client: async_spotify.AsyncSpotify = None, max_pending: int = DEFAULT_MAX_PENDING):
+        self.client = client or async_spotify.AsyncSpotify()
+        self.max_pending = max_pending
+        self.started = time.monotonic()
+        self.requests = 0
+        self.shared = 0
+        self.rejected = 0
+        self._pending = 0
+        self._in_flight = {}
+        self._server = None
+        self._routes = [
+            (re.compile(r'/search/(artist|track)s'), self._search),
+            (re.compile(r'/artists/([^/]+)/top-tracks'), self._top_tracks),
+            (re.compile(r'/recommendations'), self._recommendations),
+            (re.compile(r'/health'), self._health),
+            (re.compile(r'/metrics'), self._metrics),
+        ]
+
+    async def start(self, host: str = '127.0.0.1', port: int = DEFAULT_PORT, backlog: int = 1024):
+        """
+        Starts listening; returns the asyncio server (see its sockets for the port bound).
+        """
+        self._server = await asyncio.start_server(self._handle_connection, host, port, backlog=backlog,
+                                                  limit=MAX_LINE)
+        return self._server
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.client.close()
+
+    def health(self):
+        """
+        Returns the service's state as reported by /health.
+        """
+        circuit = spotify._breaker.state
+        return {
+            'status': 'ok' if circuit != 'open' else 'degraded',
+            'circuit': circuit,
+            'uptime': round(time.monotonic() - self.started, 3),
+            'pending': self._pending,
+            'in_flight': len(self._in_flight),
+            'requests': self.requests,
+            'shared': self.shared,
+            'rejected': self.rejected
+        }
+
+    async def _search(self, kind: str, query: dict):
+        term = ' '.join(query.get('q', [])).strip()
+        if not term:
+            raise HTTPError(400, 'The q parameter is required')
+        search = self.client.get_artists if kind == 'artist' else self.client.get_tracks
+        return await self._shared(('search', kind, term.lower()), lambda: search(term))
+
+    async def _top_tracks(self, artist_id: str, query: dict):
+        return await self._shared(('top-tracks', artist_id), lambda: self.client.get_top_tracks_by_artist(artist_id))
+
+    async def _recommendations(self, query: dict):
+        seeds = [_split_values(query, key) for key in ('artist_ids', 'track_ids', 'genres')]
+        key = ('recommendations',) + tuple(tuple(sorted(values)) for values in seeds)
+        return await self._shared(key, lambda: planner.get_similar_tracks_async(self.client, *seeds))
+
+    async def _health(self, query: dict):
+        return self.health()
+
+    async def _metrics(self, query: dict):
+        if not metrics.enabled():
+            raise HTTPError(404, 'Metrics are not enabled')
+        return metrics.prometheus_text()
+
+    async def _shared(self, key: tuple, fetch):
+        # Callers asking for the same thing at once await one upstream fetch.
+        # The fetch is shielded so a caller hanging up does not cancel it for the rest.
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: tuple, task):
+        self._in_flight.pop(key, None)
+        if not task.cancelled():
+            # Mark the exception as retrieved in case every waiter has gone
+            task.exception()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, keep_alive = request
+                self.requests += 1
+                # Health checks and scrapes are answered even under load
+                if self._pending >= self.max_pending and not target.startswith(('/health', '/metrics')):
+                    self.rejected += 1
+                    await self._send_error(writer, HTTPError(503, 'Too many requests in progress', 1), keep_alive)
+                else:
+                    self._pending += 1
+                    try:
+                        await self._respond(writer, method, target, keep_alive)
+                    finally:
+                        self._pending -= 1
+                if not keep_alive:
+                    break
+        except HTTPError as e:
+            await self._send_error(writer, e, False)
+        except ValueError:
+            # A line longer than the stream limit, or a bad Content-Length
+            await self._send_error(writer, HTTPError(400, 'Malformed request'), False)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, version = line.decode('latin-1').split()
+        except ValueError:
+            raise HTTPError(400, 'Malformed request line') from None
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise HTTPError(431, 'Request headers too large')
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        # Discard any body so the next request on the connection parses cleanly
+        length = int(headers.get('content-length') or 0)
+        if length:
+            await reader.readexactly(length)
+
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+        return method, target, keep_alive
+
+    async def _respond(self, writer, method: str, target: str, keep_alive: bool):
+        parts = urllib.parse.urlsplit(target)
+        query = urllib.parse.parse_qs(parts.query)
+        for pattern, handler in self._routes:
+            match = pattern.fullmatch(parts.path.rstrip('/') or '/')
+            if match:
+                break
+        else:
+            return await self._send_error(writer, HTTPError(404, 'No such endpoint: ' + parts.path), keep_alive)
+        if method not in ('GET', 'HEAD'):
+            return await self._send_error(writer, HTTPError(405, 'Only GET is supported'), keep_alive)
+
+        try:
+            with metrics.timer('service_request_seconds', route=handler.__name__.lstrip('_')):
+                payload = await handler(*match.groups(), query)
+        except HTTPError as e:
+            return await self._send_error(writer, e, keep_alive)
+        except spotify.SpotifyError as e:
+            error = HTTPError(_error_status(e), str(e).split('\n')[0], e.retry_after)
+            return await self._send_error(writer, error, keep_alive)
+        except Exception as e:
+            return await self._send_error(writer, HTTPError(500, '%s: %s' % (type(e).__name__, e)), keep_alive)
+
+        if isinstance(payload, str):
+            await self._send_text(writer, payload, keep_alive, head_only=method == 'HEAD')
+        elif isinstance(payload, list):
+            await self._stream_list(writer, payload, keep_alive, method == 'HEAD')
+        else:
+            await self._send_json(writer, 200, payload, keep_alive, head_only=method == 'HEAD')
+
+    def _head(self, status: int, keep_alive: bool, headers: dict, content_type: str = 'application/json'):
+        lines = ['HTTP/1.1 %d %s' % (status, STATUS_TEXT.get(status, 'Error')),
+                 'Content-Type: ' + content_type,
+                 'Connection: ' + ('keep-alive' if keep_alive else 'close')]
+        lines.extend('%s: %s' % item for item in headers.items())
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    async def _send_json(self, writer, status: int, payload, keep_alive: bool, headers: dict = None,
+                         head_only: bool = False):
+        body = json.dumps(payload).encode('utf-8')
+        headers = dict(headers or {}, **{'Content-Length': str(len(body))})
+        writer.write(self._head(status, keep_alive, headers))
+        if not head_only:
+            writer.write(body)
+        await writer.drain()
+
+    async def _send_text(self, writer, text: str, keep_alive: bool, head_only: bool = False):
+        body = text.encode('utf-8')
+        writer.write(self._head(200, keep_alive, {'Content-Length': str(len(body))},
+                                'text/plain; version=0.0.4; charset=utf-8'))
+        if not head_only:
+            writer.write(body)
+        await writer.drain()
+
+    async def _send_error(self, writer, e: HTTPError, keep_alive: bool):
+        headers = {}
+        if e.retry_after is not None:
+            headers['Retry-After'] = str(max(1, round(e.retry_after)))
+        await self._send_json(writer, e.status, {'error': str(e), 'status': e.status}, keep_alive, headers)
+
+    async def _stream_list(self, writer, items: list, keep_alive: bool, head_only: bool = False):
+        writer.write(self._head(200, keep_alive, {'Transfer-Encoding': 'chunked'}))
+        if head_only:
+            writer.write(b'0\r\n\r\n')
+            return await writer.drain()
+
+        writer.write(_chunk(b'['))
+        for start in range(0, len(items), ITEMS_PER_CHUNK):
+            part = ','.join(json.dumps(item) for item in items[start:start + ITEMS_PER_CHUNK])
+            writer.write(_chunk((',' if start else '').encode('utf-8') + part.encode('utf-8')))
+            # Wait for the client to take what has been sent before encoding more
+            await writer.drain()
+        writer.write(_chunk(b']') + b'0\r\n\r\n')
+        await writer.drain()
+
+
+async def serve(host: str = '127.0.0.1', port: int = DEFAULT_PORT, concurrency: int = async_spotify.DEFAULT_CONCURRENCY,
+                max_pending: int = DEFAULT_MAX_PENDING):
+    """
+    Runs the service until cancelled.
+    """
+    service = RecommendationService(async_spotify.AsyncSpotify(concurrency), max_pending)
+    server = await service.start(host, port)
+    print('Serving on %s' % ', '.join('http://%s:%d' % s.getsockname()[:2] for s in server.sockets), file=sys.stderr)
+    try:
+        await service.serve_forever()
+    finally:
+        await service.close()
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description='Serve Spotify searches and recommendations over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--concurrency', type=int, default=async_spotify.DEFAULT_CONCURRENCY,
+                        help='upstream requests in flight at once')
+    parser.add_argument('--max-pending', type=int, default=DEFAULT_MAX_PENDING,
+                        help='requests handled at once before answering 503')
+    parser.add_argument('--metrics', action='store_true', help='record timings and serve them at /metrics')
+    args = parser.parse_args(argv)
+    if args.metrics:
+        metrics.enable()
+
+    # Loaded here, since fetching the list would block the event loop
+    genres.get_catalog().load()
+    spotify.set_genre_catalog(genres.get_catalog())
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.concurrency, args.max_pending))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,77 @@
+import concurrent.futures
+import http.client
+import threading
+import time
 import urllib.parse
-import urllib.request
 import urllib.error
-import json
 
 from helpers import authentication
+from helpers import cache
+from helpers import metrics
+from helpers import models as track_models
+from helpers import ratelimit
+from helpers import retry
+from helpers import schema
+from helpers import transport
 from helpers import utilities
 
+SPOTIFY_API = 'https://api.spotify.com/v1'
+SPOTIFY_KEY_URL = 'https://www.apitutor.org/spotify/key'
+DEFAULT_REQUESTS_PER_SECOND = 20
+
+# Most IDs the /tracks and /artists endpoints accept per request, and how
+# long lookups wait for other callers' IDs to join their batch
+MAX_IDS_PER_REQUEST = 50
+DEFAULT_BATCH_WINDOW = 0.005
+
+# Search results per page, and how deep Spotify lets a search be paged
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 50
+MAX_SEARCH_OFFSET = 1000
+
+
+##########
+# Errors #
+##########
+
+class SpotifyError(Exception):
+    """
+    Base class for failed Spotify requests.
+        * url (str):           The request URL, if one was built.
+        * status (int):        HTTP status, or None for network failures.
+        * retry_after (float): Seconds the server asked us to wait, if it did.
+    """
+
+    def __init__(self, message: str, url: str = None, status: int = None, retry_after: float = None):
+        super().__init__(message)
+        self.url = url
+        self.status = status
+        self.retry_after = retry_after
+
+
+class InvalidSeedsError(SpotifyError):
+    """The recommendation seeds were missing or exceeded Spotify's limit."""
+
+
+class RequestError(SpotifyError):
+    """Spotify rejected the request itself (4xx other than 429)."""
+
+
+class AuthenticationError(RequestError):
+    """Spotify rejected the bearer token (401/403)."""
+
+
+class RateLimitedError(SpotifyError):
+    """Spotify kept answering 429 Too Many Requests."""
+
+
+class UpstreamError(SpotifyError):
+    """Spotify failed (5xx) or could not be reached."""
+
+
+class CircuitOpenError(SpotifyError):
+    """Requests are suspended because Spotify has been failing repeatedly."""
+
 
 def get_genres_abridged():
     return [
@@ -17,52 +83,113 @@ def get_genres_abridged():
     ]
 
 
-def get_tracks(search_term: str, simplify: bool = True):
+def get_tracks(search_term: str, simplify: bool = True, models: bool = False):
     """
     Retrieves a list of Spotify tracks, given the search term passed in.
         * search_term (str): [Required] A search term (for a song), represented as a string.
         * simplify (bool):   Indicates whether you want to simplify the data that is returned.
+        * models (bool):     Return simplified tracks as compact Track objects instead of dicts.
     Returns a list of tracks.
     """
-    search_term = urllib.parse.quote_plus(search_term)
-    url = 'https://api.spotify.com/v1/search?q=' + search_term + '&type=track'
-    data = _issue_get_request(url)
+    data = _search(search_term, 'track')
     if not simplify:
         return data
-    return _simplify_tracks(data['tracks']['items'])
+    return _simplify_tracks(data['tracks']['items'], models)
+
+
+def iter_tracks(search_term: str, page_size: int = SEARCH_PAGE_SIZE, simplify: bool = True, models: bool = False,
+                prefetch: bool = True):
+    """
+    Yields every track found for the search term, one page at a time, as
+    far as Spotify lets a search be paged. Each page is requested only
+    when the caller is about to need it: with prefetch, the next page is
+    fetched in the background while the current one is consumed, and
+    nothing more is fetched once the caller stops iterating.
+        * search_term (str): [Required] A search term (for a song), represented as a string.
+        * page_size (int):   Tracks per request, up to 50.
+        * simplify (bool):   Indicates whether you want to simplify the data that is returned.
+        * models (bool):     Return simplified tracks as compact Track objects instead of dicts.
+        * prefetch (bool):   Fetch the next page while the current one is consumed.
+    Returns a generator of tracks.
+    """
+    for items in _search_pages(search_term, 'track', page_size, prefetch):
+        yield from (_simplify_tracks(items, models) if simplify else items)
+
+
+def iter_artists(search_term: str, page_size: int = SEARCH_PAGE_SIZE, simplify: bool = True, models: bool = False,
+                 prefetch: bool = True):
+    """
+    Yields every artist found for the search term, one page at a time; see iter_tracks.
+        * search_term (str): [Required] A search term (for an artist), represented as a string.
+        * page_size (int):   Artists per request, up to 50.
+        * simplify (bool):   Indicates whether you want to simplify the data that is returned.
+        * models (bool):     Return simplified artists as compact Artist objects instead of dicts.
+        * prefetch (bool):   Fetch the next page while the current one is consumed.
+    Returns a generator of artists.
+    """
+    for items in _search_pages(search_term, 'artist', page_size, prefetch):
+        yield from (_simplify_artists(items, models) if simplify else items)
+
+
+def get_tracks_by_ids(track_ids: list, simplify: bool = True, models: bool = False):
+    """
+    Retrieves tracks by their Spotify IDs, up to 50 per request. Tracks
+    already in the response cache are not requested again, and lookups
+    made on other threads at the same moment share requests (see
+    set_batch_window).
+        * track_ids (list): [Required] Spotify track IDs.
+        * simplify (bool):  Indicates whether you want to simplify the data that is returned.
+        * models (bool):    Return simplified tracks as compact Track objects instead of dicts.
+    Returns a list of tracks in the order of the IDs, with None for IDs Spotify does not know.
+    """
+    items = _loaders['track'].load_many(track_ids)
+    return items if not simplify else _simplify_found(items, _simplify_tracks, models)
+
+
+def get_artists_by_ids(artist_ids: list, simplify: bool = True, models: bool = False):
+    """
+    Retrieves artists by their Spotify IDs, up to 50 per request; see get_tracks_by_ids.
+        * artist_ids (list): [Required] Spotify artist IDs.
+        * simplify (bool):   Indicates whether you want to simplify the data that is returned.
+        * models (bool):     Return simplified artists as compact Artist objects instead of dicts.
+    Returns a list of artists in the order of the IDs, with None for IDs Spotify does not know.
+    """
+    items = _loaders['artist'].load_many(artist_ids)
+    return items if not simplify else _simplify_found(items, _simplify_artists, models)
 
 
-def get_top_tracks_by_artist(artist_id: str, simplify: bool = True):
+def get_top_tracks_by_artist(artist_id: str, simplify: bool = True, models: bool = False):
     """
     Retrieves a list of Spotify "top tracks" by an artist
         * artist_id (str): [Required] The Spotify id of the artist.
         * simplify (bool):   Indicates whether you want to simplify the data that is returned.
+        * models (bool):     Return simplified tracks as compact Track objects instead of dicts.
     Returns a list of tracks.
     """
-    url = 'https://api.spotify.com/v1/artists/' + artist_id + '/top-tracks?country=us'
-    # print(url)
+    url = _top_tracks_url(artist_id)
     data = _issue_get_request(url)
+    if 'track' in _search_indexes:
+        _search_indexes['track'].add_many(data['tracks'])
     if not simplify:
         return data
-    return _simplify_tracks(data['tracks'])
+    return _simplify_tracks(data['tracks'], models)
 
 
-def get_artists(search_term: str, simplify: bool = True):
+def get_artists(search_term: str, simplify: bool = True, models: bool = False):
     """
     Retrieves a list of Spotify artists, given the search term passed in.
         * search_term (str): [Required] A search term (for an artist), represented as a string.
         * simplify (bool):   Indicates whether you want to simplify the data that is returned.
+        * models (bool):     Return simplified artists as compact Artist objects instead of dicts.
     Returns a list of artists.
     """
-    search_term = urllib.parse.quote_plus(search_term)
-    url = 'https://api.spotify.com/v1/search?q=' + search_term + '&type=artist'
-    data = _issue_get_request(url)
+    data = _search(search_term, 'artist')
     if not simplify:
         return data
-    return _simplify_artists(data['artists']['items'])
+    return _simplify_artists(data['artists']['items'], models)
 
 
-def get_similar_tracks(artist_ids: list, track_ids: list, genres: list, simplify: bool = True):
+def get_similar_tracks(artist_ids: list, track_ids: list, genres: list, simplify: bool = True, models: bool = False):
     """
     Spotify's way of providing recommendations. One or more params is required: 
     artist_ids, track_ids, or genres. Up to 5 seed values may be provided in 
@@ -71,11 +198,41 @@ def get_similar_tracks(artist_ids: list, track_ids: list, genres: list, simplify
         * artist_ids (list): A list of artist ids
         * track_ids (list): A list of track ids
         * genres (genres): A list of genres
+        * models (bool): Return compact Track objects instead of dicts
     Returns a list of tracks that are similar
     """
+    if _recommender is not None:
+        return _recommender.get_similar_tracks(artist_ids, track_ids, genres, simplify, models)
+
+    url = _recommendations_url(artist_ids, track_ids, genres)
+    data = _issue_get_request(url)
+    if not simplify:
+        return data
+
+    return _simplify_tracks(data['tracks'], models)
+
+
+############################################
+# Some private, helper functions utilities #
+############################################
+# builds the endpoint URLs shared by the blocking and async clients:
+def _search_url(search_term: str, kind: str, offset: int = 0, limit: int = None):
+    search_term = urllib.parse.quote_plus(search_term)
+    url = SPOTIFY_API + '/search?q=' + search_term + '&type=' + kind
+    # the first page keeps its old URL so it is shared with get_tracks and get_artists in the cache
+    if offset or limit:
+        url += '&offset=%d&limit=%d' % (offset, limit or SEARCH_PAGE_SIZE)
+    return url
+
+
+def _top_tracks_url(artist_id: str):
+    return SPOTIFY_API + '/artists/' + artist_id + '/top-tracks?country=us'
+
+
+def _recommendations_url(artist_ids: list, track_ids: list, genres: list):
     if not artist_ids and not track_ids and not genres:
-        raise Exception('Either artist_ids, track_ids, or genres  are required')
-    
+        raise InvalidSeedsError('Either artist_ids, track_ids, or genres  are required')
+
     # check if seeds <= 5:
     artist_ids = artist_ids or []
     track_ids = track_ids or []
@@ -83,8 +240,17 @@ def get_similar_tracks(artist_ids: list, track_ids: list, genres: list, simplify
     if len(artist_ids) + len(track_ids) + len(genres) > 5:
         error = 'You can only have 5 "seed values" in your recommendations query.\n' + \
             'In other words, (len(artist_ids) + len(track_ids) + len(genres)) must be less than or equal to 5.'
-        raise Exception(error)
-    
+        raise InvalidSeedsError(error)
+
+    if genres and _genre_catalog is not None:
+        invalid = _genre_catalog.invalid(genres)
+        if invalid:
+            hints = []
+            for genre in invalid:
+                guess = _genre_catalog.suggest(genre)
+                hints.append('%r (did you mean %r?)' % (genre, guess) if guess else repr(genre))
+            raise InvalidSeedsError('Not a Spotify genre seed: ' + ', '.join(hints))
+
     params = []
     if artist_ids:
         params.append('seed_artists=' + ','.join(artist_ids))
@@ -92,92 +258,423 @@ def get_similar_tracks(artist_ids: list, track_ids: list, genres: list, simplify
         params.append('seed_tracks=' + ','.join(track_ids))
     if genres:
         params.append('seed_genres=' + ','.join(genres))
-    
-    url = 'https://api.spotify.com/v1/recommendations?' + '&'.join(params)
-    print(url)
-    data = _issue_get_request(url)
-    if not simplify:
+
+    return SPOTIFY_API + '/recommendations?' + '&'.join(params)
+
+
+# caches responses between calls and between runs:
+_cache = None
+_cache_configured = False
+
+
+def get_cache():
+    global _cache, _cache_configured
+    if not _cache_configured:
+        _cache, _cache_configured = cache.ResponseCache(), True
+    return _cache
+
+
+def set_cache(response_cache):
+    """
+    Replaces the response cache; pass None to disable caching.
+    """
+    global _cache, _cache_configured
+    _cache, _cache_configured = response_cache, True
+
+
+# rejects genres that are not seeds before calling /recommendations:
+_genre_catalog = None
+
+
+def set_genre_catalog(catalog):
+    """
+    Checks the genres given to get_similar_tracks against a
+    genres.GenreCatalog first, so a misspelt genre fails at once with
+    InvalidSeedsError instead of costing a request answered with 400.
+    Pass None to stop checking.
+    """
+    global _genre_catalog
+    _genre_catalog = catalog
+
+
+# answers get_similar_tracks locally instead of calling /recommendations:
+_recommender = None
+
+
+def set_recommender(recommender):
+    """
+    Serves get_similar_tracks from a local backend such as
+    recommender.LocalRecommender; pass None to use Spotify again.
+    """
+    global _recommender
+    _recommender = recommender
+
+
+# answers searches from local indexes of previously seen results:
+_search_indexes = {}
+_min_local_results = 5
+
+# local matches weaker than this do not count toward _min_local_results
+LOCAL_MIN_SCORE = 0.5
+LOCAL_SEARCH_LIMIT = 20
+
+
+def get_search_index(kind: str):
+    """
+    Returns the local index serving searches for 'artist' or 'track', or None.
+    """
+    return _search_indexes.get(kind)
+
+
+def set_search_index(kind: str, index, min_results: int = 5):
+    """
+    Serves get_artists ('artist') or get_tracks ('track') from a local
+    search_index.SearchIndex, calling Spotify only when fewer than
+    min_results good matches are found. API results are added to the index.
+    Pass None to stop using an index.
+    """
+    global _min_local_results
+    if index is None:
+        _search_indexes.pop(kind, None)
+    else:
+        _search_indexes[kind] = index
+    _min_local_results = min_results
+
+
+def _search(search_term: str, kind: str):
+    # searches the local index first, then Spotify, feeding the index
+    data = _search_locally(search_term, kind)
+    if data is not None:
         return data
 
-    return _simplify_tracks(data['tracks'])
+    data = _issue_get_request(_search_url(search_term, kind))
+    index = _search_indexes.get(kind)
+    if index is not None:
+        index.add_many(data[kind + 's']['items'])
+    return data
 
 
-############################################
-# Some private, helper functions utilities #
-############################################
-# retrieves data from any Spotify endpoint:
-def _issue_get_request(url):
-    token = authentication.get_token('https://www.apitutor.org/spotify/key')
-    request = urllib.request.Request(url, None, {
-        'Authorization': 'Bearer ' + token
-    })
+def _search_locally(search_term: str, kind: str):
+    # a page shaped like Spotify's of the local index's matches, or None if it has too few
+    index = _search_indexes.get(kind)
+    if index is None:
+        return None
+    items = index.search(search_term, LOCAL_SEARCH_LIMIT, LOCAL_MIN_SCORE)
+    if len(items) < _min_local_results:
+        return None
+    page = {
+        'href': _search_url(search_term, kind, 0, LOCAL_SEARCH_LIMIT),
+        'items': items,
+        'limit': LOCAL_SEARCH_LIMIT,
+        'next': None,
+        'offset': 0,
+        'previous': None,
+        'total': len(items)
+    }
+    return {kind + 's': page}
+
+
+# prefetches search pages and sends ID batches in the background:
+_background_pool = None
+_background_lock = threading.Lock()
+
+
+def _get_background_pool():
+    global _background_pool
+    with _background_lock:
+        if _background_pool is None:
+            _background_pool = concurrent.futures.ThreadPoolExecutor(4, thread_name_prefix='spotify-background')
+        return _background_pool
+
+
+def _search_page(search_term: str, kind: str, offset: int, limit: int):
+    data = _issue_get_request(_search_url(search_term, kind, offset, limit if limit != SEARCH_PAGE_SIZE else None))
+    page = data[kind + 's']
+    index = _search_indexes.get(kind)
+    if index is not None:
+        index.add_many(page['items'])
+    return page
+
+
+def _search_pages(search_term: str, kind: str, page_size: int, prefetch: bool):
+    # yields the items of each page of a search, at most one page ahead of the caller
+    page_size = max(1, min(page_size, MAX_SEARCH_PAGE_SIZE))
+    seen = None
+    if page_size == SEARCH_PAGE_SIZE:
+        # The first page is what get_tracks or get_artists returns, from the local index if it has enough
+        data = _search_locally(search_term, kind)
+        if data is not None:
+            # Spotify's pages are fetched only if the caller wants more, leaving out what it has seen
+            seen = {item['id'] for item in data[kind + 's']['items']}
+            yield data[kind + 's']['items']
+    page = _search_page(search_term, kind, 0, page_size)
+
+    offset, pending = 0, None
     try:
-        with urllib.request.urlopen(request) as response:
-            data = json.loads(response.read().decode())
+        while True:
+            items = page['items']
+            offset += len(items)
+            more = page['next'] is not None if 'next' in page else offset < page.get('total', 0)
+            more = more and items and offset < MAX_SEARCH_OFFSET
+            limit = min(page_size, MAX_SEARCH_OFFSET - offset)
+            if more and prefetch:
+                pending = _get_background_pool().submit(_search_page, search_term, kind, offset, limit)
+            yield items if seen is None else [item for item in items if item['id'] not in seen]
+            if not more:
+                return
+            page = pending.result() if pending is not None else _search_page(search_term, kind, offset, limit)
+            pending = None
+    finally:
+        # The caller stopped early: drop the page fetched ahead if it has not started
+        if pending is not None:
+            pending.cancel()
+
+
+def _item_url(kind: str, item_id: str):
+    return SPOTIFY_API + '/' + kind + 's/' + item_id
+
+
+def _simplify_found(items: list, simplify, models: bool):
+    found = iter(simplify([item for item in items if item is not None], models))
+    return [None if item is None else next(found) for item in items]
+
+
+class _BatchLoader:
+    """
+    Collects the IDs asked for by every thread during a short window and
+    requests them from /tracks or /artists together, in batches of up to
+    MAX_IDS_PER_REQUEST. The first caller of a window waits it out and
+    sends the batches; the others only wait for their results. Each item
+    is cached under its own URL, so later lookups of it skip the API.
+    """
+
+    def __init__(self, kind: str, window: float = DEFAULT_BATCH_WINDOW):
+        self.kind = kind
+        self.window = window
+        self._lock = threading.Lock()
+        self._queued = []
+        self._waiting = {}
+
+    def load_many(self, ids: list):
+        response_cache = get_cache()
+        found = {}
+        if response_cache is not None:
+            for item_id in set(ids):
+                data = response_cache.get(_item_url(self.kind, item_id))
+                if data is not None:
+                    found[item_id] = data
+
+        missing = [item_id for item_id in dict.fromkeys(ids) if item_id not in found]
+        if missing:
+            futures, lead = self._join(missing)
+            if lead:
+                time.sleep(self.window)
+                self._send()
+            for item_id, future in futures.items():
+                found[item_id] = future.result()
+        return [found[item_id] for item_id in ids]
+
+    def _join(self, ids: list):
+        # Adds the IDs to the current window; the caller that opens a window sends it
+        futures = {}
+        with self._lock:
+            lead = not self._queued
+            for item_id in ids:
+                future = self._waiting.get(item_id)
+                if future is None:
+                    future = self._waiting[item_id] = concurrent.futures.Future()
+                    self._queued.append(item_id)
+                futures[item_id] = future
+        return futures, lead
+
+    def _send(self):
+        with self._lock:
+            queued, self._queued = self._queued, []
+        batches = [queued[n:n + MAX_IDS_PER_REQUEST] for n in range(0, len(queued), MAX_IDS_PER_REQUEST)]
+        # One batch is sent on this thread, the rest alongside it
+        pending = [_get_background_pool().submit(self._fetch, batch) for batch in batches[1:]]
+        if batches:
+            self._fetch(batches[0])
+        concurrent.futures.wait(pending)
+
+    def _fetch(self, batch: list):
+        try:
+            url = SPOTIFY_API + '/' + self.kind + 's?ids=' + ','.join(batch)
+            items = _issue_get_request(url, use_cache=False)[self.kind + 's']
+        except Exception as e:
+            error = e
+            items = None
+        with self._lock:
+            futures = [self._waiting.pop(item_id) for item_id in batch]
+        if items is None:
+            for future in futures:
+                future.set_exception(error)
+            return
+
+        response_cache = get_cache()
+        if response_cache is not None:
+            response_cache.set_many([(_item_url(self.kind, item['id']), item) for item in items if item is not None])
+        for future, item in zip(futures, items):
+            future.set_result(item)
+
+
+_loaders = {'track': _BatchLoader('track'), 'artist': _BatchLoader('artist')}
+
+
+def set_batch_window(seconds: float):
+    """
+    Changes how long get_tracks_by_ids and get_artists_by_ids wait for
+    lookups on other threads to share their requests; 0 sends at once.
+    """
+    for loader in _loaders.values():
+        loader.window = seconds
+
+
+# paces and retries requests shared by every caller in the process:
+_limiter = ratelimit.TokenBucket(DEFAULT_REQUESTS_PER_SECOND)
+_retry_policy = retry.RetryPolicy()
+_breaker = retry.CircuitBreaker()
+
+# failures worth classifying rather than letting escape as-is:
+_REQUEST_FAILURES = (urllib.error.URLError, http.client.HTTPException, OSError)
+
+
+def set_rate_limit(requests_per_second: float, burst: float = None):
+    """
+    Changes the request budget shared by all Spotify calls in this process.
+    """
+    global _limiter
+    _limiter = ratelimit.TokenBucket(requests_per_second, burst)
+
+
+def _error_for(e, url: str):
+    # must be called while handling e so the message includes its traceback
+    message = utilities.get_error_message(e, url)
+    status = getattr(e, 'code', None)
+    retry_after = None
+    if status is not None:
+        retry_after = retry.parse_retry_after(e.headers.get('Retry-After'))
+
+    if status == 429:
+        error_type = RateLimitedError
+    elif status in (401, 403):
+        error_type = AuthenticationError
+    elif status is None or status >= 500:
+        error_type = UpstreamError
+    else:
+        error_type = RequestError
+    return error_type(message, url, status, retry_after)
+
+
+def _next_delay(error: SpotifyError, attempt: int):
+    # decides whether to try again; returns seconds to wait, or None to give up
+    if error.status == 429 and error.retry_after:
+        # Hold back every caller, not just this one
+        _limiter.pause(error.retry_after)
+    if error.status == 401 and attempt == 1:
+        # The cached token was revoked early; fetch a new one and try again
+        authentication.invalidate_token(SPOTIFY_KEY_URL)
+        return 0
+    if not _retry_policy.should_retry(attempt, error.status):
+        return None
+    return _retry_policy.delay(attempt, error.retry_after)
+
+
+def _give_up(error: SpotifyError):
+    # only failures on Spotify's side count toward opening the circuit
+    if isinstance(error, (RateLimitedError, UpstreamError)):
+        _breaker.record_failure()
+    else:
+        _breaker.record_success()
+    return error
+
+
+def _circuit_open(url: str):
+    return CircuitOpenError(
+        'Spotify has failed %d times in a row; not calling it for another %.0f seconds.'
+        % (_breaker.failures, _breaker.retry_in()), url)
+
+
+def _endpoint(url: str):
+    # the URL's path with IDs left out, e.g. /artists/{id}/top-tracks, for metric labels
+    parts = url[len(SPOTIFY_API):].split('?', 1)[0].split('/')
+    if len(parts) > 3 and parts[1] == 'artists':
+        parts[2] = '{id}'
+    return '/'.join(parts)
+
+
+# retrieves data from any Spotify endpoint:
+def _issue_get_request(url, use_cache: bool = True):
+    if not metrics.enabled():
+        return _get(url, None, use_cache)
+    endpoint = _endpoint(url)
+    with metrics.timer('spotify_request_seconds', endpoint=endpoint):
+        return _get(url, endpoint, use_cache)
+
+
+def _get(url, endpoint: str = None, use_cache: bool = True):
+    response_cache = get_cache() if use_cache else None
+    if response_cache is not None:
+        data = response_cache.get(url)
+        if data is not None:
+            metrics.increment('spotify_requests_total', endpoint=endpoint, outcome='cached')
             return data
-    except urllib.error.HTTPError as e:
-        # give a good error message:
-        error = utilities.get_error_message(e, url)
-    raise Exception(error)
+
+    ticket = _breaker.allow()
+    if not ticket:
+        metrics.increment('spotify_requests_total', endpoint=endpoint, outcome='circuit_open')
+        raise _circuit_open(url)
+
+    # Whatever ends the call, including a failed token fetch or an unexpected
+    # error, a trial request must be handed back
+    try:
+        attempt = 0
+        while True:
+            attempt += 1
+            _limiter.acquire()
+            token = authentication.get_token(SPOTIFY_KEY_URL)
+            try:
+                response = transport.get_transport().get(url, {
+                    'Authorization': 'Bearer ' + token
+                })
+                data = response.json()
+            except _REQUEST_FAILURES as e:
+                # give a good error message:
+                error = _error_for(e, url)
+            else:
+                _breaker.record_success()
+                if response_cache is not None:
+                    response_cache.set(url, data)
+                metrics.increment('spotify_requests_total', endpoint=endpoint, outcome='ok')
+                return data
+
+            delay = _next_delay(error, attempt)
+            if delay is None:
+                metrics.increment('spotify_requests_total', endpoint=endpoint, outcome='error', status=error.status)
+                raise _give_up(error)
+            metrics.increment('spotify_retries_total', endpoint=endpoint, status=error.status)
+            time.sleep(delay)
+    finally:
+        _breaker.release(ticket)
 
 
-def _simplify_tracks(tracks: list):
+def _simplify_tracks(tracks: list, models: bool = False):
     try:
         tracks[0]
     except Exception:
         return tracks
 
-    simplified = []
-    # print(tracks[0])
-    for item in tracks:
-        track = { 
-            'id': item['id'], 
-            'name': item['name'], 
-            'preview_url': item['preview_url'],
-            'share_url': 'https://open.spotify.com/track/' + item['id']
-        }
-        try:
-            track['album'] = {
-                'id': item['album']['id'],
-                'name': item['album']['name'],
-                'image_url': item['album']['images'][0]['url'],
-                'image_url_small': item['album']['images'][-1]['url'],
-                'share_url': 'https://open.spotify.com/album/' + item['album']['id']
-            }
-        except Exception:
-            pass
-        try:
-            artists = item.get('album').get('artists')
-            artist = artists[0]
-            track['artist'] = { 
-                'id': artist['id'], 
-                'name': artist['name'],
-                'share_url': 'https://open.spotify.com/artist/' + item['album']['artists'][0]['id']
-            }
-        except Exception:
-            pass
-        simplified.append(track)
-    return simplified
-
-
-def _simplify_artists(artists: list):
+    if models:
+        return list(map(track_models.track_from_api, tracks))
+    return list(map(schema.nested_track, tracks))
+
+
+def _simplify_artists(artists: list, models: bool = False):
     try:
         artists[0]
     except Exception:
         return artists
 
-    simplified = []
-    for item in artists:
-        artist = { 
-            'id': item['id'], 
-            'name': item['name'], 
-            'genres': ', '.join(item['genres']),
-            'share_url': 'https://open.spotify.com/artist/' + item['id']
-        }
-        try:
-            artist['image_url'] = item['images'][0]['url']
-            artist['image_url_small'] = item['images'][-1]['url']
-        except Exception:
-            pass
-        simplified.append(artist)
-    return simplified
+    if models:
+        return list(map(track_models.artist_from_api, artists))
+    return list(map(schema.flat_artist, artists))
@@ -0,0 +1,189 @@
+import gzip
+import http.client
+import io
+import json
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+import zlib
+
+
+class Response:
+    """
+    The parts of an HTTP response the helpers care about.
+        * status (int): HTTP status code
+        * headers (http.client.HTTPMessage): response headers
+        * body (bytes): response body, already decompressed
+    """
+
+    __slots__ = ('url', 'status', 'headers', 'body')
+
+    def __init__(self, url: str, status: int, headers, body: bytes):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body.decode('utf-8', 'ignore'))
+
+
+def _decode_body(body: bytes, encoding: str):
+    encoding = (encoding or '').lower()
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    if encoding == 'deflate':
+        return zlib.decompress(body)
+    return body
+
+
+def _raise_for_status(url: str, status: int, reason: str, headers, body: bytes):
+    # Mirror urllib so callers keep catching urllib.error.HTTPError
+    if status >= 400:
+        raise urllib.error.HTTPError(url, status, reason, headers, io.BytesIO(body))
+
+
+class UrllibTransport:
+    """
+    Opens a fresh connection per request with urllib. This is how the helpers
+    behaved before pooling, and it is kept for comparison and as a fallback.
+    """
+
+    def get(self, url: str, headers: dict = None, timeout: float = 30):
+        headers = dict(headers or {})
+        headers.setdefault('Accept-Encoding', 'gzip')
+        request = urllib.request.Request(url, None, headers)
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = _decode_body(response.read(), response.headers.get('Content-Encoding'))
+            return Response(url, response.status, response.headers, body)
+
+    def close(self):
+        pass
+
+
+class PooledTransport:
+    """
+    Reuses keep-alive HTTP(S) connections across requests.
+        * pool_size (int):    Maximum number of idle connections kept open in total.
+        * max_per_host (int): Maximum number of connections open to one host at a time.
+        * timeout (float):    Socket timeout in seconds.
+    Callers beyond max_per_host wait for a connection to that host to free up.
+    """
+
+    def __init__(self, pool_size: int = 10, max_per_host: int = 4, timeout: float = 30):
+        self.pool_size = pool_size
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self._idle = {}
+        self._idle_count = 0
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def get(self, url: str, headers: dict = None, timeout: float = None):
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        headers = dict(headers or {})
+        headers.setdefault('Accept-Encoding', 'gzip')
+        headers.setdefault('Connection', 'keep-alive')
+
+        slot = self._slot_for(key)
+        with slot:
+            conn, reused = self._checkout(key, timeout)
+            try:
+                try:
+                    response = self._send(conn, path, headers)
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                    conn.close()
+                    if not reused:
+                        raise
+                    # The server dropped an idle keep-alive connection; retry once on a new one
+                    conn = self._connect(key, timeout)
+                    response = self._send(conn, path, headers)
+                body = response.read()
+            except BaseException:
+                # Whatever failed, the connection may hold half a response; never pool it
+                conn.close()
+                raise
+
+            if response.will_close:
+                conn.close()
+            else:
+                self._checkin(key, conn)
+
+        body = _decode_body(body, response.headers.get('Content-Encoding'))
+        _raise_for_status(url, response.status, response.reason, response.headers, body)
+        return Response(url, response.status, response.headers, body)
+
+    def reserve(self, connections: int):
+        """
+        Raises max_per_host and pool_size to at least the given number, for
+        callers that send that many requests to one host at once.
+        """
+        with self._lock:
+            self.pool_size = max(self.pool_size, connections)
+            if connections > self.max_per_host:
+                self.max_per_host = connections
+                # Requests in flight hand their slot back to the old semaphore
+                self._slots = {}
+
+    def close(self):
+        with self._lock:
+            idle, self._idle, self._idle_count = self._idle, {}, 0
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    def _send(self, conn, path: str, headers: dict):
+        conn.request('GET', path, headers=headers)
+        return conn.getresponse()
+
+    def _slot_for(self, key):
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._slots[key] = threading.BoundedSemaphore(self.max_per_host)
+            return slot
+
+    def _checkout(self, key, timeout):
+        with self._lock:
+            conns = self._idle.get(key)
+            if conns:
+                self._idle_count -= 1
+                return conns.pop(), True
+        return self._connect(key, timeout), False
+
+    def _checkin(self, key, conn):
+        with self._lock:
+            if self._idle_count < self.pool_size:
+                self._idle.setdefault(key, []).append(conn)
+                self._idle_count += 1
+                return
+        conn.close()
+
+    def _connect(self, key, timeout):
+        scheme, host, port = key
+        timeout = timeout if timeout is not None else self.timeout
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=timeout)
+        return http.client.HTTPConnection(host, port, timeout=timeout)
+
+
+_transport = PooledTransport()
+
+
+def get_transport():
+    return _transport
+
+
+def set_transport(transport):
+    """
+    Swaps the transport used by the Spotify and authentication helpers.
+    Any object with get(url, headers) -> Response and close() will do.
+    """
+    global _transport
+    _transport = transport
@@ -1,90 +1,219 @@
+import html
+import io
 import os
 import time
 import traceback
-import collections
-import pandas as pd
+
+from helpers import metrics
+from helpers import schema
 
 
 #######################
 # Data Frame Handling #
 #######################
 
-def flatten(d: dict, parent_key: str = '', sep: str = '_'):
-    items = []
-    for k, v in d.items():
-        new_key = parent_key + sep + k if parent_key else k
-        if isinstance(v, collections.MutableMapping):
-            items.extend(flatten(v, new_key, sep=sep).items())
-        else:
-            items.append((new_key, v))
-    return dict(items)
-
-
-def flatten_for_pandas(data: list):
-    """
-    Converts a list of nested dictionaries into a list of flattened 
-    dictionaries that can be more easilty displayed using pandas.
-        * data (list): [Required] a list of dictionaries
-    Returns a flattened list of dictionaries (list).
-    """
-    flattened_list = []
-    count = 1
-    for item in data:
-        item = flatten(item)
-        item['num'] = count
-        flattened_list.append(item)
-        count += 1
-    return flattened_list
+def get_dataframe(data: list):
+    """
+    Converts simplified tracks or artists, as the spotify helpers return
+    them, into a pandas dataframe indexed from 1.
+    """
+    with metrics.timer('render_seconds', output='dataframe'):
+        extract = schema.simplified_artist if data and 'genres' in data[0] else schema.simplified_track
+        return schema.to_dataframe(data, extract)
 
 
-def get_dataframe(data: list):
+#####################
+# Plain Text Tables #
+#####################
+
+class Table:
+    """
+    A small, read-only table for the menus printed to the terminal. Rows are
+    numbered from 1, like the 'Selection Number' index the menus have always
+    shown, and can be looked up by that number.
+    """
+
+    __slots__ = ('columns', 'rows', 'index_name')
+
+    def __init__(self, columns: list, rows: list, index_name: str = 'Selection Number'):
+        self.columns = list(columns)
+        self.rows = [list(row) for row in rows]
+        self.index_name = index_name
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __str__(self):
+        return format_table(self.columns, self.rows, self.index_name)
+
+    @property
+    def empty(self):
+        return not self.rows
+
+    def head(self, n: int = 5):
+        return Table(self.columns, self.rows[:n], self.index_name)
+
+    def get(self, number: int, column: str):
+        """
+        Returns the value in the given column of row number (counting from 1).
+        Raises KeyError if there is no such row or column.
+        """
+        if not 1 <= number <= len(self.rows) or column not in self.columns:
+            raise KeyError((number, column))
+        return self.rows[number - 1][self.columns.index(column)]
+
+
+def format_table(columns: list, rows: list, index_name: str = 'Selection Number'):
     """
-    Converts a list of dictionaries into a flattened pandas dataframe.
+    Renders rows as left-justified, space-separated columns headed by their
+    names, with each row prefixed by its number (counting from 1).
+
+    :param columns: column names
+    :param rows: list of rows, each a list of values in column order
+    :param index_name: heading for the row numbers
+    :return: the table as a string
     """
-    flattened_list = flatten_for_pandas(data)
-    return pd.DataFrame(flattened_list).set_index('num')
+
+    with metrics.timer('render_seconds', output='table'):
+        cells = [[index_name] + list(columns)]
+        cells.extend([str(n)] + ['' if v is None else str(v) for v in row] for n, row in enumerate(rows, 1))
+        widths = [max(len(row[i]) for row in cells) for i in range(len(cells[0]))]
+        lines = ['  '.join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip() for row in cells]
+        return '\n'.join(lines)
 
 
 ##################################
 # HTML Generation and Formatting #
 ##################################
 
-def get_formatted_tracklist_table_html(track_data: pd.DataFrame):
+TABLE_START = """<table style="border-collapse: collapse; border: solid 1px #CCC;">
+  <thead>
+    <tr style="border: solid 1px #CCC;">
+      <th>Song Title</th>
+      <th>Cover Art</th>
+      <th>Artist</th>
+      <th>Album</th>
+      <th>Share URL</th>
+    </tr>
+  </thead>
+  <tbody>
+"""
+
+TABLE_ROW = """    <tr style="border: solid 1px #CCC;">
+      <td>{name}</td>
+      <td><img src="{image}" /></td>
+      <td>{artist}</td>
+      <td>{album}</td>
+      <td><a href="{share_url}" target="_blank">{share_url}</a></td>
+    </tr>
+"""
+
+TABLE_END = """  </tbody>
+</table>"""
+
+# Rows are joined into chunks of this many before each write
+ROWS_PER_WRITE = 256
+
+
+def _track_field(track: dict, group: str, key: str):
+    # Accepts both nested tracks from spotify and flattened ones (e.g. album_name)
+    flat = track.get(group + '_' + key)
+    if flat is not None:
+        return flat
+    return (track.get(group) or {}).get(key)
+
+
+def _escape(value):
+    return html.escape('' if value is None else str(value), quote=True)
+
+
+def write_tracklist_table_html(tracks, out, images: dict = None):
+    """
+    Streams a formatted HTML table of tracks to a writable text stream, one
+    chunk of rows at a time, so memory use does not grow with the number of
+    tracks. Every value is HTML-escaped.
+        * tracks (iterable): [Required] Tracks as returned by the spotify helpers (or flattened)
+        * out (file):        [Required] Anything with write(str): an open file, io.StringIO,
+                             or socket.makefile('w')
+        * images (dict):     Sources to show in place of cover art URLs, e.g. the data: URIs
+                             from assets.AssetCache.data_uris; other images stay links
+    Returns the number of rows written.
+    """
+    images = images or {}
+    out.write(TABLE_START)
+    count = 0
+    chunk = []
+    for track in tracks:
+        image = _track_field(track, 'album', 'image_url_small')
+        chunk.append(TABLE_ROW.format(
+            name=_escape(track.get('name')),
+            image=_escape(images.get(image, image)),
+            artist=_escape(_track_field(track, 'artist', 'name')),
+            album=_escape(_track_field(track, 'album', 'name')),
+            share_url=_escape(track.get('share_url'))
+        ))
+        count += 1
+        if len(chunk) == ROWS_PER_WRITE:
+            out.write(''.join(chunk))
+            chunk.clear()
+    out.write(''.join(chunk))
+    out.write(TABLE_END)
+    return count
+
+
+def get_formatted_tracklist_table_html(tracks):
     """
     Makes a nice formatted HTML table of tracks. Good for writing to an
     HTML file or for sending in an email.
         * tracks(list): [Required] A list of tracks
     Returns an HTML table as a string
     """
-    if track_data.empty:
+    if hasattr(tracks, 'to_dict'):
+        # Still accept the flattened DataFrame this used to require
+        tracks = tracks.to_dict('records')
+    if not len(tracks):
         print('A list of tracks is required.')
         return
-    pd.set_option('display.max_colwidth', None)
-    keys = ['name', 'album_image_url_small', 'artist_name', 'album_name', 'share_url']
-    new_keys = ['Song Title', 'Cover Art', 'Artist', 'Album', 'Share URL']
-    track_data = track_data[keys].rename(columns=dict(zip(keys, new_keys)))
+    buffer = io.StringIO()
+    with metrics.timer('render_seconds', output='html_table'):
+        write_tracklist_table_html(tracks, buffer)
+    return buffer.getvalue()
+
+
+def write_html_report(data, tracks, out, images: dict = None):
+    """
+    Streams a complete report, the header describing the user's selections
+    followed by the table of tracks, to a writable text stream.
+        * data (Menu): [Required] The options menu holding the user's selections
+        * tracks (iterable): [Required] Tracks as returned by the spotify helpers
+        * out (file): [Required] Anything with write(str)
+        * images (dict): Sources to show in place of cover art URLs (see write_tracklist_table_html)
+    Returns the number of tracks written.
+    """
+    with metrics.timer('render_seconds', output='html'):
+        out.write(get_html_header(data) + '\n')
+        return write_tracklist_table_html(tracks, out, images)
 
-    def image_formatter(im):
-        return f'<img src="{im}" />'
 
-    formatters = {
-        'Cover Art': image_formatter
-    }
-    playlist_table = track_data.to_html(formatters=formatters, escape=False, index=False, render_links=True)
-    playlist_table = playlist_table.replace('style="text-align: right;"', '')
-    playlist_table = playlist_table.replace('<tr>', '<tr style="border: solid 1px #CCC;">')
-    playlist_table = playlist_table.replace(
-        '<table border="1" class="dataframe">',
-        '<table style="border-collapse: collapse; border: solid 1px #CCC;">'
-    )
-    return playlist_table
+def get_html_report(data, tracks, images: dict = None):
+    """
+    Makes the complete report written by write_html_report as a string, for
+    sending in an email.
+        * data (Menu): [Required] The options menu holding the user's selections
+        * tracks (iterable): [Required] Tracks as returned by the spotify helpers
+        * images (dict): Sources to show in place of cover art URLs (see write_tracklist_table_html)
+    Returns the HTML report as a string
+    """
+    buffer = io.StringIO()
+    write_html_report(data, tracks, buffer, images)
+    return buffer.getvalue()
 
 
-def get_html_header(data: pd.DataFrame):
+def get_html_header(data):
 
-    genres = data['User Input'][1]
-    artists = data['User Input'][2]
-    tracks = data['User Input'][3]
+    genres = data[1]
+    artists = data[2]
+    tracks = data[3]
 
     header = """
     <style type="text/css">
@@ -107,36 +236,49 @@ def get_html_header(data: pd.DataFrame):
     </body>
     """
 
-    return header.format(artists=artists, tracks=tracks, genres=genres)
+    return header.format(artists=_escape(artists), tracks=_escape(tracks), genres=_escape(genres))
 
 
 ################
 # Main Helpers #
 ################
 
-def name_file():
+# The number name_file last appended to each name
+_last_numbers = {}
+
+
+def name_file(extension: str = '.html', folder: str = '.'):
     """
-    Returns a unique file name for the HTML ouput
+    Returns a unique file name for the output, dated today. The file is
+    created, empty, as the name is chosen, so two runs at once can never
+    pick the same name; write to it, or replace it with export.export.
 
-    :return: HTML file name
+    :param extension: file extension, e.g. '.csv.gz'
+    :param folder: folder the file goes in
+    :return: file name
     """
 
     # Obtain today's date and append the date to the file name
     save_date = time.strftime('%y%h%d', time.gmtime(time.time()))
-    file_name = './Recommendations_%s.html' % save_date
-
-    # If the first name taken, append an incrementing number until the file name is not taken
-    n = 0
-    while os.path.isfile(file_name):
-        n += 1
-        file_name = file_name[:25] + '_%d.html' % n
+    stem = os.path.join(folder, 'Recommendations_%s' % save_date)
 
-    return file_name
+    # If the first name is taken, append an incrementing number until creating the file succeeds,
+    # starting from the last number this process used so repeated calls do not probe every name again
+    n = _last_numbers.get(stem + extension, 0)
+    while True:
+        file_name = stem + ('_%d' % n if n else '') + extension
+        try:
+            os.close(os.open(file_name, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+        except FileExistsError:
+            n += 1
+            continue
+        _last_numbers[stem + extension] = n
+        return file_name
 
 
 def check_length(list_1, list_2, list_3):
     """
-    Prints a warning if the user accrues more than five parameters
+    Prints a note if the user accrues more than five parameters
 
     :param list_1: list of selected genres
     :param list_2: list of selected artists
@@ -145,8 +287,8 @@ def check_length(list_1, list_2, list_3):
     """
 
     if len(list_1) + len(list_2) + len(list_3) > 5:
-        print('\nWarning!', 'Only five genres/artists/songs may be used for recommendation.',
-              'Entering more inputs will not change the result...\n', sep='\n')
+        print('\nNote: Spotify takes five genres/artists/songs per query.',
+              'Your selections will be split into several queries and the results merged.\n', sep='\n')
 
 
 ##################
@@ -1,122 +1,209 @@
-import pandas as pd
-
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import sys
+
+from helpers import assets
+from helpers import batch
+from helpers import export
+from helpers import genres
+from helpers import history
+from helpers import metrics
+from helpers import planner
+from helpers import resolve
 from helpers import spotify
 from helpers import utilities
 from helpers import sendgrid
+from helpers import search_index
+
+
+class Menu:
+    """
+    The options menu and the user's genre, artist and track selections,
+    which are displayed next to the options they belong to
+    """
+
+    __slots__ = ('options', 'inputs')
+
+    def __init__(self, options: list):
+        self.options = list(options)
+        self.inputs = [''] * len(self.options)
+
+    def __getitem__(self, number: int):
+        return self.inputs[number - 1]
+
+    def __setitem__(self, number: int, value: str):
+        self.inputs[number - 1] = value
+
+    def __str__(self):
+        return str(self.table())
+
+    def choices(self):
+        return [str(n) for n in range(1, len(self.options) + 1)]
+
+    def table(self):
+        return utilities.Table(['User Option', 'User Input'], zip(self.options, self.inputs))
 
 
+# Most genres listed for a search
+GENRE_MATCHES = 20
+
 # Initialize the options menu
-menu = pd.DataFrame(
-    data={
-        'Selection Number': list(range(1, 6)),
-        'User Option': ['Select your favorite genres ',
-                        'Select your favorite artists',
-                        'Select your favorite tracks ',
-                        'Discover new music          ',
-                        'Quit                        '],
-        'User Input': [''] * 5
-    }
-).set_index('Selection Number')
+menu = Menu([
+    'Select your favorite genres',
+    'Select your favorite artists',
+    'Select your favorite tracks',
+    'Discover new music',
+    'Quit'
+])
 
 
-def print_menu(data: pd.DataFrame):
+def print_menu(data):
     """
-    Prints the options menu with left-justified columns
+    Prints the options menu, or any other table, with left-justified columns
 
-    :param data: options menu data frame
+    :param data: options menu or table
     :return: None
     """
-    with pd.option_context('display.colheader_justify', 'left'):
-        print(data, '\n')
+    print(data, '\n')
 
 
-def get_genre(data: pd.DataFrame, genre_list: list):
+def get_genre(data: Menu, genre_list: list):
     """
-    Allows user to select new genres and displays list of genres for selection
+    Allows user to select new genres and displays list of genres for selection.
+    Typing part of a genre instead lists the matches among every genre spotify accepts
 
-    :param data: options menu data frame
+    :param data: options menu
     :param genre_list: list of selected genres
-    :return: updated options menu data frame and selected genres list
+    :return: updated options menu and selected genres list
     """
 
-    # Retrieve abridged genres list
-    genres = spotify.get_genres_abridged()
-
-    # Create data frame for genres with 'X' on selected genre(s)
-    genre_dict = pd.DataFrame(
-        data={
-            'Selection Number': list(range(1, len(genres)+1)),
-            'Genre': genres,
-            'Selected': ['X' if n in genre_list else '' for n in genres]
-        }
-    ).set_index('Selection Number')
-
-    print_menu(genre_dict)
+    catalog = genres.get_catalog()
 
-    # Allow user to select new genres
-    # Split selection on commas and strip extraneous spaces
-    ans = input('\nPlease enter a comma-delimited list of numbers, or type "clear" to clear selected genres. ')
-    selection = [n.strip() for n in ans.split(',')]
+    # Start with the abridged genres list
+    shown = spotify.get_genres_abridged()
 
-    # If 'clear' is given, reset the options menu dataframe and genres list
-    if 'clear' in selection:
-        data.loc[1]['User Input'] = ''
-        genre_list = list()
-        print('Genres cleared!\n')
+    while True:
+        # Create table of genres with 'X' on selected genre(s)
+        genre_table = utilities.Table(
+            ['Genre', 'Selected'],
+            [(n, 'X' if n in genre_list else '') for n in shown]
+        )
+
+        print_menu(genre_table)
+
+        # Allow user to select new genres
+        # Split selection on commas and strip extraneous spaces
+        ans = input('\nPlease enter a comma-delimited list of numbers, type "clear" to clear selected genres, '
+                    'or type part of a genre to search all %d genres. ' % len(catalog))
+        selection = [n.strip() for n in ans.split(',')]
+
+        # If 'clear' is given, reset the options menu dataframe and genres list
+        if 'clear' in selection:
+            data[1] = ''
+            genre_list = list()
+            print('Genres cleared!\n')
+            return data, genre_list
 
-    else:
-        # Try to convert selection to integers and select corresponding dictionary entries
+        # Try to convert selection to integers and select corresponding entries of the list shown
         try:
             selection = list(map(int, selection))
-            selection = [genres[n - 1] for n in selection]
-
-        # Return to the menu if any one of these operations fails
-        except (ValueError, IndexError):
+            selection = [shown[n - 1] for n in selection]
+            break
+
+        # Any other text filters the full list; the matches are shown in its place
+        except ValueError:
+            matches = catalog.filter(ans, GENRE_MATCHES) if ans.strip() else []
+            if not matches:
+                print('Invalid selection!', 'Going back to menu...', '', sep='\n')
+                return data, genre_list
+            shown = matches
+
+        # Return to the menu if a number is out of range
+        except IndexError:
             print('Invalid selection!', 'Going back to menu...', '', sep='\n')
             return data, genre_list
 
-        # Update the selected genres list by taking only unique values
-        genre_list = list(set(genre_list + selection))
+    # Update the selected genres list by taking only unique values
+    genre_list = list(set(genre_list + selection))
 
-        # Update the options menu by casting the updated list as a comma-separated string
-        data.loc[1]['User Input'] = ', '.join(genre_list)
+    # Update the options menu by casting the updated list as a comma-separated string
+    data[1] = ', '.join(genre_list)
 
     return data, genre_list
 
 
+def get_more_results(table: utilities.Table, ids: list, results, row, display: int = 10):
+    """
+    Adds the next few results of a lazy search to a table and its list of IDs.
+    Only the pages holding them are fetched from spotify
+
+    :param table: table the results are shown in
+    :param ids: list of the IDs of the results in the table
+    :param results: iterator of artists or tracks, e.g. from spotify.iter_artists
+    :param row: function making a table row from a result
+    :param display: number of results to add
+    :return: number of results added
+    """
+
+    added = 0
+    for item in itertools.islice(results, display):
+        table.rows.append(list(row(item)))
+        ids.append(item['id'])
+        added += 1
+    return added
+
+
+def ask_selection(prompt: str, table: utilities.Table, more):
+    """
+    Asks for a selection, showing more results each time the user types "more"
+
+    :param prompt: question to ask
+    :param table: table of the results shown so far
+    :param more: function adding more results to the table, returning how many it added
+    :return: the user's answer
+    """
+
+    ans = input(prompt)
+    while ans.strip().lower() == 'more':
+        if more():
+            print_menu(table)
+        else:
+            print('\nNo more results.')
+        ans = input(prompt)
+    return ans
+
+
 def get_artist_list(search_term: str, display: int = 10):
     """
     Allows the user to search for artists on spotify, then prints and returns the result
 
     :param search_term: user input used to query spotify
-    :param display: number of artists to display in results (default 10)
-    :return: data frame of artist information and their corresponding IDs
+    :param display: number of artists to display at a time (default 10)
+    :return: table of artist information, their corresponding IDs, and a function showing more of them
     """
 
-    # Retrieve results from spotify given artist query
-    search_result = spotify.get_artists(search_term)
+    # Search spotify lazily, fetching further pages only if the user asks to see more
+    results = spotify.iter_artists(search_term)
+    artist_data, artist_ids = utilities.Table(['Artist', 'Genre'], []), []
 
-    # Construct data frame of artist names and their genres with query result
-    artist_data = pd.DataFrame(
-        data=search_result,
-        index=list(range(1, len(search_result) + 1)),
-        columns=['name', 'genres']
-    ).rename(columns={'name': 'Artist', 'genres': 'Genre'})
-    artist_data.index.rename('Selection Number', inplace=True)
+    def more():
+        return get_more_results(artist_data, artist_ids, results, lambda item: (item['name'], item['genres']), display)
 
-    # Create a list of artist IDs from the query result
-    artist_ids = [item['id'] for item in search_result]
+    more()
 
     # If the artist query is not empty, print the data and return the data and ID list
     if not artist_data.empty:
         print('\nWe found the following artists...\n')
-        print_menu(artist_data.head(display))
-        return artist_data, artist_ids
+        print_menu(artist_data)
+        return artist_data, artist_ids, more
 
     # Otherwise, return None
     else:
         print('\nNo artists found!')
-        return None, None
+        return None, None, None
 
 
 def get_track_list(search_term: str, criterion: str, display: int = 10):
@@ -125,52 +212,83 @@ def get_track_list(search_term: str, criterion: str, display: int = 10):
 
     :param search_term: user input used to query spotify
     :param criterion: determines whether to query by artist or track title
-    :param display: number of tracks to display in results (default 10)
-    :return: data frame of track information and their corresponding IDs
+    :param display: number of tracks to display at a time (default 10)
+    :return: table of track information, their corresponding IDs, and a function showing more of them
     """
 
-    # Query spotify by artist if such criterion is given, otherwise by track title
+    # Query spotify by artist if such criterion is given, otherwise lazily by track title
     if criterion == 'artist':
-        search_result = spotify.get_top_tracks_by_artist(search_term)
+        results = iter(spotify.get_top_tracks_by_artist(search_term))
     else:
-        search_result = spotify.get_tracks(search_term)
+        results = spotify.iter_tracks(search_term)
+    track_data, track_ids = utilities.Table(['Song Title', 'Album'], []), []
 
-    # Construct a data frame of track titles and their albums with query result
-    track_data = pd.DataFrame(
-        data={
-            'Selection Number': list(range(1, len(search_result) + 1)),
-            'Song Title': [item['name'] for item in search_result],
-            'Album': [item['album']['name'] for item in search_result]
-        }
-    ).set_index('Selection Number')
+    def more():
+        return get_more_results(track_data, track_ids, results, lambda item: (item['name'], item['album']['name']),
+                                display)
 
-    # Create a list of track IDs from the query result
-    track_ids = [item['id'] for item in search_result]
+    more()
 
     # If the track query is not empty, print the data and return the data and ID list
     if not track_data.empty:
         print('\nWe found the following tracks...\n')
-        print_menu(track_data.head(display))
-        return track_data, track_ids
+        print_menu(track_data)
+        return track_data, track_ids, more
 
     # Otherwise, return None
     else:
         print('\nNo tracks found!')
-        return None, None
+        return None, None, None
+
 
+def add_resolved(data: Menu, ids: list, names: list, kind: str, workers: int = resolve.DEFAULT_WORKERS):
+    """
+    Looks up several artist names or track titles at once and selects the best match for each
+
+    :param data: options menu
+    :param ids: list of selected artist or track IDs
+    :param names: free-text artist names or track titles
+    :param kind: 'artist' or 'track'
+    :param workers: number of searches to run at once
+    :return: updated options menu and list of IDs
+    """
+
+    found = resolve.resolve(names, kind, workers)
+    matches = [item for item in found.values() if item is not None]
+
+    # Let the user know which names could not be matched
+    missing = [name for name, item in found.items() if item is None]
+    if missing:
+        print('\nNo match found for: %s' % ', '.join(missing))
+
+    # Update the list of selected IDs with unique entries
+    ids = list(set(ids + [item['id'] for item in matches]))
+
+    # Add the matched names to the menu cell, keeping those already selected
+    column = 2 if kind == 'artist' else 3
+    selected = [n.strip() for n in data[column].split(',') if n.strip()]
+    data[column] = ', '.join(dict.fromkeys(selected + [item['name'] for item in matches]))
 
-def get_artist(data: pd.DataFrame, artists: list):
+    return data, ids
+
+
+def get_artist(data: Menu, artists: list):
     """
     Allows the user to select new artists and updates the list of selected artists
 
-    :param data: options menu data frame
+    :param data: options menu
     :param artists: list of selected artist IDs
-    :return: updated options menu data frame and selected artist list
+    :return: updated options menu and selected artist list
     """
 
     # Query the user for an artist and retrieve the results
-    search_term = input('\nEnter the name of an artist: ')
-    artist_data, artist_ids = get_artist_list(search_term)
+    search_term = input('\nEnter the name of an artist, or several separated by semicolons: ')
+
+    # Several names are looked up at once and their best matches selected directly
+    if ';' in search_term:
+        return add_resolved(data, artists, search_term.split(';'), 'artist')
+
+    artist_data, artist_ids, more = get_artist_list(search_term)
 
     # If the search yields no results, return the arguments without updating them
     if artist_data is None:
@@ -179,13 +297,13 @@ def get_artist(data: pd.DataFrame, artists: list):
 
     # Allow the user to select new artists
     # Split the selection by commas and strip extraneous spaces
-    ans = input('Select artist by entering a comma-delimited list of numbers,'
-                'or type "clear" to clear artist selections. ')
+    ans = ask_selection('Select artist by entering a comma-delimited list of numbers, type "more" to see '
+                        'more results, or type "clear" to clear artist selections. ', artist_data, more)
     selection = [n.strip() for n in ans.split(',')]
 
     # If 'clear' is given, reset the options menu cell and selected artists list
     if 'clear' in selection:
-        data.loc[2]['User Input'] = ''
+        data[2] = ''
         artists = list()
         print('Artists cleared!\n')
     else:
@@ -193,7 +311,7 @@ def get_artist(data: pd.DataFrame, artists: list):
         try:
             selection = [int(n) for n in selection]
             ids = [artist_ids[n - 1] for n in selection]
-            selection = artist_data.loc[selection]['Artist'].to_list()
+            selection = [artist_data.get(n, 'Artist') for n in selection]
 
         # Return to the menu if any of these operations fail
         except (ValueError, KeyError, IndexError):
@@ -204,16 +322,16 @@ def get_artist(data: pd.DataFrame, artists: list):
         artists = list(set(artists + ids))
 
         # Obtain selected artist names from the menu
-        selected_artists = [n.strip() for n in data.loc[2]['User Input'].split(',')]
+        selected_artists = [n.strip() for n in data[2].split(',')]
 
         # If the artist menu cell is empty, update it with only new selections
         if selected_artists == ['']:
-            data.loc[2]['User Input'] = ', '.join(selection)
+            data[2] = ', '.join(selection)
 
         # Otherwise, update it with the union of new and selected artist names
         else:
             selected_artists = set(selected_artists + selection)
-            data.loc[2]['User Input'] = ', '.join(selected_artists)
+            data[2] = ', '.join(selected_artists)
 
     return data, artists
 
@@ -223,44 +341,39 @@ def get_artist_tracks(criterion: str):
     Allows the user to search for top tracks by a given artist
 
     :param criterion: determines whether to retrieve tracks by artist or title
-    :return: data frame of matching tracks and list of their IDs
+    :return: table of matching tracks, list of their IDs, and a function showing more of them
     """
 
     # Allow the user to search for an artist and retrieve the result
     search_term = input('\nEnter the name of an artist: ')
-    artist_data, artist_ids = get_artist_list(search_term)
+    artist_data, artist_ids, more = get_artist_list(search_term)
 
     # Return None if the search does not yield any resutls
     if artist_data is None:
-        return None, None
+        return None, None, None
 
     # Try to cast selection as integer and select corresponding artist ID
     try:
-        selection = int(input('Select ONE artist to see their top tracks: ').strip())
+        selection = int(ask_selection('Select ONE artist to see their top tracks, or type "more" to see more '
+                                      'artists: ', artist_data, more).strip())
         artist_id = artist_ids[selection - 1]
 
     # Return None if any of these operations fail
     except (ValueError, IndexError):
         print('\nInvalid selection!')
-        return None, None
+        return None, None, None
 
     # Retrieve track data and IDs by querying with the artist IF
-    track_data, track_ids = get_track_list(artist_id, criterion=criterion)
-
-    # Return None if the search yields no results, otherwise return the track data and their IDs
-    if track_data is None:
-        return None, None
-    else:
-        return track_data, track_ids
+    return get_track_list(artist_id, criterion=criterion)
 
 
-def get_tracks(data: pd.DataFrame, tracks: list):
+def get_tracks(data: Menu, tracks: list):
     """
     Allows the user to select new tracks and updates the list of selected tracks
 
-    :param data: options menu data frame
+    :param data: options menu
     :param tracks: list of selected track IDs
-    :return: updated options menu data frame and list of track IDs
+    :return: updated options menu and list of track IDs
     """
 
     # Ask the user to search for tracks by artist or title
@@ -274,12 +387,14 @@ def get_tracks(data: pd.DataFrame, tracks: list):
     else:
         # Retrieve track data by artist if the user opts to do so
         if ans == 'artist':
-            track_data, track_ids = get_artist_tracks(ans)
+            track_data, track_ids, more = get_artist_tracks(ans)
 
         # Otherwise, retrieve data by querying spotify with a track title
         else:
-            search_term = input('\nEnter the name of a track: ')
-            track_data, track_ids = get_track_list(search_term, criterion=ans)
+            search_term = input('\nEnter the name of a track, or several separated by semicolons: ')
+            if ';' in search_term:
+                return add_resolved(data, tracks, search_term.split(';'), 'track')
+            track_data, track_ids, more = get_track_list(search_term, criterion=ans)
 
     # Return to menu is the resulting track data is None
     if track_data is None:
@@ -287,13 +402,13 @@ def get_tracks(data: pd.DataFrame, tracks: list):
         return data, tracks
 
     # Allow the user to select one of the given tracks
-    ans = input('Select tracks by entering a comma-delimited list of numbers,'
-                'or type "clear" to clear track selections. ')
+    ans = ask_selection('Select tracks by entering a comma-delimited list of numbers, type "more" to see '
+                        'more results, or type "clear" to clear track selections. ', track_data, more)
     selection = [n.strip() for n in ans.split(',')]
 
     # If 'clear' is given, reset the options menu and list of selected track IDs
     if 'clear' in selection:
-        data.loc[3]['User Input'] = ''
+        data[3] = ''
         tracks = list()
         print('Tracks cleared!\n')
     else:
@@ -301,7 +416,7 @@ def get_tracks(data: pd.DataFrame, tracks: list):
         try:
             selection = list(map(int, selection))
             ids = [track_ids[n - 1] for n in selection]
-            selection = track_data.loc[selection]['Song Title'].to_list()
+            selection = [track_data.get(n, 'Song Title') for n in selection]
 
         # If any of these operations fail, return to the menu
         except (ValueError, KeyError, IndexError):
@@ -312,31 +427,29 @@ def get_tracks(data: pd.DataFrame, tracks: list):
         tracks = list(set(tracks + ids))
 
         # Obtain the names of previously selected tracks from the menu
-        selected_tracks = [n.strip() for n in data.loc[3]['User Input'].split(',')]
+        selected_tracks = [n.strip() for n in data[3].split(',')]
 
         # If the selected tracks cell is empty, update it with only new selections
         if selected_tracks == ['']:
-            data.loc[3]['User Input'] = ', '.join(selection)
+            data[3] = ', '.join(selection)
 
         # Otherwise, update the cell with the unique titles of new and selected tracks
         else:
             selected_tracks = set(selected_tracks + selection)
-            data.loc[3]['User Input'] = ', '.join(selected_tracks)
+            data[3] = ', '.join(selected_tracks)
 
     return data, tracks
 
 
-def get_similar_tracks(data: pd.DataFrame, artist_ids: list, track_ids: list, genres: list, max_size: int = 5):
+def limit_seeds(artist_ids: list, track_ids: list, genres: list, max_size: int = 5):
     """
-    Queries spotify to obtain similar tracks given the selected genres, artists and tracks,
-    then writes these recommendations to a file or emails it to/from the user
+    Chooses at most max_size seeds, preferring artists, then tracks, then genres
 
-    :param data: options menu data frame
     :param artist_ids: list of selected artist IDs
     :param track_ids: list of selected track IDs
     :param genres: list of selected genres
     :param max_size: maximum number of seed parameters
-    :return: None
+    :return: the chosen artist IDs, track IDs and genres
     """
 
     # Initialize list of maximum seeds
@@ -351,53 +464,118 @@ def get_similar_tracks(data: pd.DataFrame, artist_ids: list, track_ids: list, ge
             positions[i] -= n
             n += len(lst)
 
-    # Retrieve similar tracks from seed parameters given
-    track_data = spotify.get_similar_tracks(
-        artist_ids[:positions[0]],
-        track_ids[:positions[1]],
-        genres[:positions[2]]
+    return artist_ids[:positions[0]], track_ids[:positions[1]], genres[:positions[2]]
+
+
+def get_recommendation_table(track_data: list):
+    """
+    Builds a table of the track title, artist, and album of each recommendation
+
+    :param track_data: list of recommended tracks
+    :return: table of recommendations
+    """
+
+    return utilities.Table(
+        ['Song Title', 'Artist', 'Album Name'],
+        [(item['name'], item.get('artist', {}).get('name'), item.get('album', {}).get('name'))
+         for item in track_data],
+        index_name=''
     )
 
-    # Cast data to a flattened data frame
-    track_table = utilities.get_dataframe(track_data)
 
-    # Select track title, artist, and album from data frame and rename these columns
-    keys = ['name', 'artist_name', 'album_name']
-    new_keys = ['Song Title', 'Artist', 'Album Name']
-    display_table = track_table[keys].rename(columns=dict(zip(keys, new_keys)))
-    display_table.index.rename('', inplace=True)
-    print_menu(display_table)
+def get_seeded_tracks(artist_ids: list, track_ids: list, genres: list, max_size: int = None):
+    """
+    Gets recommendations for every seed, splitting more than five into several
+    queries whose results are merged, or for only the first max_size seeds
 
-    # Gather HTML content and file name, then prompt the user to write the output to file
+    :param artist_ids: list of selected artist IDs
+    :param track_ids: list of selected track IDs
+    :param genres: list of selected genres
+    :param max_size: maximum number of seed parameters, or None for all of them
+    :return: list of recommended tracks
+    """
+
+    if max_size:
+        artist_ids, track_ids, genres = limit_seeds(artist_ids, track_ids, genres, max_size)
+    return planner.get_similar_tracks(artist_ids, track_ids, genres)
+
+
+def get_similar_tracks(data: Menu, artist_ids: list, track_ids: list, genres: list, max_size: int = None):
+    """
+    Queries spotify to obtain similar tracks given the selected genres, artists and tracks,
+    then writes these recommendations to a file or emails it to/from the user
+
+    :param data: options menu
+    :param artist_ids: list of selected artist IDs
+    :param track_ids: list of selected track IDs
+    :param genres: list of selected genres
+    :param max_size: maximum number of seed parameters, or None for all of them
+    :return: None
+    """
+
+    # Retrieve similar tracks from seed parameters given
+    track_data = get_seeded_tracks(artist_ids, track_ids, genres, max_size)
+
+    # Display the track title, artist, and album of each recommendation
+    print_menu(get_recommendation_table(track_data))
+
+    # Prompt the user to write the output to file
     ans = input('Would you like to write these recommendations to a file?[y/n] ')
-    file_name = utilities.name_file()
+    file_name = ''
 
-    # Append the HTML data frame to a header constructed from seed parameters
-    html_content = utilities.get_html_header(data) + '\n' + \
-        utilities.get_formatted_tracklist_table_html(track_table)
+    # Append the HTML table to a header constructed from seed parameters
+    html_content = utilities.get_html_report(data, track_data)
 
     if ans.lower() == 'yes' or ans.lower() == 'y':
+        # Naming the file creates it, so only name one when writing
+        file_name = utilities.name_file()
         with open(file_name, mode='w') as f:
-            f.write(html_content)
-            f.close()
+            utilities.write_html_report(data, track_data, f)
             print('Written to file: %s\n' % file_name[2:])
 
     # Send the HTML content by email and attach HTML file if one was created
     sendgrid.email(html_content, file_name)
 
 
-def music_finder(data: pd.DataFrame):
+def open_search_indexes():
+    """
+    Serves artist and track searches from the local indexes of everything
+    seen in earlier sessions, calling spotify only when they fall short
+
+    :return: None
+    """
+
+    for kind in ('artist', 'track'):
+        spotify.set_search_index(kind, search_index.SearchIndex(search_index.default_path(kind)))
+
+
+def save_search_indexes():
+    """
+    Writes the artists and tracks found this session to the local indexes
+
+    :return: None
+    """
+
+    for kind in ('artist', 'track'):
+        index = spotify.get_search_index(kind)
+        if index is not None and index.unsaved:
+            index.save()
+
+
+def music_finder(data: Menu, artists: list = None, tracks: list = None):
     """
     Handles user queries and runs music selection program
 
-    :param data: an empty user options data frame
+    :param data: a user options menu
+    :param artists: list of artist IDs already selected, if any
+    :param tracks: list of track IDs already selected, if any
     :return: None
     """
 
-    # Initialize empty lists of genres, artist IDs and track IDs
+    # Initialize lists of genres, artist IDs and track IDs
     genres = list()
-    artists = list()
-    tracks = list()
+    artists = list(artists or [])
+    tracks = list(tracks or [])
 
     # Construct infinite loop
     while True:
@@ -408,7 +586,7 @@ def music_finder(data: pd.DataFrame):
 
         # Query the user to select an option and ask again if the selection is invalid
         query = input('What would you like to do? ')
-        while query not in list(map(str, data.index.values)):
+        while query not in data.choices():
             print('Invalid Choice!\n')
             query = input('What would you like to do?')
 
@@ -433,8 +611,436 @@ def music_finder(data: pd.DataFrame):
 
         elif int(query) == 5:
             print('\nQuitting...')
+            save_search_indexes()
             exit(0)
 
 
+# Exit codes for scripts: success, some recommendations failed, bad arguments
+# or seeds, and spotify unavailable (rate limited, failing or unreachable)
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_UNAVAILABLE = 3
+
+# Output formats of the recommend command, and the file extensions that imply them;
+# the formats export writes imply themselves (see export.guess_format)
+FORMATS = ('text', 'json', 'html') + export.FORMATS
+EXTENSIONS = {'.json': 'json', '.html': 'html', '.htm': 'html'}
+
+# Seconds the digest command waits for its email to go out before leaving it queued
+DIGEST_SEND_TIMEOUT = 60
+
+
+def get_exit_code(e: Exception):
+    """
+    Chooses the exit code reported for an error
+
+    :param e: the error that stopped the command
+    :return: exit code
+    """
+
+    if isinstance(e, (spotify.InvalidSeedsError, ValueError)):
+        return EXIT_USAGE
+    if isinstance(e, (spotify.RateLimitedError, spotify.UpstreamError, spotify.CircuitOpenError)):
+        return EXIT_UNAVAILABLE
+    return EXIT_FAILED
+
+
+def resolve_seeds(ids: list, names: list, kind: str, workers: int):
+    """
+    Combines seeds given by ID with the best matches for seeds given by name
+
+    :param ids: artist or track IDs
+    :param names: free-text artist names or track titles
+    :param kind: 'artist' or 'track'
+    :param workers: number of names to look up at once
+    :return: list of IDs and list of names to display for them
+    """
+
+    found = resolve.resolve(names, kind, workers) if names else {}
+    missing = [name for name, item in found.items() if item is None]
+    if missing:
+        raise ValueError('No %s found for: %s' % (kind, ', '.join(missing)))
+    matches = list({item['id']: item for item in found.values()}.values())
+    return list(ids) + [item['id'] for item in matches], get_names(ids, kind) + [item['name'] for item in matches]
+
+
+def get_names(ids: list, kind: str):
+    """
+    Looks up the names of artists or tracks given by ID, all in one request
+
+    :param ids: artist or track IDs
+    :param kind: 'artist' or 'track'
+    :return: list of names, or of the IDs themselves for any spotify does not know
+    """
+
+    if not ids:
+        return []
+    lookup = spotify.get_artists_by_ids if kind == 'artist' else spotify.get_tracks_by_ids
+    return [item['name'] if item else item_id for item_id, item in zip(ids, lookup(list(ids)))]
+
+
+def write_recommendations(data: Menu, track_data: list, out, output_format: str, images: dict = None, **options):
+    """
+    Writes recommendations to a stream in the chosen format
+
+    :param data: options menu holding the seeds, for the HTML header
+    :param track_data: list of recommended tracks
+    :param out: writable text stream
+    :param output_format: one of FORMATS; parquet and feather need a file (see export.export)
+    :param images: sources to show in place of cover art URLs in HTML, e.g. data: URIs
+    :param options: passed to export.write, e.g. link='share_url' for m3u
+    :return: None
+    """
+
+    if output_format in export.FORMATS:
+        export.write(track_data, out, output_format, **options)
+        return
+    if output_format == 'html':
+        utilities.write_html_report(data, track_data, out, images)
+    elif output_format == 'json':
+        json.dump(track_data, out, indent=2)
+    else:
+        out.write(str(get_recommendation_table(track_data)))
+    out.write('\n')
+
+
+def get_output_format(file_name: str):
+    """
+    Chooses the output format a file name implies, e.g. csv for 'tracks.csv.gz'
+
+    :param file_name: file name, or None for standard output
+    :return: one of FORMATS
+    """
+
+    implied = EXTENSIONS.get(os.path.splitext(file_name or '')[1].lower())
+    return implied or export.guess_format(file_name or '')[0] or 'text'
+
+
+def stream_recommendations(lines, out):
+    """
+    Reads newline-delimited JSON seed sets and writes one JSON line of
+    results per set as soon as it is ready
+
+    :param lines: iterable of JSON lines with any of artist_ids, track_ids and genres
+    :param out: writable text stream
+    :return: exit code
+    """
+
+    failed = 0
+    for seed_id, seeds in batch.parse_seed_sets(lines):
+        result = batch.recommend(seed_id, seeds)
+        failed += 'error' in result
+        out.write(json.dumps(result) + '\n')
+        out.flush()
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def recommend(args):
+    """
+    Runs the recommend command: gets recommendations for the seeds on the
+    command line, or for each seed set read from standard input, without prompting
+
+    :param args: parsed command-line arguments
+    :return: exit code
+    """
+
+    output_format = args.format or get_output_format(args.out)
+    to_file = args.out not in (None, '-')
+    options = {'link': args.links + '_url'} if output_format == 'm3u' else {}
+    images = None
+    if not to_file and not args.stdin and output_format not in ('text', 'json', 'html') + export.TEXT_FORMATS:
+        raise ValueError('%s output must go to a file; name one with --out' % output_format)
+
+    if args.stdin:
+        out = open(args.out, 'w') if to_file else sys.stdout
+        try:
+            return stream_recommendations(sys.stdin, out)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+    artist_ids, artist_names = resolve_seeds(args.artist_id, args.artist, 'artist', args.workers)
+    track_ids, track_names = resolve_seeds(args.track_id, args.track, 'track', args.workers)
+    track_data = get_seeded_tracks(artist_ids, track_ids, args.genre, args.max_seeds)
+
+    # Fill in a menu with the seeds, as the HTML header expects
+    data = Menu(menu.options)
+    data[1], data[2], data[3] = ', '.join(args.genre), ', '.join(artist_names), ', '.join(track_names)
+
+    if args.offline:
+        # Embed the cover art in HTML, and point playlists at the downloaded previews
+        cache = assets.get_cache()
+        if output_format == 'm3u' and args.links == 'preview':
+            options['files'] = cache.prefetch(assets.get_urls(track_data, ('preview',)))
+        if output_format == 'html' or args.email or args.prompt:
+            images = cache.data_uris(assets.get_urls(track_data, ('art',)))
+
+    if not to_file:
+        write_recommendations(data, track_data, sys.stdout, output_format, images=images, **options)
+    elif output_format in export.FORMATS:
+        # Written under a temporary name and renamed when done, optionally compressed
+        export.export(track_data, args.out, output_format, args.compression, **options)
+    else:
+        with open(args.out, 'w') as out:
+            write_recommendations(data, track_data, out, output_format, images=images)
+
+    if args.email or args.prompt:
+        # Keep standard output for the results
+        with contextlib.redirect_stdout(sys.stderr):
+            attachment = args.out if output_format == 'html' and to_file else ''
+            receivers = args.email.split(',') if args.email else None
+            sendgrid.email(utilities.get_html_report(data, track_data, images), attachment,
+                           sender=args.sender, receivers=receivers, prompt=args.prompt)
+    return EXIT_OK
+
+
+def digest(args):
+    """
+    Runs the digest command: saves or updates a recurring digest, then
+    reports only the recommendations its recipient has not been sent yet
+
+    :param args: parsed command-line arguments
+    :return: exit code
+    """
+
+    store = history.History(args.history)
+    try:
+        saved = store.get_digest(args.name)
+        if args.artist or args.artist_id or args.track or args.track_id or args.genre or args.recipient:
+            recipient = args.recipient or (saved and saved['recipient'])
+            if not recipient:
+                raise ValueError('A new digest needs --recipient')
+            artist_ids, artist_names = resolve_seeds(args.artist_id, args.artist, 'artist', args.workers)
+            track_ids, track_names = resolve_seeds(args.track_id, args.track, 'track', args.workers)
+            if saved and not (artist_ids or track_ids or args.genre):
+                # Only the recipient changed; keep the seeds
+                seeds = saved['seeds']
+                artist_ids, track_ids, genres = seeds['artist_ids'], seeds['track_ids'], seeds['genres']
+                labels = seeds.get('labels', {})
+            else:
+                genres, labels = args.genre, {'artists': artist_names, 'tracks': track_names}
+            store.save_digest(args.name, recipient, artist_ids, track_ids, genres, labels)
+        elif saved is None:
+            raise ValueError('No digest named %r; give its seeds and --recipient to create it' % args.name)
+
+        seeds = store.get_digest(args.name)['seeds']
+        new_tracks, skipped = store.refresh(
+            args.name, lambda *seed_lists: get_seeded_tracks(*seed_lists, args.max_seeds))
+        print('%d new tracks (%d already sent)' % (len(new_tracks), skipped), file=sys.stderr)
+        if not new_tracks:
+            return EXIT_OK
+
+        # Fill in a menu with the seeds, as the HTML header expects
+        labels = seeds.get('labels', {})
+        data = Menu(menu.options)
+        data[1] = ', '.join(seeds['genres'])
+        data[2] = ', '.join(labels.get('artists') or get_names(seeds['artist_ids'], 'artist'))
+        data[3] = ', '.join(labels.get('tracks') or get_names(seeds['track_ids'], 'track'))
+        if args.out:
+            with open(args.out, 'w') as f:
+                utilities.write_html_report(data, new_tracks, f)
+        else:
+            write_recommendations(data, new_tracks, sys.stdout, 'text')
+
+        # Tracks are left out of later digests only once the recipient has them
+        if args.sender:
+            with contextlib.redirect_stdout(sys.stderr):
+                message_id = sendgrid.email(utilities.get_html_report(data, new_tracks), args.out or '',
+                                            sender=args.sender, receivers=[store.get_digest(args.name)['recipient']],
+                                            prompt=False)
+            status = sendgrid.get_queue().wait(message_id, DIGEST_SEND_TIMEOUT)
+            if status != 'sent':
+                print('The email was not sent (%s); its tracks will be in the next digest too' % status,
+                      file=sys.stderr)
+                return EXIT_FAILED if status == 'failed' else EXIT_OK
+        elif not args.mark:
+            print('Nothing was sent; use --sender to email the digest, or --mark once it has been delivered',
+                  file=sys.stderr)
+            return EXIT_OK
+        store.mark_delivered(args.name, new_tracks)
+    finally:
+        store.close()
+    return EXIT_OK
+
+
+def list_genres(args):
+    """
+    Runs the genres command: prints every genre spotify accepts as a seed,
+    or those matching the text given, best match first
+
+    :param args: parsed command-line arguments
+    :return: exit code
+    """
+
+    catalog = genres.get_catalog()
+    if args.refresh:
+        catalog.refresh()
+    for genre in catalog.filter(' '.join(args.text)):
+        print(genre)
+    return EXIT_OK
+
+
+def send_mail(args):
+    """
+    Runs the mail command: sends the emails earlier runs left queued and
+    waits for them
+
+    :param args: parsed command-line arguments
+    :return: exit code
+    """
+
+    counts = sendgrid.send_queued(args.timeout)
+    unsent = counts.get('queued', 0) + counts.get('sending', 0)
+    print('%d emails still queued' % unsent if unsent else 'No emails are queued', file=sys.stderr)
+    return EXIT_FAILED if unsent else EXIT_OK
+
+
+def menu_command(args):
+    """
+    Runs the interactive menu, with any artists and tracks named on the command line already selected
+
+    :param args: parsed command-line arguments
+    :return: exit code
+    """
+
+    open_search_indexes()
+    # Emails left queued when the menu last closed go out while this one is open
+    sendgrid.send_queued(0)
+    data, artists, tracks = menu, list(), list()
+    if args.artists:
+        data, artists = add_resolved(data, artists, args.artists, 'artist', args.workers)
+    if args.tracks:
+        data, tracks = add_resolved(data, tracks, args.tracks, 'track', args.workers)
+    music_finder(data, artists, tracks)
+    return EXIT_OK
+
+
+def get_parser():
+    """
+    Builds the command-line parser
+
+    :return: argument parser
+    """
+
+    parser = argparse.ArgumentParser(
+        description='Discover new music from your favorite genres, artists and tracks. '
+                    'Without a command, opens the interactive menu.')
+    parser.add_argument('--artists', nargs='+', default=[], metavar='NAME',
+                        help='artist names to select before the menu opens')
+    parser.add_argument('--tracks', nargs='+', default=[], metavar='TITLE',
+                        help='track titles to select before the menu opens')
+    parser.add_argument('--workers', type=int, default=resolve.DEFAULT_WORKERS,
+                        help='number of names to look up at once')
+    parser.add_argument('--timings', action='store_true',
+                        help='print where the time went (API calls, token fetches, rendering) when done')
+    parser.set_defaults(run=menu_command)
+
+    commands = parser.add_subparsers(title='commands')
+    command = commands.add_parser(
+        'recommend', help='print or save recommendations without prompting',
+        description='Gets recommendations for the seeds given, or for each JSON seed set read from '
+                    'standard input. Exits with %d on success, %d if any recommendation failed, %d for '
+                    'bad arguments or seeds and %d if spotify is unavailable.'
+                    % (EXIT_OK, EXIT_FAILED, EXIT_USAGE, EXIT_UNAVAILABLE))
+    command.add_argument('--artist', action='append', default=[], metavar='NAME', help='artist name (repeatable)')
+    command.add_argument('--artist-id', action='append', default=[], metavar='ID', help='spotify artist ID')
+    command.add_argument('--track', action='append', default=[], metavar='TITLE', help='track title (repeatable)')
+    command.add_argument('--track-id', action='append', default=[], metavar='ID', help='spotify track ID')
+    command.add_argument('--genre', action='append', default=[], help='genre seed (repeatable)')
+    command.add_argument('--max-seeds', type=int, metavar='N',
+                         help='use only the first N seeds (default: all, five per query with results merged)')
+    command.add_argument('--stdin', action='store_true',
+                         help='read seed sets from standard input, one JSON object per line, '
+                              'and write one JSON line of results per set')
+    command.add_argument('--out', metavar='FILE', help='write the results here instead of standard output')
+    command.add_argument('--format', choices=FORMATS, help='output format (default: from --out, else text)')
+    command.add_argument('--compression', metavar='CODEC',
+                         help='gzip, bz2 or xz for jsonl, csv and m3u (default: from --out, e.g. .csv.gz); '
+                              'a pyarrow codec for parquet and feather')
+    command.add_argument('--links', choices=('preview', 'share'), default='preview',
+                         help='what an m3u playlist links to: 30 second previews or spotify pages')
+    command.add_argument('--offline', action='store_true',
+                         help='download cover art and previews (kept in %s) so HTML reports and emails '
+                              'embed the art and m3u playlists link to the local previews' % assets.DEFAULT_DIR)
+    command.add_argument('--email', metavar='ADDRESSES', help='comma-separated recipients of the HTML report')
+    command.add_argument('--sender', metavar='ADDRESS', help='sender of the email')
+    command.add_argument('--prompt', action='store_true', help='ask before emailing, and for any missing addresses')
+    command.add_argument('--workers', type=int, default=resolve.DEFAULT_WORKERS,
+                         help='number of names to look up at once')
+    command.set_defaults(run=recommend)
+
+    command = commands.add_parser(
+        'digest', help='send a recurring digest of recommendations not sent before',
+        description='Creates or updates the named digest when seeds or --recipient are given, then gets '
+                    'its recommendations, leaves out every track its recipient has already been sent and '
+                    'reports the rest. Run it again later for the next digest.')
+    command.add_argument('name', help='name of the digest')
+    command.add_argument('--recipient', metavar='ADDRESS', help='who the digest is for')
+    command.add_argument('--artist', action='append', default=[], metavar='NAME', help='artist name (repeatable)')
+    command.add_argument('--artist-id', action='append', default=[], metavar='ID', help='spotify artist ID')
+    command.add_argument('--track', action='append', default=[], metavar='TITLE', help='track title (repeatable)')
+    command.add_argument('--track-id', action='append', default=[], metavar='ID', help='spotify track ID')
+    command.add_argument('--genre', action='append', default=[], help='genre seed (repeatable)')
+    command.add_argument('--max-seeds', type=int, metavar='N',
+                         help='use only the first N seeds (default: all, five per query with results merged)')
+    command.add_argument('--out', metavar='FILE',
+                         help='write the HTML report here instead of a table on standard output')
+    command.add_argument('--sender', metavar='ADDRESS',
+                         help='email the new tracks to the recipient from this address, and once sent, '
+                              'leave them out of later digests')
+    command.add_argument('--mark', action='store_true',
+                         help='without --sender, record the new tracks as delivered, e.g. after passing on --out')
+    command.add_argument('--history', default=history.DEFAULT_DIR, metavar='DIR', help=argparse.SUPPRESS)
+    command.add_argument('--workers', type=int, default=resolve.DEFAULT_WORKERS,
+                         help='number of names to look up at once')
+    command.set_defaults(run=digest)
+
+    command = commands.add_parser(
+        'genres', help='list the genres spotify accepts as seeds',
+        description='Prints every genre seed, or those matching TEXT by prefix, substring or spelling. '
+                    'The list is fetched once and kept for a week.')
+    command.add_argument('text', nargs='*', help='part of a genre to look for')
+    command.add_argument('--refresh', action='store_true', help='fetch the list again now')
+    command.set_defaults(run=list_genres)
+
+    command = commands.add_parser(
+        'mail', help='send the emails earlier runs left queued',
+        description='Sends the emails still queued when earlier runs finished, and waits for them. '
+                    'Exits with %d if some are still queued when it gives up.' % EXIT_FAILED)
+    command.add_argument('--timeout', type=float, default=60, metavar='SECONDS',
+                         help='how long to wait for the emails to go out')
+    command.set_defaults(run=send_mail)
+    return parser
+
+
+def main(argv: list = None):
+    """
+    Parses the command line and runs the chosen command
+
+    :param argv: command-line arguments (default sys.argv)
+    :return: exit code
+    """
+
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, 'stdin', False) and (args.artist or args.artist_id or args.track or args.track_id or args.genre):
+        parser.error('seeds are read from standard input with --stdin; do not also give them as arguments')
+
+    if args.timings:
+        metrics.enable()
+    spotify.set_genre_catalog(genres.get_catalog())
+    try:
+        return args.run(args)
+    except KeyboardInterrupt:
+        return 130
+    except (spotify.SpotifyError, ValueError, OSError, ImportError) as e:
+        print('Error: %s' % str(e).split('\n')[0], file=sys.stderr)
+        return get_exit_code(e)
+    finally:
+        if args.timings:
+            metrics.write_timings(sys.stderr)
+
+
 if __name__ == '__main__':
-    music_finder(menu)
+    sys.exit(main())
@@ -0,0 +1,69 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import StubServer  # noqa: E402
+from helpers import authentication  # noqa: E402
+from helpers import ratelimit  # noqa: E402
+from helpers import retry  # noqa: E402
+from helpers import spotify  # noqa: E402
+
+
+@pytest.fixture
+def helpers_state(monkeypatch):
+    """
+    Gives each test its own token cache, rate limit, retry policy and
+    circuit breaker, with no response cache, restoring the originals after.
+    """
+    monkeypatch.setattr(authentication, '_manager', authentication.TokenManager())
+    monkeypatch.setattr(spotify, '_limiter', ratelimit.TokenBucket(100000))
+    monkeypatch.setattr(spotify, '_retry_policy', retry.RetryPolicy(base=0.01, cap=0.05))
+    monkeypatch.setattr(spotify, '_breaker', retry.CircuitBreaker())
+    monkeypatch.setattr(spotify, '_cache', None)
+    monkeypatch.setattr(spotify, '_cache_configured', True)
+    monkeypatch.setattr(spotify, '_genre_catalog', None)
+    monkeypatch.setattr(spotify, '_search_indexes', {})
+
+
+@pytest.fixture
+def make_stub(helpers_state, monkeypatch):
+    """
+    Starts a stub server, of StubServer or a subclass, and points the
+    spotify helpers at it for the test.
+    """
+    servers = []
+
+    def make(server_class=StubServer, **options):
+        server = server_class(**options).start()
+        monkeypatch.setattr(spotify, 'SPOTIFY_API', server.base_url + '/v1')
+        monkeypatch.setattr(spotify, 'SPOTIFY_KEY_URL', server.base_url + '/spotify/key')
+        servers.append(server)
+        return server
+
+    yield make
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def stub(make_stub):
+    """
+    A StubServer the spotify helpers are pointed at for the test.
+    """
+    return make_stub()
+
+
+@pytest.fixture
+def switch_often():
+    """
+    Makes the interpreter switch threads very often for the test, so races
+    between threads show up reliably.
+    """
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
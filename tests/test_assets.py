@@ -0,0 +1,105 @@
+import base64
+import time
+
+import pytest
+
+from benchmarks.stub_server import fake_track
+from helpers import assets
+from helpers import spotify
+
+
+@pytest.fixture
+def make_cache(tmp_path):
+    caches = []
+
+    def make(**options):
+        caches.append(assets.AssetCache(str(tmp_path / 'assets'), **options))
+        return caches[-1]
+
+    yield make
+    for asset_cache in caches:
+        asset_cache.close()
+
+
+def image(server, name: str):
+    return server.base_url + '/image/' + name
+
+
+def test_downloads_are_kept_and_reused(stub, make_cache):
+    asset_cache = make_cache()
+    url = image(stub, 'cover1')
+    assert asset_cache.get(url) is None
+    blob = asset_cache.fetch(url)
+    with open(blob, 'rb') as f:
+        assert f.read() == stub.asset('/image/cover1')
+    assert asset_cache.fetch(url) == asset_cache.get(url) == blob
+    assert stub.hits['/image/cover1'] == 1
+    assert (asset_cache.downloaded, asset_cache.hits) == (1, 1)
+
+
+def test_identical_content_is_stored_once(stub, make_cache):
+    asset_cache = make_cache()
+    first = asset_cache.fetch(image(stub, 'cover1?size=1'))
+    second = asset_cache.fetch(image(stub, 'cover1?size=2'))
+    assert first == second
+    assert asset_cache.stats()['urls'] == 2 and asset_cache.stats()['blobs'] == 1
+
+
+def test_old_downloads_are_revalidated(stub, make_cache):
+    asset_cache = make_cache(max_age=0)
+    url = image(stub, 'cover1')
+    blob = asset_cache.fetch(url)
+    assert asset_cache.fetch(url) == blob
+    assert stub.hits['/image/cover1'] == 2
+    assert (asset_cache.downloaded, asset_cache.revalidated) == (1, 1)
+
+
+def test_failed_downloads_return_none(make_stub, make_cache):
+    server = make_stub(error_rate=1, error_status=404)
+    asset_cache = make_cache()
+    assert asset_cache.fetch(image(server, 'missing')) is None
+    assert asset_cache.failed == 1 and asset_cache.stats()['urls'] == 0
+
+
+def test_least_recently_used_blobs_are_evicted(stub, make_cache):
+    asset_cache = make_cache(max_bytes=int(stub.asset_size * 2.5))
+    urls = [image(stub, 'cover%d' % n) for n in range(3)]
+    asset_cache.fetch(urls[0])
+    asset_cache.fetch(urls[1])
+    time.sleep(0.01)
+    asset_cache.fetch(urls[0])
+    asset_cache.fetch(urls[2])
+    assert asset_cache.get(urls[1]) is None
+    assert asset_cache.get(urls[0]) and asset_cache.get(urls[2])
+    assert asset_cache.stats()['bytes'] == 2 * stub.asset_size
+
+
+def test_index_survives_reopening(stub, make_cache):
+    url = image(stub, 'cover1')
+    blob = make_cache().fetch(url)
+    assert make_cache().get(url) == blob
+
+
+def test_prefetch_fetches_each_url_once(stub, make_cache):
+    asset_cache = make_cache(workers=4)
+    urls = [image(stub, 'cover%d' % (n % 10)) for n in range(40)] + [None, '']
+    found = asset_cache.prefetch(urls)
+    assert len(found) == 10 and all(found.values())
+    assert sum(n for path, n in stub.hits.items() if path.startswith('/image/')) == 10
+
+
+def test_data_uris_embed_the_content(stub, make_cache):
+    asset_cache = make_cache()
+    url = image(stub, 'cover1')
+    uris = asset_cache.data_uris([url, stub.base_url + '/nowhere.jpg'])
+    assert list(uris) == [url]
+    prefix = 'data:image/jpeg;base64,'
+    assert uris[url].startswith(prefix)
+    assert base64.b64decode(uris[url][len(prefix):]) == stub.asset('/image/cover1')
+
+
+def test_get_urls_lists_art_and_previews_once():
+    tracks = spotify._simplify_tracks([fake_track(n) for n in range(12)])
+    art = assets.get_urls(tracks, ('art',))
+    assert art == ['https://i.scdn.co/image/small000000', 'https://i.scdn.co/image/small000001']
+    assert len(assets.get_urls(tracks)) == 14
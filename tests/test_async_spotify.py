@@ -0,0 +1,89 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from benchmarks.stub_server import StubServer
+from helpers import async_spotify
+from helpers import spotify
+
+
+class ConcurrencyStub(StubServer):
+    # Keeps the most API calls it was answering at once
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.active = 0
+        self.peak = 0
+        self._active_lock = threading.Lock()
+
+    def delay(self):
+        with self._active_lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.latency)
+        with self._active_lock:
+            self.active -= 1
+        return 0
+
+
+def run(coroutine_function, **options):
+    async def with_client():
+        async with async_spotify.AsyncSpotify(**options) as client:
+            return await coroutine_function(client)
+
+    return asyncio.run(with_client())
+
+
+def test_results_match_the_blocking_client(stub):
+    async def calls(client):
+        return (await client.get_tracks('glass'), await client.get_artists('glass'),
+                await client.get_top_tracks_by_artist('artist000001'),
+                await client.get_similar_tracks(['artist000001'], [], ['indie']))
+
+    assert run(calls) == (
+        spotify.get_tracks('glass'), spotify.get_artists('glass'),
+        spotify.get_top_tracks_by_artist('artist000001'),
+        spotify.get_similar_tracks(['artist000001'], [], ['indie']))
+
+
+def test_unsimplified_results_are_raw_responses(stub):
+    data = run(lambda client: client.get_artists('glass', simplify=False))
+    assert data['artists']['items'][0]['id'] == 'artist000000'
+
+
+def test_failures_raise_the_blocking_exceptions(make_stub):
+    make_stub(error_rate=1, error_status=404)
+    with pytest.raises(spotify.RequestError):
+        run(lambda client: client.get_tracks('glass'))
+
+
+def test_invalid_seeds_are_rejected_before_any_request(stub):
+    with pytest.raises(spotify.InvalidSeedsError):
+        run(lambda client: client.get_similar_tracks([], [], []))
+    assert not any(path.startswith('/v1/') for path in stub.hits)
+
+
+def test_requests_in_flight_are_bounded_by_concurrency(make_stub):
+    server = make_stub(ConcurrencyStub, latency=0.1)
+
+    async def many(client):
+        return await asyncio.gather(*(client.get_tracks('track %d' % n) for n in range(12)))
+
+    assert all(run(many, concurrency=4))
+    assert server.peak == 4
+
+
+def test_shortcuts_share_a_client_per_event_loop(stub, monkeypatch):
+    monkeypatch.setattr(async_spotify, '_client', None)
+    monkeypatch.setattr(async_spotify, '_client_loop', None)
+
+    async def twice():
+        await async_spotify.get_tracks('glass')
+        first = async_spotify._client
+        await async_spotify.get_artists('glass')
+        return first is async_spotify._client
+
+    assert asyncio.run(twice())
+    assert stub.hits['/v1/search'] == 2
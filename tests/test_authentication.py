@@ -0,0 +1,73 @@
+import concurrent.futures
+import time
+
+from helpers import authentication
+from helpers import spotify
+
+KEY_URL = 'https://apitutor.test/spotify/key'
+
+
+def test_token_is_fetched_once_for_many_calls(stub):
+    for _ in range(200):
+        authentication.get_token(spotify.SPOTIFY_KEY_URL)
+    assert stub.hits['/spotify/key'] == 1
+
+
+def test_concurrent_callers_share_one_fetch(stub):
+    stub.latency = 0.05
+    with concurrent.futures.ThreadPoolExecutor(32) as pool:
+        tokens = set(pool.map(lambda _: authentication.get_token(spotify.SPOTIFY_KEY_URL), range(64)))
+    assert tokens == {'stub-token'}
+    assert stub.hits['/spotify/key'] == 1
+
+
+def test_requests_reuse_the_token(stub):
+    for n in range(20):
+        spotify.get_artists('artist %d' % n)
+    assert stub.hits['/spotify/key'] == 1
+    assert stub.hits['/v1/search'] == 20
+
+
+def test_short_lived_token_is_not_refreshed_on_every_call(monkeypatch):
+    calls = []
+
+    def request_token(url):
+        calls.append(url)
+        return 'token%d' % len(calls), 300
+
+    monkeypatch.setattr(authentication, '_request_token', request_token)
+    manager = authentication.TokenManager()
+    for _ in range(100):
+        assert manager.get(KEY_URL) == 'token1'
+    time.sleep(0.05)
+    assert calls == [KEY_URL]
+
+
+def test_token_nearing_expiry_is_refreshed_in_the_background(monkeypatch):
+    calls = []
+
+    def request_token(url):
+        calls.append(url)
+        return 'token%d' % len(calls), 1
+
+    monkeypatch.setattr(authentication, '_request_token', request_token)
+    manager = authentication.TokenManager()
+    assert manager.get(KEY_URL) == 'token1'
+    time.sleep(0.8)
+    # Still valid, so handed out while its replacement is fetched
+    assert manager.get(KEY_URL) == 'token1'
+    deadline = time.monotonic() + 2
+    while manager.fetch_count < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert manager.get(KEY_URL) == 'token2'
+    assert len(calls) == 2
+
+
+def test_invalidated_token_is_fetched_again(monkeypatch):
+    calls = []
+    monkeypatch.setattr(authentication, '_request_token', lambda url: (calls.append(url) or 'token', None))
+    manager = authentication.TokenManager()
+    manager.get(KEY_URL)
+    manager.invalidate(KEY_URL)
+    manager.get(KEY_URL)
+    assert len(calls) == 2
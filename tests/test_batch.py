@@ -0,0 +1,86 @@
+import io
+import json
+
+from helpers import batch
+
+
+class CountingLimiter:
+
+    def __init__(self):
+        self.tokens = 0
+
+    def acquire(self, tokens: float = 1.0):
+        self.tokens += tokens
+
+
+def test_parse_jsonl_seed_sets():
+    lines = ['{"id": "x", "artist_ids": ["a1", "a2"]}\n', '\n', '{"genres": ["rock"]}\n']
+    assert list(batch.parse_seed_sets(lines)) == [
+        ('x', {'artist_ids': ['a1', 'a2'], 'track_ids': [], 'genres': []}),
+        ('1', {'artist_ids': [], 'track_ids': [], 'genres': ['rock']}),
+    ]
+
+
+def test_parse_csv_seed_sets():
+    lines = io.StringIO('id,artist_ids,genres\nx,"a1, a2;a3",rock\n')
+    assert list(batch.parse_seed_sets(lines, csv_format=True)) == [
+        ('x', {'artist_ids': ['a1', 'a2', 'a3'], 'track_ids': [], 'genres': ['rock']}),
+    ]
+
+
+def test_partial_last_line_is_trimmed(tmp_path):
+    path = tmp_path / 'out.jsonl'
+    path.write_text('{"id": "1", "tracks": []}\n{"id": "2", "tracks": []}\n{"id": "3", "tra')
+    assert batch.load_completed(str(path)) == {'1', '2'}
+    assert path.read_text() == '{"id": "1", "tracks": []}\n{"id": "2", "tracks": []}\n'
+
+
+def test_failed_seed_sets_are_not_completed(tmp_path):
+    path = tmp_path / 'out.jsonl'
+    path.write_text('{"id": "1", "tracks": []}\n{"id": "2", "error": "503"}\n')
+    assert batch.load_completed(str(path)) == {'1'}
+
+
+def test_limiter_is_charged_per_request(stub):
+    limiter = CountingLimiter()
+    seeds = {'artist_ids': ['a%d' % n for n in range(12)], 'track_ids': [], 'genres': []}
+    result = batch.recommend('x', seeds, limiter)
+    assert 'tracks' in result
+    assert limiter.tokens == stub.hits['/v1/recommendations'] == 3
+
+
+def test_invalid_seed_set_is_reported_not_raised(stub):
+    limiter = CountingLimiter()
+    result = batch.recommend('x', {'artist_ids': [], 'track_ids': [], 'genres': []}, limiter)
+    assert 'required' in result['error']
+    assert limiter.tokens == 0
+
+
+def test_rerun_skips_completed_seed_sets(stub, tmp_path):
+    source = tmp_path / 'seeds.jsonl'
+    source.write_text(''.join(json.dumps({'id': str(n), 'artist_ids': ['a%d' % n]}) + '\n' for n in range(5)))
+    output = tmp_path / 'out.jsonl'
+    log = io.StringIO()
+
+    stats = batch.run_batch(str(source), str(output), workers=2, requests_per_second=0, out=log)
+    assert (stats.done, stats.errors, stats.skipped) == (5, 0, 0)
+
+    stats = batch.run_batch(str(source), str(output), workers=2, requests_per_second=0, out=log)
+    assert (stats.done, stats.skipped) == (0, 5)
+    assert sorted(json.loads(line)['id'] for line in output.read_text().splitlines()) == ['0', '1', '2', '3', '4']
+
+
+def test_rerun_retries_failed_seed_sets(stub, tmp_path):
+    source = tmp_path / 'seeds.jsonl'
+    source.write_text(''.join(json.dumps({'id': str(n), 'artist_ids': ['a%d' % n]}) + '\n' for n in range(3)))
+    output = tmp_path / 'out.jsonl'
+    output.write_text(json.dumps({'id': '0', 'tracks': []}) + '\n' + json.dumps({'id': '1', 'error': '503'}) + '\n')
+
+    stats = batch.run_batch(str(source), str(output), workers=2, requests_per_second=0, out=io.StringIO())
+    assert (stats.done, stats.errors, stats.skipped) == (2, 0, 1)
+    latest = {}
+    for line in output.read_text().splitlines():
+        result = json.loads(line)
+        latest[result['id']] = result
+    assert all('tracks' in result for result in latest.values()) and len(latest) == 3
+    assert batch.load_completed(str(output)) == {'0', '1', '2'}
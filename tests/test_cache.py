@@ -0,0 +1,106 @@
+import asyncio
+import threading
+
+from helpers import async_spotify
+from helpers import cache
+from helpers import spotify
+
+URL = 'https://api.spotify.com/v1/search?q=Glass%20Animals&type=artist'
+
+
+def test_equivalent_urls_share_a_key():
+    assert cache.normalize_url(URL) == cache.normalize_url(
+        'https://API.spotify.com/v1/search?type=artist&q=glass+animals')
+    assert cache.normalize_url('https://api.spotify.com/v1/artists/AbC') != \
+        cache.normalize_url('https://api.spotify.com/v1/artists/abc')
+
+
+def test_endpoint_classes():
+    assert cache.endpoint_class(URL) == 'artist'
+    assert cache.endpoint_class('https://api.spotify.com/v1/recommendations?seed_genres=rock') == 'recommendations'
+    assert cache.endpoint_class('https://api.spotify.com/v1/artists/x/top-tracks') == 'top-tracks'
+
+
+def test_responses_survive_a_restart(tmp_path):
+    path = str(tmp_path / 'responses.sqlite3')
+    first = cache.ResponseCache(path)
+    first.set(URL, {'artists': {'items': []}})
+    first.close()
+
+    second = cache.ResponseCache(path)
+    assert second.peek(URL) is None
+    assert second.get(URL) == {'artists': {'items': []}}
+    assert second.peek(URL) == {'artists': {'items': []}}
+    assert second.hits == {'memory': 1, 'disk': 1} and second.misses == 0
+    second.close()
+
+
+def test_stale_responses_are_misses():
+    response_cache = cache.ResponseCache(None, ttls={'artist': -1})
+    response_cache.set(URL, {})
+    assert response_cache.peek(URL) is None
+    assert response_cache.get(URL) is None
+    assert response_cache.misses == 1
+
+
+def test_memory_tier_is_bounded():
+    response_cache = cache.ResponseCache(None, memory_entries=2)
+    for n in range(3):
+        response_cache.set(URL + str(n), n)
+    assert response_cache.get(URL + '0') is None
+    assert response_cache.get(URL + '2') == 2
+
+
+class ThreadRecordingCache(cache.ResponseCache):
+    # Notes the thread every disk-backed call runs on
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.threads = []
+
+    def get(self, url: str):
+        self.threads.append(('get', threading.get_ident()))
+        return super().get(url)
+
+    def set_many(self, items: list):
+        self.threads.append(('set', threading.get_ident()))
+        return super().set_many(items)
+
+
+def test_async_client_keeps_sqlite_off_the_event_loop(stub, tmp_path, monkeypatch):
+    response_cache = ThreadRecordingCache(str(tmp_path / 'responses.sqlite3'))
+    monkeypatch.setattr(spotify, '_cache', response_cache)
+
+    async def search_twice():
+        async with async_spotify.AsyncSpotify() as client:
+            first = await client.get_artists('glass')
+            second = await client.get_artists('glass')
+        return threading.get_ident(), first, second
+
+    loop_thread, first, second = asyncio.run(search_twice())
+    assert first == second
+    assert stub.hits['/v1/search'] == 1
+    # The miss and the write went to a thread; the repeat was a memory hit answered inline
+    assert [call for call, _ in response_cache.threads] == ['get', 'set']
+    assert all(thread != loop_thread for _, thread in response_cache.threads)
+    assert response_cache.hits['memory'] == 1
+    response_cache.close()
+
+
+def test_async_client_opens_the_default_cache_off_the_event_loop(stub, monkeypatch):
+    threads = []
+
+    def get_cache():
+        threads.append(threading.get_ident())
+        spotify.set_cache(None)
+
+    monkeypatch.setattr(spotify, '_cache_configured', False)
+    monkeypatch.setattr(spotify, 'get_cache', get_cache)
+
+    async def search():
+        async with async_spotify.AsyncSpotify() as client:
+            await client.get_artists('glass')
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(search())
+    assert len(threads) == 1 and threads[0] != loop_thread
@@ -0,0 +1,75 @@
+import pytest
+
+import music_finder
+from helpers import genres
+from helpers import mail_queue
+from helpers import sendgrid
+
+
+class FakeMailClient:
+
+    def __init__(self, status: int = None):
+        self.status = status
+        self.payloads = []
+
+    def send(self, payload: dict):
+        if self.status is not None:
+            raise mail_queue.MailError('SendGrid answered %d' % self.status, self.status)
+        self.payloads.append(payload)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def digest(stub, tmp_path, monkeypatch):
+    monkeypatch.setattr(genres, '_catalog', genres.GenreCatalog(None))
+    monkeypatch.setattr(sendgrid, '_queue', None)
+
+    def run(*options):
+        return music_finder.main(['digest', 'weekly', '--history', str(tmp_path / 'history')] + list(options))
+
+    assert run('--recipient', 'friend@example.com', '--artist-id', 'artist000001') == music_finder.EXIT_OK
+    return run
+
+
+def use_mail_client(tmp_path, client: FakeMailClient):
+    queue = mail_queue.MailQueue(str(tmp_path / 'mail.sqlite3'), client=client,
+                                 retry_policy=mail_queue.retry.RetryPolicy(attempts=1))
+    sendgrid.set_queue(queue)
+    return queue
+
+
+def test_report_alone_marks_nothing(digest, capsys):
+    capsys.readouterr()
+    assert digest() == music_finder.EXIT_OK
+    assert '20 new tracks (0 already sent)' in capsys.readouterr().err
+
+
+def test_mark_records_the_tracks(digest, capsys):
+    assert digest('--mark') == music_finder.EXIT_OK
+    capsys.readouterr()
+    assert digest() == music_finder.EXIT_OK
+    assert '0 new tracks (20 already sent)' in capsys.readouterr().err
+
+
+def test_sent_email_records_the_tracks(digest, tmp_path, capsys):
+    client = FakeMailClient()
+    queue = use_mail_client(tmp_path, client)
+    assert digest('--sender', 'me@example.com') == music_finder.EXIT_OK
+    # with one recipient the sender is copied, as in the menu
+    assert client.payloads[0]['personalizations'] == [{'to': [{'email': 'friend@example.com'},
+                                                              {'email': 'me@example.com'}]}]
+    capsys.readouterr()
+    assert digest() == music_finder.EXIT_OK
+    assert '0 new tracks (20 already sent)' in capsys.readouterr().err
+    queue.close()
+
+
+def test_failed_email_records_nothing(digest, tmp_path, capsys):
+    queue = use_mail_client(tmp_path, FakeMailClient(status=400))
+    assert digest('--sender', 'me@example.com') == music_finder.EXIT_FAILED
+    assert 'was not sent (failed)' in capsys.readouterr().err
+    assert digest() == music_finder.EXIT_OK
+    assert '20 new tracks (0 already sent)' in capsys.readouterr().err
+    queue.close()
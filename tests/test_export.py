@@ -0,0 +1,120 @@
+import csv
+import gzip
+import io
+import json
+import lzma
+import os
+
+import pytest
+
+from benchmarks.stub_server import fake_track
+from helpers import export
+from helpers import models
+from helpers import spotify
+from helpers import utilities
+
+TRACKS = spotify._simplify_tracks([fake_track(n) for n in range(30)])
+
+
+def test_rows_accept_nested_flattened_and_model_tracks():
+    flat = {'id': 'track000001', 'name': 'Track 1', 'album_name': 'Album 0', 'artist_name': 'Artist 0'}
+    nested, = export.rows([TRACKS[1]])
+    model, = export.rows([models.track_from_api(fake_track(1))])
+    row = dict(zip(export.COLUMNS, nested))
+    assert nested == model
+    assert (row['id'], row['album_name'], row['artist_name']) == ('track000001', 'Album 0', 'Artist 0')
+    assert dict(zip(export.COLUMNS, next(export.rows([flat]))))['album_name'] == 'Album 0'
+
+
+def test_jsonl_round_trips_the_tracks():
+    out = io.StringIO()
+    assert export.write(iter(TRACKS), out, 'jsonl', chunk_size=7) == 30
+    assert [json.loads(line) for line in out.getvalue().splitlines()] == TRACKS
+
+
+def test_csv_has_a_header_and_a_row_per_track():
+    out = io.StringIO(newline='')
+    assert export.write(TRACKS, out, 'csv', chunk_size=7) == 30
+    read = list(csv.DictReader(io.StringIO(out.getvalue())))
+    assert list(read[0]) == export.COLUMNS and len(read) == 30
+    assert read[29]['name'] == 'Track 29'
+
+
+def test_m3u_links_and_skips_tracks_without_them():
+    tracks = TRACKS[:3] + [dict(TRACKS[3], preview_url=None)]
+    local = {TRACKS[0]['preview_url']: '/cache/0.mp3'}
+    out = io.StringIO()
+    assert export.write(tracks, out, 'm3u', files=local) == 3
+    assert out.getvalue().splitlines()[:5] == [
+        '#EXTM3U', '#EXTINF:-1,Artist 0 - Track 0', '/cache/0.mp3',
+        '#EXTINF:-1,Artist 0 - Track 1', TRACKS[1]['preview_url']]
+    out = io.StringIO()
+    export.write(TRACKS[:1], out, 'm3u', link='share_url')
+    assert out.getvalue().splitlines()[2] == TRACKS[0]['share_url']
+    with pytest.raises(ValueError):
+        export.write(TRACKS, io.StringIO(), 'm3u', link='album')
+
+
+def test_binary_formats_need_a_file():
+    with pytest.raises(ValueError):
+        export.write(TRACKS, io.StringIO(), 'parquet')
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('tracks.csv', ('csv', None)),
+    ('tracks.CSV.GZ', ('csv', 'gzip')),
+    ('tracks.jsonl.xz', ('jsonl', 'xz')),
+    ('tracks.m3u8', ('m3u', None)),
+    ('tracks.arrow', ('feather', None)),
+    ('tracks.txt', (None, None)),
+])
+def test_formats_and_compression_from_file_names(name, expected):
+    assert export.guess_format(name) == expected
+
+
+def test_export_compresses_from_the_extension(tmp_path):
+    path = str(tmp_path / 'tracks.jsonl.gz')
+    assert export.export(TRACKS, path) == 30
+    with gzip.open(path, 'rt') as f:
+        assert [json.loads(line) for line in f] == TRACKS
+    xz = str(tmp_path / 'tracks.csv')
+    export.export(TRACKS, xz, compression='xz')
+    with lzma.open(xz, 'rt', newline='') as f:
+        assert len(list(csv.reader(f))) == 31
+
+
+def test_failed_export_leaves_nothing_behind(tmp_path):
+    def failing():
+        yield TRACKS[0]
+        raise RuntimeError('upstream went away')
+
+    path = tmp_path / 'tracks.csv'
+    with pytest.raises(RuntimeError):
+        export.export(failing(), str(path))
+    assert os.listdir(tmp_path) == []
+
+
+def test_export_replaces_the_file_name_file_chose(tmp_path):
+    path = utilities.name_file('.m3u', str(tmp_path))
+    assert os.path.getsize(path) == 0
+    export.export(TRACKS, path)
+    assert open(path).readline() == '#EXTM3U\n'
+    assert os.stat(path).st_mode & 0o777 == 0o644
+    assert utilities.name_file('.m3u', str(tmp_path)) != path
+
+
+@pytest.mark.parametrize('bad', [{'output_format': 'xls'}, {'compression': 'zip'}])
+def test_unknown_formats_and_compressions(tmp_path, bad):
+    with pytest.raises(ValueError):
+        export.export(TRACKS, str(tmp_path / 'tracks.csv'), **bad)
+
+
+def test_parquet_and_feather_round_trip(tmp_path):
+    pytest.importorskip('pyarrow')
+    import pyarrow.feather
+    import pyarrow.parquet
+    assert export.export(TRACKS, str(tmp_path / 'tracks.parquet'), chunk_size=8) == 30
+    table = pyarrow.parquet.read_table(str(tmp_path / 'tracks.parquet'))
+    assert table.column_names == export.COLUMNS and table.num_rows == 30
+    export.export(TRACKS, str(tmp_path / 'tracks.feather'))
+    assert pyarrow.feather.read_table(str(tmp_path / 'tracks.feather')).equals(table)
@@ -0,0 +1,66 @@
+import json
+import time
+
+import pytest
+
+from benchmarks.stub_server import GENRE_SEEDS
+from helpers import genres
+from helpers import spotify
+
+SEEDS_PATH = '/v1/recommendations/available-genre-seeds'
+
+
+def test_list_is_fetched_once_and_kept_on_disk(stub, tmp_path):
+    path = str(tmp_path / 'genres.json')
+    catalog = genres.GenreCatalog(path)
+    assert catalog.genres == sorted(GENRE_SEEDS) and catalog.complete
+    assert 'trip-hop' in catalog and 'polka' not in catalog
+    assert genres.GenreCatalog(path).genres == catalog.genres
+    assert stub.hits[SEEDS_PATH] == 1
+
+
+def test_stale_list_is_fetched_again(stub, tmp_path):
+    path = tmp_path / 'genres.json'
+    path.write_text(json.dumps({'fetched': time.time() - genres.MAX_AGE - 1, 'genres': ['old-genre']}))
+    catalog = genres.GenreCatalog(str(path))
+    assert 'old-genre' not in catalog and 'jazz' in catalog
+    assert 'old-genre' not in json.loads(path.read_text())['genres']
+
+
+def test_stale_list_is_kept_if_spotify_is_down(make_stub, tmp_path):
+    make_stub(error_rate=1)
+    path = tmp_path / 'genres.json'
+    path.write_text(json.dumps({'fetched': time.time() - genres.MAX_AGE - 1, 'genres': ['old-genre']}))
+    catalog = genres.GenreCatalog(str(path))
+    assert catalog.genres == ['old-genre'] and catalog.complete
+
+
+def test_abridged_list_stands_in_and_rejects_nothing(make_stub):
+    make_stub(error_rate=1)
+    catalog = genres.GenreCatalog(None)
+    assert catalog.genres == sorted(spotify.get_genres_abridged())
+    assert not catalog.complete and catalog.invalid(['polka']) == []
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('jazz', ['jazz']),
+    ('Hip Hop', ['hip-hop']),
+    ('house', ['house', 'chicago-house', 'deep-house', 'progressive-house']),
+    ('trance', ['trance']),
+    ('tekno', ['techno']),
+])
+def test_filter_ranks_prefix_then_substring_then_fuzzy(stub, text, expected):
+    catalog = genres.GenreCatalog(None)
+    assert catalog.filter(text, len(expected)) == expected
+
+
+def test_filter_without_text_lists_everything(stub):
+    assert genres.GenreCatalog(None).filter('', 3) == sorted(GENRE_SEEDS)[:3]
+
+
+def test_invalid_genres_fail_before_any_request(stub):
+    spotify.set_genre_catalog(genres.GenreCatalog(None))
+    with pytest.raises(spotify.InvalidSeedsError, match="'tekno' \\(did you mean 'techno'\\?\\)"):
+        spotify.get_similar_tracks([], [], ['jazz', 'tekno'])
+    assert '/v1/recommendations' not in stub.hits
+    assert spotify.get_similar_tracks([], [], ['jazz', 'techno'])
@@ -0,0 +1,71 @@
+import array
+import builtins
+
+import pytest
+
+from helpers import history
+
+
+def fake_id(n: int):
+    return 'track%017d' % n
+
+
+def test_unseen_keeps_order_and_drops_delivered(tmp_path):
+    delivered = history.DeliveredSet(str(tmp_path))
+    delivered.add(fake_id(n) for n in (1, 3))
+    assert delivered.unseen([fake_id(n) for n in (4, 3, 2, 1)]) == [fake_id(4), fake_id(2)]
+    delivered.save()
+    delivered.close()
+
+    reopened = history.DeliveredSet(str(tmp_path))
+    assert fake_id(3) in reopened and fake_id(2) not in reopened
+    reopened.close()
+
+
+def test_runs_are_compacted_without_losing_ids(tmp_path):
+    delivered = history.DeliveredSet(str(tmp_path))
+    for first in range(0, (history.MAX_RUNS + 4) * 100, 100):
+        # each save repeats ten IDs of the one before
+        delivered.add(fake_id(n) for n in range(max(0, first - 10), first + 100))
+        delivered.save()
+    assert len(delivered._runs) == history.MAX_RUNS
+    assert delivered.unseen([fake_id(n) for n in range((history.MAX_RUNS + 4) * 100 + 5)]) == \
+        [fake_id(n) for n in range((history.MAX_RUNS + 4) * 100, (history.MAX_RUNS + 4) * 100 + 5)]
+    for _, _, run in delivered._runs:
+        keys = run.tolist()
+        assert keys == sorted(set(keys))
+    delivered.close()
+
+
+@pytest.mark.parametrize('numpy', [True, False])
+def test_merge_runs(monkeypatch, numpy):
+    if numpy:
+        pytest.importorskip('numpy')
+    else:
+        real_import = builtins.__import__
+
+        def no_numpy(name, *args, **kwargs):
+            if name == 'numpy':
+                raise ImportError(name)
+            return real_import(name, *args, **kwargs)
+
+        monkeypatch.setattr(builtins, '__import__', no_numpy)
+
+    left = memoryview(array.array('Q', [1, 4, 9, 2 ** 64 - 1]))
+    right = memoryview(array.array('Q', [0, 4, 5, 9]))
+    assert list(history.merge_runs(left, right)) == [0, 1, 4, 5, 9, 2 ** 64 - 1]
+
+
+def test_refresh_leaves_out_marked_tracks(tmp_path):
+    store = history.History(str(tmp_path))
+    store.save_digest('weekly', 'me@example.com', artist_ids=['a1'])
+    tracks = [{'id': fake_id(n)} for n in range(5)]
+    fetch = lambda *seeds: tracks
+
+    new, skipped = store.refresh('weekly', fetch)
+    assert (len(new), skipped) == (5, 0)
+    store.mark_delivered('weekly', new[:2])
+    new, skipped = store.refresh('weekly', fetch)
+    assert (new, skipped) == (tracks[2:], 2)
+    assert store.get_digest('weekly')['delivered'] == 2
+    store.close()
@@ -0,0 +1,50 @@
+import concurrent.futures
+
+import pytest
+
+from benchmarks.stub_server import fake_artist
+from helpers import cache
+from helpers import spotify
+
+
+def lookups(server, kind: str = 'track'):
+    return server.hits.get('/v1/%ss' % kind, 0)
+
+
+def test_results_follow_the_ids_with_none_for_unknown(stub):
+    tracks = spotify.get_tracks_by_ids(['track000003', 'nonsense', 'track000001', 'track000003'])
+    assert [track and track['id'] for track in tracks] == ['track000003', None, 'track000001', 'track000003']
+    assert lookups(stub) == 1
+
+
+def test_artists_are_simplified_like_searches(stub):
+    assert spotify.get_artists_by_ids(['artist000002']) == spotify._simplify_artists([fake_artist(2)])
+
+
+def test_ids_are_sent_fifty_at_a_time(stub):
+    ids = ['track%06d' % n for n in range(120)]
+    assert [track['id'] for track in spotify.get_tracks_by_ids(ids, simplify=False)] == ids
+    assert lookups(stub) == 3
+
+
+def test_cached_items_are_not_requested_again(stub, monkeypatch):
+    monkeypatch.setattr(spotify, '_cache', cache.ResponseCache(None))
+    spotify.get_tracks_by_ids(['track%06d' % n for n in range(10)])
+    spotify.get_tracks_by_ids(['track%06d' % n for n in range(5, 15)])
+    assert lookups(stub) == 2
+    assert spotify._cache.get(spotify._item_url('track', 'track000014'))['id'] == 'track000014'
+
+
+def test_lookups_on_other_threads_share_requests(stub, monkeypatch):
+    monkeypatch.setattr(spotify, '_loaders', {kind: spotify._BatchLoader(kind, 0.1) for kind in ('track', 'artist')})
+    with concurrent.futures.ThreadPoolExecutor(8) as pool:
+        found = list(pool.map(lambda n: spotify.get_tracks_by_ids(['track%06d' % n])[0]['id'], range(8)))
+    assert found == ['track%06d' % n for n in range(8)]
+    assert lookups(stub) == 1
+
+
+def test_a_failed_batch_fails_every_caller(make_stub):
+    make_stub(error_rate=1, error_status=400)
+    with pytest.raises(spotify.RequestError):
+        spotify.get_artists_by_ids(['artist000001', 'artist000002'])
+    assert spotify._loaders['artist']._waiting == {}
@@ -0,0 +1,153 @@
+import collections
+import threading
+import time
+
+import pytest
+
+from helpers import mail_queue
+from helpers import retry
+from helpers import sendgrid
+
+
+class FakeMailClient:
+
+    def __init__(self, statuses: list = (), delay: float = 0):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.payloads = []
+        self._lock = threading.Lock()
+
+    def send(self, payload: dict):
+        time.sleep(self.delay)
+        with self._lock:
+            status = self.statuses.pop(0) if self.statuses else None
+            if status is not None:
+                raise mail_queue.MailError('SendGrid answered %d' % status, status)
+            self.payloads.append(payload)
+
+    def close(self):
+        pass
+
+    def recipients(self):
+        return [to['email'] for payload in self.payloads
+                for personalization in payload['personalizations'] for to in personalization['to']]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'mail.sqlite3')
+
+
+def make_queue(path: str, client: FakeMailClient, **options):
+    options.setdefault('retry_policy', retry.RetryPolicy(attempts=3, base=0.01, cap=0.02))
+    return mail_queue.MailQueue(path, client=client, **options)
+
+
+def test_messages_sharing_a_report_go_out_together(path):
+    client = FakeMailClient()
+    queue = make_queue(path, client)
+    for n in range(5):
+        queue.enqueue('me@example.com', ['friend%d@example.com' % n], 'Subject', '<p>report</p>')
+    queue.start()
+    assert queue.flush(5)
+    assert len(client.payloads) == 1
+    assert client.recipients() == ['friend%d@example.com' % n for n in range(5)]
+    assert queue.stats()['sent'] == 5
+    queue.close()
+
+
+def test_transient_failures_are_retried(path):
+    client = FakeMailClient([503, 503])
+    queue = make_queue(path, client).start()
+    message_id = queue.enqueue('me@example.com', ['friend@example.com'], 'Subject', '<p>report</p>')
+    assert queue.wait(message_id, 5) == 'sent'
+    assert len(client.payloads) == 1
+    queue.close()
+
+
+def test_rejected_messages_fail(path):
+    queue = make_queue(path, FakeMailClient([400])).start()
+    message_id = queue.enqueue('me@example.com', ['friend@example.com'], 'Subject', '<p>report</p>')
+    assert queue.wait(message_id, 5) == 'failed'
+    assert queue.stats()['failed'] == 1
+    queue.close()
+
+
+def test_wait_times_out_on_unsent_messages(path):
+    queue = make_queue(path, FakeMailClient())
+    message_id = queue.enqueue('me@example.com', ['friend@example.com'], 'Subject', '<p>report</p>')
+    assert queue.wait(message_id, 0.1) == 'queued'
+    queue.close()
+
+
+def test_queues_sharing_a_file_send_each_message_once(path):
+    clients = [FakeMailClient(delay=0.01) for _ in range(3)]
+    queues = [make_queue(path, client, batch_size=2) for client in clients]
+    for n in range(60):
+        # a report per message, so batches stay small and the queues race for them
+        queues[n % 3].enqueue('me@example.com', ['friend%d@example.com' % n], 'Subject', '<p>%d</p>' % n)
+    for queue in queues:
+        queue.start()
+    for queue in queues:
+        assert queue.flush(10)
+
+    sent = collections.Counter(address for client in clients for address in client.recipients())
+    assert sent == collections.Counter('friend%d@example.com' % n for n in range(60))
+    assert sum(1 for client in clients if client.payloads) > 1
+    for queue in queues:
+        queue.close()
+
+
+def test_batch_claimed_by_a_running_program_is_left_alone(path):
+    first = make_queue(path, FakeMailClient())
+    first.enqueue('me@example.com', ['friend@example.com'], 'Subject', '<p>report</p>')
+    with first._lock:
+        assert first._claim() is not None
+
+    client = FakeMailClient()
+    second = make_queue(path, client, lease=60).start()
+    time.sleep(0.3)
+    assert client.payloads == []
+    assert second.stats()['sending'] == 1
+    second.close()
+    first.close()
+
+
+def test_batch_of_a_program_that_stopped_is_sent_once_its_lease_runs_out(path):
+    first = make_queue(path, FakeMailClient(), lease=0.2)
+    first.enqueue('me@example.com', ['friend@example.com'], 'Subject', '<p>report</p>')
+    with first._lock:
+        assert first._claim() is not None
+    first.close()
+
+    client = FakeMailClient()
+    second = make_queue(path, client).start()
+    assert second.flush(5)
+    assert client.recipients() == ['friend@example.com']
+    second.close()
+
+
+def test_unsent_mail_at_exit_is_reported_on_stderr(path, monkeypatch, capsys):
+    queue = make_queue(path, FakeMailClient())
+    queue.enqueue('me@example.com', ['friend@example.com'], 'Subject', '<p>report</p>')
+    monkeypatch.setattr(sendgrid, '_queue', queue)
+    monkeypatch.setattr(sendgrid, 'EXIT_FLUSH_TIMEOUT', 0.1)
+    sendgrid._flush_at_exit()
+    out, err = capsys.readouterr()
+    assert out == ''
+    assert 'still queued' in err
+    queue.close()
+
+
+def test_send_queued_delivers_mail_left_by_an_earlier_run(path, monkeypatch):
+    monkeypatch.setattr(sendgrid, '_queue', None)
+    monkeypatch.setattr(mail_queue, 'DEFAULT_PATH', path)
+    assert sendgrid.send_queued(0) == {}
+
+    make_queue(path, FakeMailClient()).enqueue('me@example.com', ['friend@example.com'], 'Subject', '<p>hi</p>')
+    client = FakeMailClient()
+    monkeypatch.setattr(mail_queue, 'SendGridClient', lambda: client)
+    counts = sendgrid.send_queued(5)
+    assert counts['sent'] == 1
+    assert client.recipients() == ['friend@example.com']
+    sendgrid._queue.close()
@@ -0,0 +1,124 @@
+import io
+
+import pytest
+
+from benchmarks.stub_server import StubServer
+from helpers import metrics
+from helpers import spotify
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics(monkeypatch):
+    # Each test starts with metrics off, nothing recorded and no hooks
+    monkeypatch.setattr(metrics, '_recording', False)
+    monkeypatch.setattr(metrics, '_active', False)
+    monkeypatch.setattr(metrics, '_hooks', [])
+    monkeypatch.setattr(metrics, '_histograms', {})
+    monkeypatch.setattr(metrics, '_counters', {})
+
+
+def test_nothing_is_recorded_while_off():
+    assert not metrics.enabled()
+    assert metrics.timer('work') is metrics._NO_TIMER
+    with metrics.timer('work'):
+        pass
+    metrics.observe('work', 1)
+    metrics.increment('calls')
+    assert metrics.timings() == {} and metrics.counters() == {}
+
+
+def test_timers_and_counters_are_recorded_by_label():
+    metrics.enable()
+    for seconds in (0.002, 0.004, 3):
+        metrics.observe('request_seconds', seconds, endpoint='/search')
+    metrics.increment('requests_total', endpoint='/search')
+    metrics.increment('requests_total', 2, endpoint='/search')
+    with metrics.timer('render_seconds'):
+        pass
+
+    timings = metrics.timings()
+    count, total, slowest = timings[('request_seconds', (('endpoint', '/search'),))]
+    assert (count, slowest) == (3, 3) and total == pytest.approx(3.006)
+    assert timings[('render_seconds', ())][0] == 1
+    assert metrics.counters() == {('requests_total', (('endpoint', '/search'),)): 3}
+
+
+def test_reset_and_disable():
+    metrics.enable()
+    metrics.increment('calls')
+    metrics.reset()
+    assert metrics.counters() == {}
+    metrics.disable()
+    assert not metrics.enabled()
+
+
+def test_prometheus_text():
+    metrics.enable()
+    metrics.observe('request_seconds', 0.002, endpoint='/search')
+    metrics.observe('request_seconds', 20, endpoint='/search')
+    metrics.increment('requests_total', outcome='say "hi"\n')
+    lines = metrics.prometheus_text().splitlines()
+    assert lines[0] == '# TYPE request_seconds histogram'
+    assert 'request_seconds_bucket{endpoint="/search",le="0.001"} 0' in lines
+    assert 'request_seconds_bucket{endpoint="/search",le="0.0025"} 1' in lines
+    assert 'request_seconds_bucket{endpoint="/search",le="10"} 1' in lines
+    assert 'request_seconds_bucket{endpoint="/search",le="+Inf"} 2' in lines
+    assert 'request_seconds_count{endpoint="/search"} 2' in lines
+    assert 'request_seconds_sum{endpoint="/search"} 20.002000' in lines
+    assert lines[-2:] == ['# TYPE requests_total counter', 'requests_total{outcome="say \\"hi\\"\\n"} 1']
+
+
+def test_hooks_see_spans_without_recording():
+    spans = []
+
+    def hook(name, labels, started, seconds, error):
+        spans.append((name, labels, error))
+
+    metrics.add_hook(hook)
+    assert metrics.enabled()
+    with pytest.raises(KeyError):
+        with metrics.timer('lookup', kind='artist'):
+            raise KeyError('missing')
+    assert [(name, labels, type(error)) for name, labels, error in spans] == [('lookup', {'kind': 'artist'}, KeyError)]
+    assert metrics.timings() == {}
+    metrics.remove_hook(hook)
+    assert not metrics.enabled()
+
+
+def test_write_timings_lists_the_slowest_first():
+    out = io.StringIO()
+    metrics.write_timings(out)
+    assert out.getvalue() == 'No timings recorded.\n'
+
+    metrics.enable()
+    metrics.observe('fast', 0.001)
+    metrics.observe('slow', 2)
+    metrics.increment('calls')
+    out = io.StringIO()
+    metrics.write_timings(out)
+    lines = out.getvalue().splitlines()
+    assert lines[0].split() == ['count', 'total', 's', 'mean', 'ms', 'max', 'ms']
+    assert [line.split()[0] for line in lines[1:]] == ['slow', 'fast', 'calls']
+
+
+class FailOnceStub(StubServer):
+
+    failed = False
+
+    def should_fail(self, path: str):
+        if path.startswith('/v1/') and not self.failed:
+            self.failed = True
+            return True
+        return False
+
+
+def test_spotify_requests_are_counted_by_endpoint_and_outcome(make_stub):
+    make_stub(FailOnceStub)
+    metrics.enable()
+    spotify.get_tracks('glass')
+    spotify.get_top_tracks_by_artist('artist000001')
+    counters = metrics.counters()
+    assert counters[('spotify_retries_total', (('endpoint', '/search'), ('status', 503)))] == 1
+    assert counters[('spotify_requests_total', (('endpoint', '/search'), ('outcome', 'ok')))] == 1
+    assert counters[('spotify_requests_total', (('endpoint', '/artists/{id}/top-tracks'), ('outcome', 'ok')))] == 1
+    assert metrics.timings()[('spotify_request_seconds', (('endpoint', '/search'),))][0] == 1
@@ -0,0 +1,55 @@
+import gc
+
+import pytest
+
+from benchmarks.stub_server import fake_artist, fake_track
+from helpers import models
+from helpers import spotify
+
+
+def test_tracks_convert_to_the_simplified_dictionaries():
+    raw = [fake_track(n) for n in range(3)]
+    assert [track.to_dict() for track in spotify._simplify_tracks(raw, True)] == spotify._simplify_tracks(raw)
+
+
+def test_artists_convert_to_the_simplified_dictionaries():
+    raw = [fake_artist(n) for n in range(3)]
+    assert [artist.to_dict() for artist in spotify._simplify_artists(raw, True)] == spotify._simplify_artists(raw)
+
+
+def test_models_read_like_dictionaries():
+    track = models.track_from_api(fake_track(1))
+    assert track['name'] == 'Track 1' and track['album']['name'] == 'Album 0'
+    assert track.get('missing', 'default') == 'default'
+    assert track.share_url == 'https://open.spotify.com/track/track000001'
+    with pytest.raises(KeyError):
+        track['missing']
+
+
+def test_track_without_album_or_artist():
+    track = models.track_from_api({'id': 'lonely', 'name': 'Lonely'})
+    assert track.album is None and track.artist is None
+    assert 'album' not in track.to_dict() and 'artist' not in track.to_dict()
+
+
+def test_tracks_on_one_album_share_its_objects():
+    first, second = models.track_from_api(fake_track(1)), models.track_from_api(fake_track(2))
+    assert first.album is second.album and first.artist is second.artist
+
+
+def test_interned_albums_go_when_their_tracks_do():
+    track = models.track_from_api({'id': 't', 'name': 'T', 'album': {'id': 'short-lived', 'name': 'A'}})
+    assert 'short-lived' in models._albums
+    del track
+    gc.collect()
+    assert 'short-lived' not in models._albums
+
+
+def test_track_batch_stores_albums_and_artists_once():
+    batch = models.TrackBatch(fake_track(n) for n in range(25))
+    batch.append(models.Track('bare', 'Bare'))
+    assert len(batch) == 26
+    assert len(batch.albums) == 3 and len(batch.artists) == 1
+    assert batch.album_refs[-1] == batch.artist_refs[-1] == -1
+    assert [track.to_dict() for track in batch][:25] == spotify._simplify_tracks([fake_track(n) for n in range(25)])
+    assert batch[25].album is None
@@ -0,0 +1,86 @@
+import itertools
+import threading
+import time
+
+from benchmarks.stub_server import StubServer
+from benchmarks.stub_server import fake_track
+from helpers import cache
+from helpers import search_index
+from helpers import spotify
+
+
+def searches(server):
+    return server.hits.get('/v1/search', 0)
+
+
+def test_every_page_is_fetched_in_order(make_stub):
+    server = make_stub(total=95)
+    tracks = list(spotify.iter_tracks('glass', simplify=False))
+    assert [track['id'] for track in tracks] == ['track%06d' % n for n in range(95)]
+    assert searches(server) == 5
+
+
+def test_paging_stops_where_spotify_does(make_stub):
+    server = make_stub(total=5000)
+    artists = list(spotify.iter_artists('glass', page_size=50, prefetch=False))
+    assert len(artists) == spotify.MAX_SEARCH_OFFSET
+    assert searches(server) == spotify.MAX_SEARCH_OFFSET // 50
+
+
+def test_pages_are_only_fetched_when_needed(make_stub):
+    server = make_stub(total=1000)
+    assert len(list(itertools.islice(spotify.iter_tracks('glass', prefetch=False), 20))) == 20
+    assert searches(server) == 1
+
+
+def test_prefetch_stays_one_page_ahead(make_stub):
+    server = make_stub(total=1000)
+    pages = spotify.iter_tracks('glass', page_size=10)
+    first = list(itertools.islice(pages, 10))
+    time.sleep(0.2)
+    assert len(first) == 10 and searches(server) == 2
+    pages.close()
+
+
+def test_page_sizes_are_clamped(make_stub):
+    server = make_stub(total=120)
+    assert len(list(spotify.iter_tracks('glass', page_size=500, prefetch=False))) == 120
+    assert searches(server) == 3
+
+
+def test_first_page_is_shared_with_get_tracks(make_stub, monkeypatch):
+    server = make_stub(total=40)
+    monkeypatch.setattr(spotify, '_cache', cache.ResponseCache(None))
+    spotify.get_tracks('glass')
+    assert len(list(spotify.iter_tracks('glass', prefetch=False))) == 40
+    assert searches(server) == 2
+
+
+class TermStub(StubServer):
+    # Gives each search term 'term <n>' its own tracks, numbered from n * 100000
+
+    def route(self, path: str, query: dict):
+        data = super().route(path, query)
+        if path == '/v1/search':
+            first = 100000 * int(query['q'][0].split()[-1])
+            data['tracks']['items'] = [fake_track(first + int(item['id'][5:])) for item in data['tracks']['items']]
+        return data
+
+
+def test_prefetched_pages_and_searches_feed_one_index(make_stub, switch_often, monkeypatch):
+    make_stub(TermStub, total=1000)
+    index = search_index.SearchIndex()
+    spotify.set_search_index('track', index)
+    monkeypatch.setattr(spotify, '_min_local_results', 5)
+
+    paged = []
+    reader = threading.Thread(target=lambda: paged.extend(spotify.iter_tracks('term 1', page_size=50)))
+    reader.start()
+    for n in range(2, 80):
+        spotify.get_tracks('term %d' % n)
+    reader.join()
+
+    assert len(paged) == 1000
+    assert len(index) == 1000 + 78 * spotify.SEARCH_PAGE_SIZE
+    for track in [fake_track(100000 + n) for n in range(0, 1000, 37)] + [fake_track(n * 100000) for n in range(2, 80)]:
+        assert index.search(track['name'], 1)[0]['id'] == track['id']
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from benchmarks.stub_server import StubServer, fake_track
+from helpers import async_spotify
+from helpers import planner
+from helpers import spotify
+
+
+class SeedRecordingStub(StubServer):
+    # Keeps the seeds of every recommendations request
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.queries = []
+
+    def route(self, path: str, query: dict):
+        if path == '/v1/recommendations':
+            with self._lock:
+                self.queries.append({key: value[0].split(',') for key, value in query.items()})
+        return super().route(path, query)
+
+
+def test_plan_deals_seeds_into_even_queries():
+    queries = planner.plan(['a%d' % n for n in range(6)], ['t%d' % n for n in range(4)], ['rock', 'jazz'])
+    assert len(queries) == 3
+    assert sorted(sum(len(values) for values in query) for query in queries) == [4, 4, 4]
+    assert all(query[0] and query[1] for query in queries)
+
+
+def test_plan_drops_repeats_and_sorts():
+    assert planner.plan(['b', 'a', 'b'], [], ['pop', 'pop']) == [(['a', 'b'], [], ['pop'])]
+
+
+def test_plan_needs_a_seed():
+    with pytest.raises(spotify.InvalidSeedsError):
+        planner.plan([], None, [])
+
+
+def test_merge_puts_tracks_queries_agree_on_first():
+    queries = [(['a'], [], []), (['b'], [], [])]
+    shared, first, second = {'id': 'shared'}, {'id': 'first'}, {'id': 'second'}
+    merged = planner.merge(queries, [[first, shared], [second, shared]])
+    assert merged[0] is shared
+    assert merged[1:] == [first, second]
+
+
+def test_single_query_sends_the_planned_seeds(make_stub):
+    server = make_stub(SeedRecordingStub)
+    tracks = planner.get_similar_tracks(['b', 'a', 'b', 'a', 'b', 'a'], [], [])
+    assert len(tracks) == server.page_size
+    assert server.queries == [{'seed_artists': ['a', 'b']}]
+
+
+def test_large_seed_sets_are_split(make_stub):
+    server = make_stub(SeedRecordingStub)
+    tracks = planner.get_similar_tracks(['a%d' % n for n in range(12)], [], [], simplify=False)['tracks']
+    assert len(server.queries) == 3
+    assert sorted(seed for query in server.queries for seed in query['seed_artists']) == \
+        sorted('a%d' % n for n in range(12))
+    # every query returns the same generated tracks, so they merge to one copy of each
+    assert [track['id'] for track in tracks] == [fake_track(n)['id'] for n in range(server.page_size)]
+
+
+def test_async_single_query_sends_the_planned_seeds(make_stub):
+    server = make_stub(SeedRecordingStub)
+
+    async def recommend():
+        async with async_spotify.AsyncSpotify() as client:
+            return await planner.get_similar_tracks_async(client, [], ['t2', 't1', 't2'], ['rock'])
+
+    assert asyncio.run(recommend())
+    assert server.queries == [{'seed_tracks': ['t1', 't2'], 'seed_genres': ['rock']}]
+
+
+def test_async_large_seed_sets_are_split(make_stub):
+    server = make_stub(SeedRecordingStub)
+
+    async def recommend():
+        async with async_spotify.AsyncSpotify() as client:
+            return await planner.get_similar_tracks_async(client, ['a%d' % n for n in range(7)], [], [])
+
+    assert asyncio.run(recommend())
+    assert len(server.queries) == 2
+    assert sorted(seed for query in server.queries for seed in query['seed_artists']) == \
+        sorted('a%d' % n for n in range(7))
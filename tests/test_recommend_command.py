@@ -0,0 +1,77 @@
+import io
+import json
+
+import pytest
+
+import music_finder
+from helpers import genres
+
+
+@pytest.fixture
+def run(stub, monkeypatch, capsys):
+    monkeypatch.setattr(genres, '_catalog', genres.GenreCatalog(None))
+
+    def run(*argv, stdin: str = None):
+        if stdin is not None:
+            monkeypatch.setattr('sys.stdin', io.StringIO(stdin))
+        code = music_finder.main(['recommend'] + list(argv))
+        out, err = capsys.readouterr()
+        return code, out, err
+
+    return run
+
+
+def test_text_table_by_default(run):
+    code, out, _ = run('--artist-id', 'artist000001', '--genre', 'indie')
+    assert code == music_finder.EXIT_OK
+    assert out.split()[:3] == ['Song', 'Title', 'Artist'] and '20  Track 19' in out
+
+
+def test_names_are_resolved_to_ids(run, stub):
+    code, out, _ = run('--artist', 'artist 1', '--format', 'json')
+    assert code == music_finder.EXIT_OK
+    assert len(json.loads(out)) == stub.page_size
+    assert stub.hits['/v1/search'] == 1 and stub.hits['/v1/recommendations'] == 1
+
+
+def test_unknown_name_is_a_usage_error(run):
+    code, _, err = run('--artist', 'zzzzqqqq')
+    assert code == music_finder.EXIT_USAGE
+    assert 'No artist found for: zzzzqqqq' in err
+
+
+def test_no_seeds_is_a_usage_error(run):
+    assert run()[0] == music_finder.EXIT_USAGE
+
+
+def test_unavailable_api_has_its_own_exit_code(make_stub, run):
+    make_stub(error_rate=1)
+    code, _, err = run('--artist-id', 'artist000001')
+    assert code == music_finder.EXIT_UNAVAILABLE and err.startswith('Error: ')
+
+
+def test_html_report_written_to_a_file(run, tmp_path):
+    path = tmp_path / 'report.html'
+    code, out, _ = run('--artist-id', 'artist000001', '--out', str(path))
+    assert code == music_finder.EXIT_OK and out == ''
+    assert 'Thank you for telling us you like' in path.read_text() and '<table' in path.read_text()
+
+
+def test_seed_sets_are_streamed_from_stdin(run):
+    lines = '{"id": "a", "artist_ids": ["artist000001"]}\n{"id": "b", "genres": ["indie"]}\n{"id": "c"}\n'
+    code, out, _ = run('--stdin', stdin=lines)
+    results = [json.loads(line) for line in out.splitlines()]
+    assert [result['id'] for result in results] == ['a', 'b', 'c']
+    assert 'error' in results[2] and 'error' not in results[0]
+    assert code == music_finder.EXIT_FAILED
+
+
+def test_stdin_and_seed_arguments_do_not_mix(run):
+    with pytest.raises(SystemExit) as raised:
+        run('--stdin', '--genre', 'indie', stdin='')
+    assert raised.value.code == 2
+
+
+def test_binary_formats_need_a_file(run):
+    code, _, err = run('--artist-id', 'artist000001', '--format', 'parquet')
+    assert code == music_finder.EXIT_USAGE and '--out' in err
@@ -0,0 +1,100 @@
+import csv
+
+import pytest
+
+from helpers import spotify
+
+np = pytest.importorskip('numpy')
+
+from helpers import recommender  # noqa: E402
+
+
+def make_catalog(count: int = 1000, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    features = rng.normal(size=(count, len(recommender.FEATURES))).astype(np.float32)
+    metadata = {
+        'name': ['Track %d' % n for n in range(count)],
+        'artist_id': ['artist%03d' % (n % 50) for n in range(count)],
+        'artist_name': ['Artist %d' % (n % 50) for n in range(count)],
+        'album_id': ['album%03d' % (n % 200) for n in range(count)],
+        'album_name': ['Album %d' % (n % 200) for n in range(count)],
+        'genres': ['indie;rock' if n % 2 else 'jazz' for n in range(count)],
+    }
+    return ['track%04d' % n for n in range(count)], features, metadata
+
+
+def brute_force(features, query_rows, limit: int):
+    # Cosine similarity to the mean of the seed vectors, over every row at once
+    vectors = (features - features.mean(axis=0)) / features.std(axis=0)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = vectors @ vectors[query_rows].mean(axis=0)
+    return [n for n in np.argsort(-scores, kind='stable').tolist() if n not in query_rows][:limit]
+
+
+def test_blocked_search_matches_brute_force():
+    ids, features, metadata = make_catalog()
+    local = recommender.LocalRecommender(ids, features, metadata, block_size=64)
+    found = local.get_similar_tracks([], ['track0007', 'track0420'], [], simplify=False, limit=10)
+    assert [track['id'] for track in found['tracks']] == [ids[n] for n in brute_force(features, [7, 420], 10)]
+
+
+def test_track_seeds_are_not_recommended():
+    ids, features, metadata = make_catalog()
+    local = recommender.LocalRecommender(ids, features, metadata)
+    found = local.get_similar_tracks([], ['track0007'], [])
+    assert len(found) == 20 and 'track0007' not in {track['id'] for track in found}
+
+
+def test_artist_and_genre_seeds_use_their_tracks():
+    ids, features, metadata = make_catalog()
+    local = recommender.LocalRecommender(ids, features, metadata)
+    jazz = [n for n in range(len(ids)) if n % 2 == 0]
+    by_genre = local.get_similar_tracks([], [], ['jazz'], simplify=False, limit=5)
+    vectors = local.vectors
+    expected = np.argsort(-(vectors @ vectors[jazz].mean(axis=0)), kind='stable')[:5]
+    assert [track['id'] for track in by_genre['tracks']] == [ids[n] for n in expected.tolist()]
+    assert len(local.get_similar_tracks(['artist001'], [], [], limit=3)) == 3
+
+
+def test_more_than_five_seeds_are_accepted():
+    ids, features, metadata = make_catalog()
+    local = recommender.LocalRecommender(ids, features, metadata)
+    assert len(local.get_similar_tracks(['artist001', 'artist002'], ids[:6], ['jazz', 'indie'])) == 20
+
+
+def test_unknown_seeds_are_rejected():
+    local = recommender.LocalRecommender(*make_catalog(10))
+    with pytest.raises(spotify.InvalidSeedsError):
+        local.get_similar_tracks(['nobody'], ['nothing'], ['polka'])
+
+
+def test_results_are_shaped_like_spotify_tracks():
+    local = recommender.LocalRecommender(*make_catalog(10))
+    track = local.get_similar_tracks([], ['track0001'], [], limit=1)[0]
+    assert track['album']['name'].startswith('Album ') and track['artist']['id'].startswith('artist')
+    assert track['share_url'] == 'https://open.spotify.com/track/' + track['id']
+
+
+def test_csv_and_npz_catalogs_answer_the_same(tmp_path):
+    ids, features, metadata = make_catalog(200)
+    path = str(tmp_path / 'catalog.csv')
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id'] + list(recommender.FEATURES) + list(metadata))
+        for n, track_id in enumerate(ids):
+            writer.writerow([track_id] + features[n].tolist() + [values[n] for values in metadata.values()])
+
+    from_csv = recommender.LocalRecommender.from_file(path)
+    from_csv.save(str(tmp_path / 'catalog.npz'))
+    from_npz = recommender.LocalRecommender.from_file(str(tmp_path / 'catalog.npz'))
+    seeds = (['artist003'], ['track0010'], ['indie'])
+    assert from_npz.get_similar_tracks(*seeds) == from_csv.get_similar_tracks(*seeds)
+    assert from_npz.metadata == from_csv.metadata
+
+
+def test_spotify_helpers_use_the_local_recommender(stub, monkeypatch):
+    monkeypatch.setattr(spotify, '_recommender', None)
+    local = recommender.LocalRecommender(*make_catalog(100))
+    spotify.set_recommender(local)
+    assert spotify.get_similar_tracks([], ['track0001'], []) == local.get_similar_tracks([], ['track0001'], [])
+    assert '/v1/recommendations' not in stub.hits
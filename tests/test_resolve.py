@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+
+from benchmarks.stub_server import StubServer
+from benchmarks.stub_server import fake_artist
+from helpers import resolve
+from helpers import search_index
+from helpers import spotify
+from helpers import transport
+
+
+class ConcurrencyStub(StubServer):
+    # Keeps the most searches it was answering at once
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.active = 0
+        self.peak = 0
+        self._active_lock = threading.Lock()
+
+    def delay(self):
+        with self._active_lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.latency)
+        with self._active_lock:
+            self.active -= 1
+        return 0
+
+
+class NameStub(StubServer):
+    # Answers a search for 'Artist <n>' with artists n, n + 1 and so on
+
+    def route(self, path: str, query: dict):
+        data = super().route(path, query)
+        if path == '/v1/search':
+            first = int(query['q'][0].split()[-1])
+            data['artists']['items'] = [fake_artist(first + int(item['id'][6:])) for item in data['artists']['items']]
+        return data
+
+
+def test_best_match_picks_the_closest_name():
+    items = [{'name': 'Radiohead Tribute'}, {'name': 'Radiohead'}, {'name': 'Portishead'}]
+    assert resolve.best_match('radiohead', items) == (items[1], 3.0)
+
+
+def test_best_match_rejects_poor_matches():
+    assert resolve.best_match('sigur ros', [{'name': 'Portishead'}]) == (None, 0.0)
+
+
+def test_names_differing_in_case_and_punctuation_are_searched_once(stub):
+    found = resolve.resolve(['Artist 1', 'artist  1!', 'ARTIST 1'], 'artist')
+    assert list(found) == ['Artist 1', 'artist  1!', 'ARTIST 1']
+    assert len({id(item) for item in found.values()}) == 1
+    assert stub.hits['/v1/search'] == 1
+
+
+def test_unknown_kind_is_rejected():
+    with pytest.raises(ValueError):
+        resolve.resolve(['x'], 'album')
+
+
+def test_every_worker_gets_a_connection(make_stub, monkeypatch):
+    monkeypatch.setattr(transport, '_transport', transport.PooledTransport())
+    server = make_stub(ConcurrencyStub, latency=0.3)
+    names = ['Artist %d' % n for n in range(12)]
+    found = resolve.resolve_artists(names, workers=len(names))
+    assert all(found.values())
+    assert server.peak == len(names)
+    transport.get_transport().close()
+
+
+
+def test_names_resolve_correctly_with_a_search_index_open(make_stub, switch_often, monkeypatch):
+    monkeypatch.setattr(spotify, '_min_local_results', spotify._min_local_results)
+    server = make_stub(NameStub, page_size=50)
+    index = search_index.SearchIndex()
+    names = ['Artist %d' % (n * 1000) for n in range(1, 61)]
+
+    # Every name is searched on Spotify while the workers feed the index
+    spotify.set_search_index('artist', index, min_results=server.page_size + 1)
+    found = resolve.resolve_artists(names)
+    assert [found[name]['id'] for name in names] == ['artist%06d' % (n * 1000) for n in range(1, 61)]
+    assert len(index) == len(names) * server.page_size
+    for name in names:
+        assert index.search(name, 1)[0]['id'] == found[name]['id']
+
+    # Resolved again, the names are answered by the index alone
+    spotify.set_search_index('artist', index)
+    assert resolve.resolve_artists(names) == found
+    assert server.hits['/v1/search'] == len(names)
@@ -0,0 +1,247 @@
+import asyncio
+import email.utils
+import time
+
+import pytest
+
+from benchmarks.stub_server import StubServer
+from helpers import async_spotify
+from helpers import authentication
+from helpers import retry
+from helpers import spotify
+from helpers import transport
+
+
+class FlakyStub(StubServer):
+    # Fails the first `failures` API calls, then answers normally
+
+    def __init__(self, failures: int = 0, **options):
+        super().__init__(**options)
+        self.failures = failures
+
+    def should_fail(self, path: str):
+        if path.endswith('/key'):
+            return False
+        with self._lock:
+            if self.failures:
+                self.failures -= 1
+                return True
+        return False
+
+
+def api_calls(server: StubServer):
+    return sum(n for path, n in server.hits.items() if path.startswith('/v1/'))
+
+
+###############
+# Retry-After #
+###############
+
+def test_retry_after_in_seconds():
+    assert retry.parse_retry_after('3') == 3.0
+    assert retry.parse_retry_after('-1') == 0.0
+
+
+def test_retry_after_as_a_date():
+    value = email.utils.formatdate(time.time() + 60, usegmt=True)
+    assert 55 < retry.parse_retry_after(value) <= 60
+
+
+@pytest.mark.parametrize('value', [None, '', 'soon'])
+def test_retry_after_missing_or_malformed(value):
+    assert retry.parse_retry_after(value) is None
+
+
+##################
+# Retry policies #
+##################
+
+def test_policy_retries_transient_statuses_only():
+    policy = retry.RetryPolicy(attempts=3)
+    assert policy.should_retry(1, 503) and policy.should_retry(1, 429) and policy.should_retry(1, None)
+    assert not policy.should_retry(1, 404)
+    assert not policy.should_retry(3, 503)
+
+
+def test_policy_backoff_is_capped():
+    policy = retry.RetryPolicy(base=1, cap=4)
+    assert all(0 <= policy.delay(attempt) <= 4 for attempt in range(1, 10) for _ in range(20))
+
+
+def test_policy_defers_to_retry_after_up_to_max_wait():
+    policy = retry.RetryPolicy(base=0.5, max_wait=10)
+    assert 2 <= policy.delay(1, 2) <= 2.5
+    assert policy.delay(1, 11) is None
+
+
+def test_transient_failures_are_retried(make_stub):
+    server = make_stub(FlakyStub, failures=2)
+    assert spotify.get_artists('glass')
+    assert api_calls(server) == 3
+
+
+def test_client_errors_are_not_retried(make_stub):
+    server = make_stub(FlakyStub, failures=1, error_status=404)
+    with pytest.raises(spotify.RequestError):
+        spotify.get_artists('glass')
+    assert api_calls(server) == 1
+
+
+def test_retries_give_up_after_the_last_attempt(make_stub):
+    server = make_stub(FlakyStub, failures=100)
+    with pytest.raises(spotify.UpstreamError):
+        spotify.get_artists('glass')
+    assert api_calls(server) == spotify._retry_policy.attempts
+
+
+def test_429_waits_for_retry_after(make_stub):
+    server = make_stub(FlakyStub, failures=1, error_status=429, retry_after=0.3)
+    start = time.monotonic()
+    assert spotify.get_artists('glass')
+    assert time.monotonic() - start >= 0.3
+    assert api_calls(server) == 2
+
+
+def test_429_with_a_long_retry_after_fails_fast(make_stub):
+    server = make_stub(FlakyStub, failures=1, error_status=429, retry_after=3600)
+    with pytest.raises(spotify.RateLimitedError) as raised:
+        spotify.get_artists('glass')
+    assert raised.value.retry_after == 3600
+    assert api_calls(server) == 1
+
+
+###################
+# Circuit breaker #
+###################
+
+def open_breaker(threshold: int = 2, reset_after: float = 0.1):
+    breaker = retry.CircuitBreaker(threshold, reset_after)
+    for _ in range(threshold):
+        breaker.record_failure()
+    return breaker
+
+
+def test_breaker_opens_after_threshold_failures():
+    breaker = retry.CircuitBreaker(threshold=3, reset_after=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == 'closed' and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+
+
+def test_success_resets_the_failure_count():
+    breaker = retry.CircuitBreaker(threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+
+
+def test_half_open_breaker_lets_one_trial_through():
+    breaker = open_breaker()
+    time.sleep(0.12)
+    assert breaker.state == 'half-open'
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_successful_trial_closes_the_breaker():
+    breaker = open_breaker()
+    time.sleep(0.12)
+    breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.allow()
+
+
+def test_failed_trial_reopens_the_breaker():
+    breaker = open_breaker(threshold=5)
+    time.sleep(0.12)
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+
+
+def test_released_trial_lets_the_next_caller_try():
+    breaker = open_breaker()
+    time.sleep(0.12)
+    ticket = breaker.allow()
+    breaker.release(ticket)
+    assert breaker.allow()
+
+
+def test_releasing_an_ordinary_call_keeps_the_trial():
+    breaker = retry.CircuitBreaker(threshold=1, reset_after=0.1)
+    ordinary = breaker.allow()
+    breaker.record_failure()
+    time.sleep(0.12)
+    assert breaker.allow()
+    breaker.release(ordinary)
+    assert not breaker.allow()
+
+
+def test_abandoned_trial_expires():
+    breaker = open_breaker()
+    time.sleep(0.12)
+    assert breaker.allow()
+    time.sleep(0.12)
+    assert breaker.allow()
+
+
+def test_breaker_stops_calls_to_a_failing_api(make_stub, monkeypatch):
+    monkeypatch.setattr(spotify, '_breaker', retry.CircuitBreaker(threshold=2, reset_after=60))
+    monkeypatch.setattr(spotify, '_retry_policy', retry.RetryPolicy(attempts=1))
+    server = make_stub(FlakyStub, failures=100)
+    for _ in range(2):
+        with pytest.raises(spotify.UpstreamError):
+            spotify.get_artists('glass')
+    with pytest.raises(spotify.CircuitOpenError):
+        spotify.get_artists('glass')
+    assert api_calls(server) == 2
+
+
+def test_trial_ended_by_a_token_failure_is_released(stub, monkeypatch):
+    breaker = open_breaker()
+    monkeypatch.setattr(spotify, '_breaker', breaker)
+    time.sleep(0.12)
+
+    def unavailable(url):
+        raise Exception('The key endpoint is down')
+
+    monkeypatch.setattr(authentication, 'get_token', unavailable)
+    with pytest.raises(Exception, match='key endpoint'):
+        spotify.get_artists('glass')
+    assert breaker.allow()
+
+
+def test_trial_ended_by_a_malformed_body_is_released(stub, monkeypatch):
+    breaker = open_breaker()
+    monkeypatch.setattr(spotify, '_breaker', breaker)
+    time.sleep(0.12)
+
+    def malformed(response):
+        raise ValueError('Expecting value')
+
+    monkeypatch.setattr(transport.Response, 'json', malformed)
+    with pytest.raises(ValueError):
+        spotify.get_artists('glass')
+    assert breaker.allow()
+
+
+def test_cancelled_async_trial_is_released(make_stub, monkeypatch):
+    breaker = open_breaker()
+    monkeypatch.setattr(spotify, '_breaker', breaker)
+    make_stub(latency=1)
+    authentication.get_token(spotify.SPOTIFY_KEY_URL)
+    time.sleep(0.12)
+
+    async def cancel_a_call():
+        async with async_spotify.AsyncSpotify() as client:
+            task = asyncio.ensure_future(client.get_artists('glass'))
+            await asyncio.sleep(0.2)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+    asyncio.run(cancel_a_call())
+    assert breaker.allow()
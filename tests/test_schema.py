@@ -0,0 +1,59 @@
+import pytest
+
+from benchmarks.stub_server import fake_artist, fake_track
+from helpers import schema
+from helpers import spotify
+from helpers import utilities
+
+
+def test_missing_values_become_none():
+    track = {'id': 'x', 'album': {'images': [], 'artists': None}}
+    record = dict(zip(schema.extract_track.columns, schema.extract_track(track)))
+    assert record['share_url'] == schema.SHARE_URL + 'track/x'
+    assert record['album_image_url'] is None and record['artist_name'] is None and record['name'] is None
+
+
+def test_nested_track_groups_album_and_artist():
+    track = schema.nested_track(fake_track(12))
+    assert track['album'] == {
+        'id': 'album000001', 'name': 'Album 1',
+        'image_url': 'https://i.scdn.co/image/large000001',
+        'image_url_small': 'https://i.scdn.co/image/small000001',
+        'share_url': schema.SHARE_URL + 'album/album000001',
+    }
+    assert track['artist']['name'] == 'Artist 0'
+
+
+def test_nested_track_leaves_out_empty_groups():
+    assert 'album' not in schema.nested_track({'id': 'x'})
+
+
+def test_simplified_records_shape_back_to_the_same_columns():
+    raw_tracks = [fake_track(n) for n in range(3)]
+    raw_artists = [fake_artist(n) for n in range(3)]
+    assert list(map(schema.simplified_track, spotify._simplify_tracks(raw_tracks))) == \
+        list(map(schema.extract_track, raw_tracks))
+    assert list(map(schema.simplified_artist, spotify._simplify_artists(raw_artists))) == \
+        list(map(schema.extract_artist, raw_artists))
+
+
+def test_to_columns():
+    columns = schema.to_columns([fake_track(0), fake_track(1)])
+    assert list(columns) == schema.extract_track.columns
+    assert columns['name'] == ['Track 0', 'Track 1']
+    assert schema.to_columns([]) == {column: [] for column in schema.extract_track.columns}
+
+
+def test_dataframe_of_simplified_tracks():
+    pytest.importorskip('pandas')
+    frame = utilities.get_dataframe(spotify._simplify_tracks([fake_track(n) for n in range(3)]))
+    assert list(frame.columns) == schema.extract_track.columns
+    assert list(frame.index) == [1, 2, 3] and frame.index.name == 'num'
+    assert frame.loc[2, 'album_name'] == 'Album 0'
+
+
+def test_dataframe_of_simplified_artists():
+    pytest.importorskip('pandas')
+    frame = utilities.get_dataframe(spotify._simplify_artists([fake_artist(n) for n in range(2)]))
+    assert list(frame.columns) == schema.extract_artist.columns
+    assert frame.loc[1, 'genres'] == 'indie, rock'
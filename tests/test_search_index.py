@@ -0,0 +1,164 @@
+import itertools
+import random
+import threading
+
+import pytest
+
+from benchmarks.bench_search import misspell
+from benchmarks.bench_search import synthetic_name
+from benchmarks.stub_server import fake_artist
+from helpers import search_index
+from helpers import spotify
+
+
+def levenshtein(a: str, b: str):
+    previous = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        current = [i]
+        for j, y in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (x != y)))
+        previous = current
+    return previous[-1]
+
+
+@pytest.fixture(scope='module')
+def names():
+    rng = random.Random(0)
+    return list(dict.fromkeys(synthetic_name(rng) for _ in range(20000)))
+
+
+@pytest.fixture(scope='module')
+def index(names):
+    index = search_index.SearchIndex()
+    index.add_many({'id': 'artist%06d' % n, 'name': name} for n, name in enumerate(names))
+    index.add_many([{'id': 'radiohead', 'name': 'Radiohead'}, {'id': 'sigur-ros', 'name': 'Sigur Rós'}])
+    return index
+
+
+def found(index, query: str, name: str, limit: int = 10):
+    return name in [item['name'] for item in index.search(query, limit)]
+
+
+def test_edit_distance_matches_the_textbook_algorithm():
+    rng = random.Random(1)
+    for _ in range(2000):
+        a = ''.join(rng.choice('ab c') for _ in range(rng.randint(0, 70)))
+        b = ''.join(rng.choice('ab c') for _ in range(rng.randint(0, 70)))
+        assert search_index._edit_distance(a, b) == levenshtein(a, b)
+
+
+def test_normalize_folds_case_accents_and_punctuation():
+    assert search_index.normalize('Sigur Rós') == search_index.normalize('sigur  ros!') == 'sigur ros'
+
+
+def test_similarity_scale():
+    assert search_index.similarity('Radiohead', 'radiohead') == 3
+    assert 1 < search_index.similarity('radio', 'Radiohead') < 2
+    assert 0.7 < search_index.similarity('radiohed', 'Radiohead') < 1
+    assert search_index.similarity('radiohead', 'Bjork') < 0.3
+
+
+def test_exact_and_prefix_matches_come_first(index):
+    assert index.search('radiohead', 1)[0]['id'] == 'radiohead'
+    assert index.search('sigur ros', 1)[0]['id'] == 'sigur-ros'
+    assert index.search('radioh', 1)[0]['id'] == 'radiohead'
+
+
+def test_misspelled_name_is_found(index):
+    assert index.search('radiohed', 1)[0]['id'] == 'radiohead'
+    assert index.search('sigor ros', 1)[0]['id'] == 'sigur-ros'
+
+
+@pytest.mark.parametrize('scale', [1, 50])
+def test_most_misspelled_names_are_found(index, names, scale, monkeypatch):
+    # Budgets cut by 50 leave the same share of this index's postings as
+    # the full budgets do of a million names
+    monkeypatch.setattr(search_index, 'MAX_SEED_POSTINGS', search_index.MAX_SEED_POSTINGS // scale)
+    monkeypatch.setattr(search_index, 'MAX_POSTINGS_VISITED', search_index.MAX_POSTINGS_VISITED // scale)
+    rng = random.Random(2)
+    sample = rng.sample(names, 300)
+    hits = sum(found(index, misspell(name, rng), name) for name in sample)
+    assert hits >= (0.9 if scale == 1 else 0.8) * len(sample)
+
+
+def test_min_score_drops_weak_matches(index):
+    assert index.search('zzzzqqqq', 10, min_score=0.5) == []
+
+
+def test_saved_index_answers_the_same(index, names, tmp_path):
+    path = str(tmp_path / 'artists.idx')
+    index.save(path)
+    reopened = search_index.SearchIndex(path)
+    assert len(reopened) == len(index) and reopened.unsaved == 0
+    for query in ['radiohed', 'sigur', names[5], names[77][:4]]:
+        assert reopened.search(query) == index.search(query)
+    reopened.close()
+
+
+def test_additions_on_top_of_a_saved_index(tmp_path):
+    path = str(tmp_path / 'artists.idx')
+    saved = search_index.SearchIndex()
+    saved.add_many(fake_artist(n) for n in range(50))
+    saved.save(path)
+    reopened = search_index.SearchIndex(path)
+    assert not reopened.add(fake_artist(3))
+    assert reopened.add({'id': 'radiohead', 'name': 'Radiohead'})
+    assert reopened.unsaved == 1 and 'radiohead' in reopened and 'artist000003' in reopened
+    assert reopened.search('radiohed', 1)[0]['id'] == 'radiohead'
+    reopened.close()
+
+
+def test_concurrent_additions_keep_ids_and_payloads_aligned(tmp_path):
+    index = search_index.SearchIndex()
+
+    def add(first: int):
+        for n in range(first, first + 5000, 50):
+            index.add_many(fake_artist(m) for m in range(n, n + 50))
+            index.search('artist %d' % n, 1)
+
+    threads = [threading.Thread(target=add, args=(n * 5000,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(index) == 20000
+    path = str(tmp_path / 'artists.idx')
+    index.save(path)
+    for n in range(0, 20000, 97):
+        assert index.search(fake_artist(n)['name'], 1)[0]['id'] == fake_artist(n)['id']
+    index.close()
+
+
+###################################
+# Searches answered from an index #
+###################################
+
+def test_local_hits_are_shaped_like_spotify_pages(stub):
+    index = search_index.SearchIndex()
+    index.add_many(fake_artist(n) for n in range(100))
+    spotify.set_search_index('artist', index)
+    data = spotify.get_artists('artist 1', simplify=False)
+    page = data['artists']
+    assert stub.hits.get('/v1/search') is None
+    assert page['total'] == len(page['items']) >= 5
+    assert page['offset'] == 0 and page['next'] is None and page['limit'] == spotify.LOCAL_SEARCH_LIMIT
+
+
+def test_too_few_local_hits_ask_spotify(stub):
+    spotify.set_search_index('artist', search_index.SearchIndex())
+    page = spotify.get_artists('artist 1', simplify=False)['artists']
+    assert stub.hits['/v1/search'] == 1
+    assert page['total'] == stub.total
+    assert len(spotify.get_search_index('artist')) == len(page['items'])
+
+
+def test_paging_continues_on_spotify_after_local_hits(make_stub):
+    server = make_stub(total=60)
+    index = search_index.SearchIndex()
+    index.add_many(fake_artist(n) for n in range(5))
+    spotify.set_search_index('artist', index)
+    artists = list(itertools.islice(spotify.iter_artists('artist', simplify=False, prefetch=False), 100))
+    ids = [artist['id'] for artist in artists]
+    assert len(ids) == len(set(ids)) == 60
+    assert server.hits['/v1/search'] == 3
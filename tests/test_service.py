@@ -0,0 +1,108 @@
+import asyncio
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from helpers import async_spotify
+from helpers import service
+from helpers import spotify
+
+
+def fetch(url: str, method: str = 'GET'):
+    # (status, headers, decoded JSON body) for a request, error statuses included
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, method=method), timeout=10) as response:
+            return response.status, response.headers, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, json.loads(e.read())
+
+
+def serve(requests, max_pending: int = service.DEFAULT_MAX_PENDING):
+    # Starts a service on a free port, runs requests(base_url, service) against it and returns the result
+    async def run():
+        running = service.RecommendationService(async_spotify.AsyncSpotify(), max_pending)
+        server = await running.start('127.0.0.1', 0)
+        base_url = 'http://127.0.0.1:%d' % server.sockets[0].getsockname()[1]
+        try:
+            return await requests(base_url, running)
+        finally:
+            await running.close()
+
+    return asyncio.run(run())
+
+
+def get(*paths):
+    # Requests the paths at once, each on its own thread
+    async def requests(base_url, running):
+        return await asyncio.gather(*(asyncio.to_thread(fetch, base_url + path) for path in paths))
+
+    return requests
+
+
+def test_searches_answer_like_the_helpers(stub):
+    [(status, headers, artists)] = serve(get('/search/artists?q=glass'))
+    assert status == 200 and headers['Transfer-Encoding'] == 'chunked'
+    assert artists == spotify.get_artists('glass')
+
+
+def test_top_tracks_and_recommendations(stub):
+    (_, _, top), (_, _, similar) = serve(get(
+        '/artists/artist000001/top-tracks',
+        '/recommendations?artist_ids=a1,a2,a3&track_ids=t1&track_ids=t2&genres=indie'))
+    assert top == spotify.get_top_tracks_by_artist('artist000001')
+    assert len(similar) == stub.page_size
+    assert stub.hits['/v1/recommendations'] == 2
+
+
+@pytest.mark.parametrize('path, status', [
+    ('/search/artists', 400),
+    ('/recommendations', 400),
+    ('/nowhere', 404),
+])
+def test_bad_requests(stub, path, status):
+    [(answered, _, body)] = serve(get(path))
+    assert answered == body['status'] == status and body['error']
+
+
+def test_only_get_is_allowed(stub):
+    async def post(base_url, running):
+        return await asyncio.to_thread(fetch, base_url + '/health', 'POST')
+
+    assert serve(post)[0] == 405
+
+
+def test_upstream_failures_are_bad_gateway(make_stub):
+    make_stub(error_rate=1)
+    [(status, _, _)] = serve(get('/search/tracks?q=glass'))
+    assert status == 502
+
+
+def test_identical_requests_share_one_fetch(make_stub):
+    server = make_stub(latency=0.3)
+
+    async def requests(base_url, running):
+        results = await get(*['/search/tracks?q=Glass'] * 3, '/search/tracks?q=glass')(base_url, running)
+        return results, running.shared
+
+    results, shared = serve(requests)
+    assert [status for status, _, _ in results] == [200] * 4
+    assert server.hits['/v1/search'] == 1 and shared == 3
+
+
+def test_load_is_shed_but_health_answers(make_stub):
+    make_stub(latency=0.5)
+
+    async def requests(base_url, running):
+        slow = asyncio.ensure_future(asyncio.to_thread(fetch, base_url + '/search/tracks?q=slow'))
+        await asyncio.sleep(0.2)
+        [shed] = await get('/search/tracks?q=other')(base_url, running)
+        [health] = await get('/health')(base_url, running)
+        return await slow, shed, health
+
+    slow, (status, headers, _), (_, _, health) = serve(requests, max_pending=1)
+    assert slow[0] == 200
+    assert status == 503 and headers['Retry-After'] == '1'
+    # The slow search and the health check itself
+    assert health['pending'] == 2 and health['rejected'] == 1 and health['status'] == 'ok'
@@ -0,0 +1,34 @@
+import os
+import shutil
+
+import pytest
+
+from benchmarks import suite
+from benchmarks.stub_server import FIXTURES_DIR, SYNTHETIC_MARKER
+from helpers import spotify
+
+
+@pytest.fixture
+def fixtures(tmp_path, helpers_state, monkeypatch):
+    # A copy of the shipped fixtures; the suite's own stub server is pointed at for the test only
+    monkeypatch.setattr(spotify, 'SPOTIFY_API', spotify.SPOTIFY_API)
+    monkeypatch.setattr(spotify, 'SPOTIFY_KEY_URL', spotify.SPOTIFY_KEY_URL)
+    folder = str(tmp_path / 'fixtures')
+    shutil.copytree(FIXTURES_DIR, folder)
+    return folder
+
+
+def test_shipped_fixtures_are_marked_synthetic():
+    assert os.path.exists(os.path.join(FIXTURES_DIR, SYNTHETIC_MARKER))
+
+
+def test_run_says_the_fixtures_are_synthetic(fixtures, capsys):
+    assert suite.main(['--iterations', '1', '--fixtures', fixtures]) == 0
+    assert 'synthetic fixtures' in capsys.readouterr().err
+
+
+def test_recording_removes_the_marker(fixtures, stub, capsys):
+    suite.record(fixtures)
+    assert not os.path.exists(os.path.join(fixtures, SYNTHETIC_MARKER))
+    assert suite.main(['--iterations', '1', '--fixtures', fixtures]) == 0
+    assert 'synthetic' not in capsys.readouterr().err
@@ -0,0 +1,109 @@
+import http.client
+import urllib.error
+
+import pytest
+
+from helpers import transport
+
+
+class FakeResponse:
+
+    def __init__(self, fail_read: bool = False):
+        self.status = 200
+        self.reason = 'OK'
+        self.headers = http.client.HTTPMessage()
+        self.will_close = False
+        self.fail_read = fail_read
+
+    def read(self):
+        if self.fail_read:
+            raise ConnectionResetError('reset while reading')
+        return b'{}'
+
+
+class FakeConnection:
+
+    def __init__(self, error: Exception = None, fail_read: bool = False):
+        self.error = error
+        self.fail_read = fail_read
+        self.closed = False
+
+    def request(self, method, path, headers=None):
+        if self.error is not None:
+            raise self.error
+
+    def getresponse(self):
+        return FakeResponse(self.fail_read)
+
+    def close(self):
+        self.closed = True
+
+
+class FakePool(transport.PooledTransport):
+    # Hands out the given connections in turn instead of opening sockets
+
+    def __init__(self, connections: list, idle: list = ()):
+        super().__init__()
+        self.connections = list(connections)
+        for conn in idle:
+            self._checkin(('http', 'stub.test', None), conn)
+
+    def _connect(self, key, timeout):
+        return self.connections.pop(0)
+
+
+def test_connections_are_reused(stub):
+    pool = transport.PooledTransport()
+    opened = []
+    connect = pool._connect
+    pool._connect = lambda key, timeout: opened.append(key) or connect(key, timeout)
+    for _ in range(10):
+        assert pool.get(stub.base_url + '/v1/artists/artist000001').json()['id'] == 'artist000001'
+    assert len(opened) == 1
+    pool.close()
+
+
+def test_http_errors_raise_like_urllib(stub):
+    pool = transport.PooledTransport()
+    with pytest.raises(urllib.error.HTTPError) as raised:
+        pool.get(stub.base_url + '/nowhere')
+    assert raised.value.code == 404
+    pool.close()
+
+
+def test_stale_connection_is_retried_on_a_new_one():
+    stale = FakeConnection(http.client.RemoteDisconnected('closed'))
+    fresh = FakeConnection()
+    pool = FakePool([fresh], idle=[stale])
+    assert pool.get('http://stub.test/').status == 200
+    assert stale.closed and not fresh.closed
+    assert pool._idle[('http', 'stub.test', None)] == [fresh]
+
+
+def test_failed_retry_closes_the_new_connection():
+    stale = FakeConnection(http.client.RemoteDisconnected('closed'))
+    fresh = FakeConnection(ConnectionRefusedError('refused'))
+    pool = FakePool([fresh], idle=[stale])
+    with pytest.raises(ConnectionRefusedError):
+        pool.get('http://stub.test/')
+    assert stale.closed and fresh.closed
+    assert not pool._idle.get(('http', 'stub.test', None))
+
+
+def test_failed_read_closes_the_connection():
+    conn = FakeConnection(fail_read=True)
+    pool = FakePool([conn])
+    with pytest.raises(ConnectionResetError):
+        pool.get('http://stub.test/')
+    assert conn.closed
+    assert not pool._idle.get(('http', 'stub.test', None))
+
+
+def test_reserve_raises_the_limits():
+    pool = transport.PooledTransport(pool_size=2, max_per_host=4)
+    slot = pool._slot_for(('http', 'stub.test', None))
+    pool.reserve(12)
+    assert (pool.pool_size, pool.max_per_host) == (12, 12)
+    assert pool._slot_for(('http', 'stub.test', None)) is not slot
+    pool.reserve(6)
+    assert (pool.pool_size, pool.max_per_host) == (12, 12)
@@ -0,0 +1,125 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import music_finder
+from helpers import utilities
+
+
+###############
+# Menu tables #
+###############
+
+def test_table_rows_are_numbered_from_one():
+    table = utilities.Table(['Genre'], [['indie'], ['jazz']])
+    assert table.get(2, 'Genre') == 'jazz'
+    assert len(table) == 2 and not table.empty
+    with pytest.raises(KeyError):
+        table.get(0, 'Genre')
+    with pytest.raises(KeyError):
+        table.get(3, 'Genre')
+    with pytest.raises(KeyError):
+        table.get(1, 'Artist')
+
+
+def test_format_table_left_justifies_columns():
+    text = utilities.format_table(['Artist', 'Popularity'], [['Sigur Rós', 61], ['Björk', None]])
+    assert text.split('\n') == [
+        'Selection Number  Artist     Popularity',
+        '1                 Sigur Rós  61',
+        '2                 Björk',
+    ]
+
+
+def test_head_keeps_the_first_rows():
+    table = utilities.Table(['Genre'], [[genre] for genre in 'abcdefg'])
+    assert [row[0] for row in table.head(3).rows] == ['a', 'b', 'c']
+    assert str(table.head(1)) == 'Selection Number  Genre\n1                 a'
+
+
+def test_menu_keeps_selections_by_option_number():
+    menu = music_finder.Menu(['Select your favorite genres', 'Quit'])
+    menu[1] = 'indie, jazz'
+    assert menu[1] == 'indie, jazz' and menu[2] == ''
+    assert menu.choices() == ['1', '2']
+    assert menu.table().get(1, 'User Input') == 'indie, jazz'
+
+
+def test_menus_start_without_pandas():
+    # Any attempt to import pandas fails, so the import only succeeds if nothing at startup needs it
+    code = '\n'.join([
+        'import sys',
+        'class NoPandas:',
+        '    def find_spec(self, name, path=None, target=None):',
+        '        if name.split(".")[0] == "pandas":',
+        '            raise ImportError("pandas imported at startup")',
+        'sys.meta_path.insert(0, NoPandas())',
+        'import music_finder',
+        'print(music_finder.menu)',
+    ])
+    root = os.path.dirname(os.path.abspath(music_finder.__file__))
+    result = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert 'Discover new music' in result.stdout
+
+
+###############
+# HTML report #
+###############
+
+class CountingWriter:
+    # Keeps the text of every write
+
+    def __init__(self):
+        self.writes = []
+
+    def write(self, text: str):
+        self.writes.append(text)
+
+
+def make_track(n: int, name: str = None):
+    return {
+        'name': name or 'Track %d' % n,
+        'share_url': 'https://open.spotify.com/track/%d' % n,
+        'album': {'name': 'Album %d' % n, 'image_url_small': 'https://i.scdn.co/image/%d' % n},
+        'artist': {'name': 'Artist %d' % n}
+    }
+
+
+def test_values_are_escaped():
+    text = utilities.get_formatted_tracklist_table_html([make_track(1, '<script>"x" & y</script>')])
+    assert '<script>' not in text
+    assert '&lt;script&gt;&quot;x&quot; &amp; y&lt;/script&gt;' in text
+
+
+def test_nested_and_flattened_tracks_render_alike():
+    flat = {'name': 'Track 1', 'share_url': 'https://open.spotify.com/track/1', 'album_name': 'Album 1',
+            'album_image_url_small': 'https://i.scdn.co/image/1', 'artist_name': 'Artist 1'}
+    assert (utilities.get_formatted_tracklist_table_html([flat])
+            == utilities.get_formatted_tracklist_table_html([make_track(1)]))
+
+
+def test_rows_are_written_in_chunks(monkeypatch):
+    monkeypatch.setattr(utilities, 'ROWS_PER_WRITE', 10)
+    out = CountingWriter()
+    assert utilities.write_tracklist_table_html((make_track(n) for n in range(25)), out) == 25
+    row_writes = out.writes[1:-1]
+    assert [text.count('<tr ') for text in row_writes] == [10, 10, 5]
+
+
+def test_images_replace_cover_art_urls():
+    images = {'https://i.scdn.co/image/1': 'data:image/jpeg;base64,AAAA'}
+    text = utilities.get_formatted_tracklist_table_html([make_track(1), make_track(2)])
+    replaced = utilities.get_html_report(music_finder.Menu(['a', 'b', 'c']), [make_track(1), make_track(2)], images)
+    assert 'src="https://i.scdn.co/image/1"' in text
+    assert 'src="data:image/jpeg;base64,AAAA"' in replaced and 'src="https://i.scdn.co/image/2"' in replaced
+
+
+def test_report_header_lists_the_selections():
+    menu = music_finder.Menu(['genres', 'artists', 'tracks'])
+    menu[1], menu[2], menu[3] = 'indie', 'Sigur Rós & <Björk>', ''
+    text = utilities.get_html_report(menu, [make_track(1)])
+    assert 'Artists: Sigur Rós &amp; &lt;Björk&gt;' in text and 'Genres: indie' in text
+    assert text.index('Thank you') < text.index('<table')